@@ -1,38 +1,144 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
-import requests
+from contextlib import asynccontextmanager
+import asyncio
+import httpx
 import json
-import demjson3
-from functools import lru_cache
+import logging
+import os
 import time
-import re
+from urllib.parse import urlparse
+from llm_client import llm_client, LLMError, LLM_WARMUP
+from cache import TieredCache, MemoryLRU, SQLiteStore, make_cache_key, normalize_endpoint
+from singleflight import SingleFlight
+from storage import TestCaseStore, StoreWriter, STORE_SERVE_MAX_AGE
+from openapi_ingest import SpecError, load_spec, iter_operations, operation_endpoint, describe_operation
+from json_extract import TestCaseExtractor, CATEGORY_KEYS
+from postprocess import filter_by_category, parse_generation, parse_structured, screen_cases
+from schemas import category_schema, suite_schema
+from dedup import SuiteDeduplicator, case_fingerprint
+from rule_cases import RULE_BASED_CATEGORIES, RULES_VERSION, rule_cases
+import metrics
+from logs import configure_logging, RecentGenerations
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled Ollama client per worker, shared by every request
+    await llm_client.start()
+    # Load the model and the shared prompt prefixes in the background; /health reports readiness
+    warmup = asyncio.create_task(llm_client.warm_up(PROMPT_PREFIXES)) if LLM_WARMUP else None
+    yield
+    if warmup is not None:
+        warmup.cancel()
+    for task in list(background_tasks):
+        task.cancel()
+    await store_writer.close()
+    await llm_client.close()
+    log_pipeline.stop()
+
+log_pipeline = configure_logging()
+logger = logging.getLogger("ai_engine.app")
+# Full raw LLM responses for /debug/generations; the log only carries truncated excerpts
+recent_generations = RecentGenerations(normalize=normalize_endpoint)
+
+app = FastAPI(lifespan=lifespan)
+
+# Shared across workers through SQLite, with a per-worker LRU in front
+result_cache = TieredCache(MemoryLRU(), SQLiteStore())
+# Identical requests arriving while a generation is running share it instead of starting their own
+inflight = SingleFlight()
+# System of record for every generated suite; the cache above only keeps hot copies
+test_case_store = TestCaseStore()
+store_writer = StoreWriter(test_case_store)
+metrics.register_runtime(model=llm_client.model, result_cache=result_cache, inflight=inflight,
+                         pool=llm_client.pool, policy=llm_client.policy, store_writer=store_writer)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not the raw path, so path parameters do not explode the series
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
 
 class TestCaseRequest(BaseModel):
     prompt: str
+    stream: bool = False
+    # "wait" for a fresh suite, or "swr": the best suite available now, upgraded in the background
+    serve: str = None
+    # Receives the upgraded suite (POST, same shape as this endpoint's response) when "swr" regenerates one;
+    # its host must be listed in CALLBACK_ALLOWED_HOSTS
+    callback_url: str = None
+
+class SpecRequest(BaseModel):
+    spec: str  # OpenAPI 3 document, YAML or JSON
+    category: str = None
+    limit: int = None
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    # Liveness stays "ok"; "ready" turns true once the model and prompt prefixes are warm
+    return {"status": "ok", "ready": llm_client.ready or not LLM_WARMUP, "llm": llm_client.readiness,
+            "llm_nodes": llm_client.pool.snapshot(), "llm_policy": llm_client.policy.snapshot()}
 
-# Cache the test case generation for similar endpoints
-# @lru_cache(maxsize=100)
-# def get_cached_test_cases(endpoint: str):
-#     return generate_test_cases_internal(endpoint)
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
+CATEGORIES = ["positive", "negative", "edge", "security"]
+# Generate the four categories as separate concurrent calls instead of one big prompt
+GENERATION_FANOUT = os.getenv("GENERATION_FANOUT", "1") == "1"
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "4"))
+# Categories built by the rule-based generator instead of the LLM ("" sends everything to the LLM)
+RULE_CATEGORIES = tuple(c.strip() for c in os.getenv("RULE_CATEGORIES", "edge,security").split(",")
+                        if c.strip() in RULE_BASED_CATEGORIES)
+# LLM-written cases added to each rule-based category for variety; 0 keeps those categories off the LLM
+RULE_LLM_CASES = int(os.getenv("RULE_LLM_CASES", "0"))
 
-def generate_test_cases_internal(endpoint: str, category: str = None, max_retries=3, min_cases=5):
-    # More explicit prompt for LLM
-    if category:
-        prompt = f"""
+# Bump whenever build_prompt_parts changes so cached suites from older prompts are not served
+PROMPT_TEMPLATE_VERSION = "2"
+
+# Send a JSON Schema as Ollama's "format" so decoding can only produce valid test cases,
+# instead of relying on formatting rules in the prompt and repairing the output afterwards
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "1") == "1"
+
+GENERATION_OPTIONS = {
+    "num_predict": 2048,  # Increased from 1024 to 2048
+    "temperature": 0.1,
+    "top_p": 0.8,
+}
+if not LLM_STRUCTURED_OUTPUT:
+    # Free-form output only; under a schema the JSON always closes and a blank line is harmless
+    GENERATION_OPTIONS["stop"] = ["\n\n", "\n}\n}"]  # Adjusted to avoid stopping inside nested objects
+
+# Cut-off generations are resumed with short follow-up calls before falling back to a full retry
+MAX_CONTINUATIONS = int(os.getenv("MAX_CONTINUATIONS", "2"))
+CONTINUATION_OPTIONS = {
+    "num_predict": 1024,
+    "temperature": 0.1,
+    "top_p": 0.8
+    # No 'stop': a blank line inside the remaining JSON would cut the continuation off again
+}
+CONTINUATION_PROMPT = (
+    "Your previous answer was cut off. Continue the JSON exactly where it stopped. "
+    "Output only the remaining characters: do not repeat anything and do not add explanations."
+)
+
+# Static instructions go first and are identical for every endpoint, so Ollama can reuse the
+# evaluated prefix from its KV cache (or from a primed context) and only evaluate the suffix
+CASE_ARRAY_PREFIX = """
 You are an expert API test case generator.
 
-Your task is to generate a diverse and realistic set of API test cases for the given endpoint: **{endpoint}**.
+Your task is to generate a diverse and realistic set of API test cases of one category for the API endpoint given at the end.
 
 **IMPORTANT:** Every test case MUST have a non-empty, meaningful description. If you do not include a unique, meaningful description for each test case, your output will be rejected.
 
-Return ONLY a valid JSON array of {category} test cases. Each test case must be a JSON object with the following fields (in this order):
+Return ONLY a valid JSON array of test cases of the requested category. Each test case must be a JSON object with the following fields (in this order):
 - description (string)  # Short, unique, and meaningful description of what this test case checks and how it is different
 - request_url (string)
 - http_method (string)
@@ -41,7 +147,7 @@ Return ONLY a valid JSON array of {category} test cases. Each test case must be
 - expected_response_body (object)
 
 ## Requirements:
-- Generate at least 5 varied {category} test cases.
+- Generate at least the requested number of varied test cases.
 - Ensure variety in HTTP methods, request bodies, and expected responses.
 - Use realistic and meaningful values based on typical API usage.
 - **Every test case must have a unique and concise description explaining its purpose or what makes it different.**
@@ -54,14 +160,14 @@ Return ONLY a valid JSON array of {category} test cases. Each test case must be
 
 ## Output format example:
 [
-  {{
+  {
     "description": "Valid GET request for resource 1. Checks normal retrieval.",
     "request_url": "https://api.example.com/resource/1",
     "http_method": "GET",
-    "request_body": {{}},
+    "request_body": {},
     "expected_response_code": 200,
-    "expected_response_body": {{"id": 1, "name": "foo"}}
-  }}
+    "expected_response_body": {"id": 1, "name": "foo"}
+  }
 ]
 
 ## Important:
@@ -75,27 +181,25 @@ Return ONLY a valid JSON array of {category} test cases. Each test case must be
 - Do not include any tokens, formatting markers, or internal model tokens.
 - **Do NOT truncate your output. Always finish the JSON array completely, including all closing brackets and commas.**
 - If you reach the end of your output, always close all open objects and arrays so the JSON is valid and complete.
-
-Now generate a complete, unique, diverse set of {category} test cases for **{endpoint}** in the format above.
 """
-    else:
-        prompt = f"""
+
+CASE_SUITE_PREFIX = """
 You are an expert API test case generator.
 
-Your task is to generate a diverse and realistic set of API test cases for the given endpoint: **{endpoint}**.
+Your task is to generate a diverse and realistic set of API test cases for the API endpoint given at the end.
 
 **IMPORTANT:** Every test case MUST have a non-empty, meaningful description. If you do not include a unique, meaningful description for each test case, your output will be rejected.
 
 Return ONLY a valid JSON object with the following structure:
-{{
-  "positive_tests": [{{...}}],
-  "negative_tests": [{{...}}],
-  "edge_tests": [{{...}}],
-  "security_tests": [{{...}}]
-}}
+{
+  "positive_tests": [{...}],
+  "negative_tests": [{...}],
+  "edge_tests": [{...}],
+  "security_tests": [{...}]
+}
 
 ## Requirements:
-- Each array must contain at least **{min_cases} varied test cases**.
+- Each array must contain at least the requested number of varied test cases.
 - Ensure variety in:
   - HTTP methods (GET, POST, PUT, DELETE, PATCH where appropriate)
   - Request bodies (with different key-value combinations, data types, and optional/missing fields)
@@ -110,21 +214,21 @@ Return ONLY a valid JSON object with the following structure:
 - Security tests should cover cases like XSS, SQL injection, invalid tokens, unauthorized access attempts.
 
 ## Output format example:
-{{
+{
   "positive_tests": [
-    {{
+    {
       "description": "Valid GET request for resource 1. Checks normal retrieval.",
       "request_url": "string",
       "http_method": "string",
-      "request_body": {{ key-value pairs }},
+      "request_body": { key-value pairs },
       "expected_response_code": number,
-      "expected_response_body": {{ key-value pairs }}
-    }}
+      "expected_response_body": { key-value pairs }
+    }
   ],
-  "negative_tests": [{{...}}],
-  "edge_tests": [{{...}}],
-  "security_tests": [{{...}}]
-}}
+  "negative_tests": [{...}],
+  "edge_tests": [{...}],
+  "security_tests": [{...}]
+}
 
 ## Important:
 - Do NOT include any explanation or text outside the JSON.
@@ -140,310 +244,764 @@ Return ONLY a valid JSON object with the following structure:
 - Do not include any tokens, formatting markers, or internal model tokens
 - **Do NOT truncate your output. Always finish the JSON object completely, including all closing brackets and commas.**
 - If you reach the end of your output, always close all open objects and arrays so the JSON is valid and complete.
+"""
+
+# With a schema the output format is enforced by Ollama, so the prompt only describes the task
+STRUCTURED_CASE_PREFIX = """
+You are an expert API test case generator.
+
+Generate diverse, realistic API test cases for the API endpoint given at the end.
+- description: short, unique and meaningful; say what the case checks and how it differs from the others.
+- request_url: a full URL for the endpoint; request_body and expected_response_body: realistic JSON values.
+- expected_response_code: the HTTP status the API should answer with.
+- Vary HTTP methods, parameters, request bodies and expected responses; never repeat a case.
+
+Categories:
+- positive: successful and valid use cases.
+- negative: invalid inputs, missing parameters, wrong HTTP methods, etc.
+- edge: boundary conditions (very long strings, empty values, special characters, large numbers, etc.)
+- security: XSS, SQL injection, invalid tokens, unauthorized access attempts.
+"""
 
-Now generate a complete, unique, diverse set of test cases for **{endpoint}** in the format above.
+if LLM_STRUCTURED_OUTPUT:
+    PROMPT_PREFIXES = [STRUCTURED_CASE_PREFIX]
+else:
+    PROMPT_PREFIXES = [CASE_ARRAY_PREFIX, CASE_SUITE_PREFIX]
+
+def build_prompt_parts(endpoint: str, category: str = None, min_cases=5, context: str = None):
+    """Returns (prefix, suffix): the shared static instructions and the per-endpoint request."""
+    # Real parameter/body schemas from an OpenAPI spec, when the endpoint came from one
+    spec_section = ""
+    if context:
+        spec_section = f"\n## Endpoint specification (use these exact parameter names, body fields and status codes):\n{context}\n"
+    if LLM_STRUCTURED_OUTPUT:
+        wanted = f"at least {min_cases} {category} test cases" if category else f"at least {min_cases} test cases per category"
+        suffix = f"""
+## Endpoint: **{endpoint}**
+{spec_section}
+Now generate {wanted} for **{endpoint}**.
+"""
+        return STRUCTURED_CASE_PREFIX, suffix
+    if category:
+        suffix = f"""
+## Endpoint: **{endpoint}**
+{spec_section}
+Now generate a complete, unique, diverse JSON array of at least {min_cases} {category} test cases for **{endpoint}** in the format above.
 """
+        return CASE_ARRAY_PREFIX, suffix
+    suffix = f"""
+## Endpoint: **{endpoint}**
+{spec_section}
+Now generate a complete, unique, diverse set of test cases for **{endpoint}** in the format above, with at least **{min_cases} varied test cases** in each array.
+"""
+    return CASE_SUITE_PREFIX, suffix
+
+def generation_schema(category: str = None, min_cases=5):
+    # The JSON Schema sent as Ollama's "format", or None for free-form output
+    if not LLM_STRUCTURED_OUTPUT:
+        return None
+    return category_schema(category, min_cases) if category else suite_schema(min_cases)
+
+def parse_response(raw_response: str, category: str = None, min_cases=5):
+    if LLM_STRUCTURED_OUTPUT:
+        return parse_structured(raw_response, category, min_cases)
+    return parse_generation(raw_response, category, min_cases)
+
+def empty_result(error: str, **extra):
+    result = {key: [] for key in CATEGORY_KEYS}
+    result["error"] = error
+    result.update(extra)
+    return result
+
+async def resume_truncated(prompt: str, raw_response: str, result: dict, category: str, min_cases: int, parsed: tuple):
+    """
+    Asks the model only for the rest of a cut-off generation, feeding back the returned
+    context (or the partial output when Ollama sent none) instead of regenerating it all.
+    Returns (raw_response, parsed) for the most complete text seen.
+    """
+    for step in range(MAX_CONTINUATIONS):
+        metrics.GENERATION_RETRIES.labels(category or "all", "continuation").inc()
+        try:
+            if result.get("context"):
+                result = await llm_client.generate(CONTINUATION_PROMPT, options=CONTINUATION_OPTIONS,
+                                                   context=result["context"])
+            else:
+                followup = f"{prompt}\n\n## Your previous answer:\n{raw_response}\n\n{CONTINUATION_PROMPT}"
+                result = await llm_client.generate(followup, options=CONTINUATION_OPTIONS)
+        except (LLMError, httpx.TimeoutException) as e:
+            logger.warning("Continuation %d failed: %s", step + 1, e)
+            break
+        continuation = result.get("response", "")
+        # Usually the model picks up mid-object; if it started over instead, its output parses on its own
+        joined = raw_response + continuation
+        best_text, best = max(
+            [(joined, parse_generation(joined, category, min_cases)),
+             (continuation.strip(), parse_generation(continuation.strip(), category, min_cases))],
+            key=lambda option: option[1][1],
+        )
+        if best[1] < parsed[1] or (best[1] == parsed[1] and best[3]["truncated"]):
+            logger.info("Continuation %d made no progress", step + 1)
+            break
+        raw_response, parsed = best_text, best
+        logger.info("Continuation %d: %d test cases", step + 1, parsed[1], extra={"truncated": parsed[3]["truncated"]})
+        if parsed[2] or not parsed[3]["truncated"]:
+            break
+    return raw_response, parsed
+
+def timed_parse(raw_response: str, category: str, min_cases: int):
+    started = time.perf_counter()
+    parsed = parse_response(raw_response, category, min_cases)
+    metrics.observe_parse(category or "all", time.perf_counter() - started, parsed[1], parsed[3])
+    return parsed
+
+def timed_filter(test_cases, category: str):
+    started = time.perf_counter()
+    filtered = filter_by_category(test_cases, category)
+    metrics.NORMALIZE_SECONDS.labels(category).observe(time.perf_counter() - started)
+    return filtered
 
+# Rounds of follow-up calls that regenerate only the rejected or missing test cases
+CASE_REPAIR_ROUNDS = int(os.getenv("CASE_REPAIR_ROUNDS", "2"))
+# Token budget per requested case in a repair call, so it cannot run as long as a full generation
+REPAIR_TOKENS_PER_CASE = int(os.getenv("REPAIR_TOKENS_PER_CASE", "320"))
+
+async def regenerate_cases(endpoint: str, category: str, needed: int, existing: list, context: str = None):
+    """One small call for `needed` more cases of a category; returns whatever could be parsed from it."""
+    prefix, suffix = build_prompt_parts(endpoint, category, needed, context)
+    if existing:
+        suffix += "\nThese test cases already exist; do not repeat them:\n" + "\n".join(
+            f"- {tc['description']}" for tc in existing
+        ) + "\n"
+    options = {**GENERATION_OPTIONS, "num_predict": min(GENERATION_OPTIONS["num_predict"], REPAIR_TOKENS_PER_CASE * needed)}
+    try:
+        result = await llm_client.generate(suffix, options=options, prefix=prefix,
+                                           schema=generation_schema(category, needed))
+    except (LLMError, httpx.TimeoutException) as e:
+        logger.warning("Repair call failed: %s", e, extra={"endpoint": endpoint, "category": category})
+        return []
+    raw_response = result.get("response", "").strip()
+    candidate, count, _, report = timed_parse(raw_response, category, needed)
+    recent_generations.add(endpoint, category, raw_response, repair=True, test_cases=count, report=report)
+    return candidate
+
+async def fill_category(endpoint: str, category: str, cases: list, min_cases=5, context: str = None, seeds=()):
+    """
+    Validates every case of one category, drops exact and near duplicates, and regenerates
+    only the slots lost to either, so a partly usable response costs a short follow-up call
+    instead of a full retry. Returns the accepted cases, existing ones first.
+    Seeds (rule-based cases) are kept as they are; they only keep new cases from repeating them.
+    """
+    metrics.current_category.set(category)
+    accepted = list(seeds)
+    deduplicator = SuiteDeduplicator()
+    for tc in seeds:
+        deduplicator.add(tc, force=True)
+
+    def admit(candidates):
+        valid, rejected = screen_cases(candidates)
+        for tc, problems in rejected:
+            metrics.CASES_REJECTED.labels(category, problems[0]).inc()
+            logger.debug("Test case rejected", extra={"endpoint": endpoint, "category": category,
+                                                      "problems": problems, "description": tc.get("description")})
+        for tc in valid:
+            if len(accepted) >= min_cases:
+                break
+            if deduplicator.add(tc):
+                accepted.append(tc)
+
+    admit(cases)
+    for _ in range(CASE_REPAIR_ROUNDS):
+        needed = min_cases - len(accepted)
+        if needed <= 0:
+            break
+        metrics.GENERATION_RETRIES.labels(category, "repair").inc()
+        admit(await regenerate_cases(endpoint, category, needed, accepted, context))
+    for kind, count in deduplicator.stats.items():
+        if count:
+            metrics.DUPLICATES_REMOVED.labels(category, kind).inc(count)
+    metrics.SUITE_DIVERSITY.labels(category).observe(deduplicator.diversity())
+    if len(accepted) < min_cases:
+        logger.info("Kept %d/%d valid test cases after repair", len(accepted), min_cases,
+                    extra={"endpoint": endpoint, "category": category, **deduplicator.snapshot()})
+    elif deduplicator.stats["near"]:
+        logger.debug("Near-duplicate test cases replaced", extra={"endpoint": endpoint, "category": category,
+                                                                  **deduplicator.snapshot()})
+    return accepted
+
+async def rule_based_cases(endpoint: str, category: str, min_cases=5, context: str = None, operation: dict = None):
+    """
+    Cases from the rule-based generator; the LLM only writes the RULE_LLM_CASES variety slots
+    and whatever the rules cannot cover for this endpoint. If it fails, more rule cases stand in.
+    """
+    seeds = rule_cases(endpoint, category, operation, limit=max(0, min_cases - RULE_LLM_CASES))
+    if len(seeds) >= min_cases:
+        return seeds
+    filled = await fill_category(endpoint, category, [], min_cases, context, seeds=seeds)
+    if len(filled) < min_cases:
+        sent = {case_fingerprint(tc) for tc in filled}
+        spare = [tc for tc in rule_cases(endpoint, category, operation, limit=min_cases + len(filled))
+                 if case_fingerprint(tc) not in sent]
+        filled += spare[:min_cases - len(filled)]
+    return filled
+
+async def complete_cases(endpoint: str, category: str, candidate, min_cases=5, context: str = None):
+    # Category list or *_tests suite in, same shape out with only valid cases
+    if category:
+        return await fill_category(endpoint, category, timed_filter(candidate, category), min_cases, context)
+    filled = await asyncio.gather(*(
+        fill_category(endpoint, key[: -len("_tests")], candidate.get(key, []), min_cases, context)
+        for key in CATEGORY_KEYS
+    ))
+    return dict(zip(CATEGORY_KEYS, filled))
+
+async def generate_test_cases_internal(endpoint: str, category: str = None, max_retries=3, min_cases=5,
+                                       context: str = None, operation: dict = None):
+    if category in RULE_CATEGORIES:
+        return await rule_based_cases(endpoint, category, min_cases, context, operation)
+    prefix, suffix = build_prompt_parts(endpoint, category, min_cases, context)
+    prompt = prefix + suffix
+    label = category or "all"
+    metrics.current_category.set(label)
+    # Best salvage so far; only replaced by an attempt that recovered more test cases
+    best, best_count = None, 0
     for attempt in range(max_retries):
         try:
-            print(f"\nGenerating test cases for: {endpoint} (Attempt {attempt + 1})")
-            start_time = time.time()
-            response = requests.post(
-                "http://host.docker.internal:11434/api/generate",
-                json={
-                    "model": "deepseek-coder:6.7b-instruct",
-                    "prompt": prompt,
-                    "system": "You are a JSON generator. Only output valid JSON objects. If the user input or your output is not valid JSON, fix it and return valid JSON only. Always parse and repair any malformed JSON in your output before returning.",
-                    "stream": False,
-                    "options": {
-                        "num_predict": 2048,  # Increased from 1024 to 2048
-                        "temperature": 0.1,
-                        "top_p": 0.8,
-                        "stop": ["\n\n", "\n}\n}"]  # Adjusted to avoid stopping inside nested objects
-                    }
-                },
-                timeout=60
-            )
-            if response.status_code != 200:
-                print(f"Ollama API error: {response.text}")
+            logger.debug("Generating test cases", extra={"endpoint": endpoint, "category": label, "attempt": attempt + 1})
+            try:
+                result = await llm_client.generate(suffix, options=GENERATION_OPTIONS, prefix=prefix,
+                                                   schema=generation_schema(category, min_cases))
+            except LLMError as e:
+                logger.warning("Ollama API error: %s", e.text, extra={"endpoint": endpoint, "category": label,
+                                                                      "attempt": attempt + 1})
+                if attempt < max_retries - 1:
+                    metrics.GENERATION_RETRIES.labels(label, "llm_error").inc()
+                    await asyncio.sleep(llm_client.policy.backoff(attempt))
                 continue
-            result = response.json()
             raw_response = result.get("response", "").strip()
-            print(f"\nRaw response from Ollama (Attempt {attempt+1}):\n{raw_response}")
-            # Accept both array and object as valid JSON root
-            if not raw_response or (not raw_response.strip().startswith('{') and not raw_response.strip().startswith('[')):
-                print(f"No JSON found in response (Attempt {attempt+1}). Retrying...")
-                continue
-            # Strictly extract only the first valid JSON object or array
-            start_obj = raw_response.find('{')
-            start_arr = raw_response.find('[')
-            if (start_obj == -1 and start_arr == -1):
-                print(f"No JSON object or array found in response (Attempt {attempt+1}). Retrying...")
-                continue
-            if start_arr != -1 and (start_obj == -1 or start_arr < start_obj):
-                # Array comes first
-                start = start_arr
-                end = raw_response.rfind(']') + 1
-            else:
-                # Object comes first
-                start = start_obj
-                end = raw_response.rfind('}') + 1
-            if start >= 0 and end > start:
-                json_str = raw_response[start:end]
-                # Remove any trailing commas before closing braces/brackets
-                json_str = re.sub(r',([\s\n]*[}}\]])', r'\1', json_str)
-                # Remove any data after the last closing brace/bracket
-                if json_str.strip().startswith('['):
-                    json_str = json_str[:json_str.rfind(']')+1]
-                else:
-                    json_str = json_str[:json_str.rfind('}')+1]
-                try:
-                    parsed = json.loads(json_str)
-                    # If the response is a dict with a single key (e.g., 'positive_tests'), extract the array
-                    if isinstance(parsed, dict) and len(parsed) == 1:
-                        key = next(iter(parsed))
-                        if key in ["positive_tests", "negative_tests", "edge_tests", "security_tests"] and isinstance(parsed[key], list):
-                            arr = parsed[key]
-                            if category:
-                                arr = filter_by_category(arr, category)
-                            return arr
-                    # If the response is already an array, filter by category if needed
-                    if isinstance(parsed, list):
-                        arr = parsed
-                        if category:
-                            arr = filter_by_category(arr, category)
-                        return arr
-                    # Fallback: return the parsed object
-                    return parsed
-                except json.JSONDecodeError as e:
-                    print(f"\nJSON Parse Error (Attempt {attempt + 1}): {e}")
-                    print(f"Failed to parse JSON at position {e.pos}: {e.msg}")
-                    if attempt == max_retries - 1:
-                        return {
-                            "positive_tests": [],
-                            "negative_tests": [],
-                            "edge_tests": [],
-                            "security_tests": [],
-                            "error": f"Failed to parse response after {max_retries} attempts",
-                            "raw_response": raw_response
-                        }
-                    continue
-            else:
-                print(f"No JSON object or array found in response (Attempt {attempt+1}). Retrying...")
-                continue
-        except requests.Timeout:
-            print(f"\nRequest timed out (Attempt {attempt + 1})")
+            candidate, count, enough, report = timed_parse(raw_response, category, min_cases)
+            if not enough and report["truncated"]:
+                raw_response, (candidate, count, enough, report) = await resume_truncated(
+                    prompt, raw_response, result, category, min_cases, (candidate, count, enough, report)
+                )
+            recent_generations.add(endpoint, label, raw_response, attempt=attempt + 1, test_cases=count, report=report)
+            if report["truncated"] or report["parse_errors"] or report.get("missing"):
+                logger.info("Partial JSON", extra={"endpoint": endpoint, "attempt": attempt + 1, "report": report})
+            if count > best_count:
+                best, best_count = candidate, count
+            if best is not None:
+                # Short or unusable cases are regenerated one slot at a time below, not with a full retry
+                break
             if attempt == max_retries - 1:
-                return {
-                    "positive_tests": [],
-                    "negative_tests": [],
-                    "edge_tests": [],
-                    "security_tests": [],
-                    "error": f"Request timed out after {max_retries} attempts"
-                }
+                return empty_result(f"Failed to parse response after {max_retries} attempts", raw_response=raw_response)
+            logger.info("No test cases recovered, retrying", extra={"endpoint": endpoint, "attempt": attempt + 1})
+            metrics.GENERATION_RETRIES.labels(label, "incomplete").inc()
+        except httpx.TimeoutException:
+            logger.warning("Request timed out", extra={"endpoint": endpoint, "attempt": attempt + 1})
+            if attempt == max_retries - 1 and best is None:
+                return empty_result(f"Request timed out after {max_retries} attempts")
+            if attempt < max_retries - 1:
+                metrics.GENERATION_RETRIES.labels(label, "timeout").inc()
+                await asyncio.sleep(llm_client.policy.backoff(attempt))
             continue
         except Exception as e:
-            print(f"\nError during test case generation (Attempt {attempt + 1}): {str(e)}")
-            if attempt == max_retries - 1:
-                return {
-                    "positive_tests": [],
-                    "negative_tests": [],
-                    "edge_tests": [],
-                    "security_tests": [],
-                    "error": str(e)
-                }
+            logger.exception("Error during test case generation", extra={"endpoint": endpoint, "attempt": attempt + 1})
+            if attempt == max_retries - 1 and best is None:
+                return empty_result(str(e))
+            if attempt < max_retries - 1:
+                metrics.GENERATION_RETRIES.labels(label, "error").inc()
             continue
-    return {
-        "positive_tests": [],
-        "negative_tests": [],
-        "edge_tests": [],
-        "security_tests": [],
-        "error": "Failed to generate test cases after all attempts"
-    }
+    if best is None:
+        return empty_result("Failed to generate test cases after all attempts")
+    return await complete_cases(endpoint, category, best, min_cases, context)
 
-def generate_n_test_cases(endpoint: str, category: str, n: int = 5, max_retries=3):
-    test_cases = []
-    required_keys = [
-        "request_url",
-        "http_method",
-        "headers",
-        # "content_type",  # Removed content_type from required keys
-        "request_body",
-        "expected_response_code",
-        "expected_response_body",
-        "description"  # Add description to required keys
-    ]
-    def normalize_test_case(tc):
-        # If the test case is not a dict, return a dict with all N/A
-        if not isinstance(tc, dict):
-            return {k: "N/A" for k in required_keys}
-        # If it already has the required keys, return as is
-        if all(k in tc for k in required_keys):
-            return tc
-        # Try to map common LLM keys to expected keys
-        mapping = {
-            "url": "request_url",
-            "method": "http_method",
-            "status": "expected_response_code",
-            "data": "expected_response_body",
-            "body": "request_body",
-            "response_code": "expected_response_code",
-            "response_body": "expected_response_body",
-            "desc": "description"
-        }
-        norm = {k: tc.get(k, "N/A") for k in required_keys}
-        for src, dst in mapping.items():
-            if src in tc and norm[dst] == "N/A":
-                norm[dst] = tc[src]
-        # If the LLM returned a nested 'data' or 'body', use as response/request body
-        if "data" in tc and norm["expected_response_body"] == "N/A":
-            norm["expected_response_body"] = tc["data"]
-        if "body" in tc and norm["request_body"] == "N/A":
-            norm["request_body"] = tc["body"]
-        # If the LLM returned a 'desc' or similar, use as description
-        if "desc" in tc and norm["description"] == "N/A":
-            norm["description"] = tc["desc"]
-        return norm
-
-
-    def clean_and_parse_json(raw_response):
-        # Try to extract the first valid JSON object
-        start = raw_response.find('{')
-        end = raw_response.rfind('}') + 1
-        if start >= 0 and end > start:
-            json_str = raw_response[start:end]
-            # Remove any trailing commas before closing braces/brackets
-            json_str = re.sub(r',([\s\n]*[}}\]])', r'\1', json_str)
-            # Remove any data after the last closing brace
-            json_str = json_str[:json_str.rfind('}')+1]
-            try:
-                return json.loads(json_str)
-            except Exception as e:
-                print(f"Failed to parse JSON: {e}\nRaw: {json_str}")
-                return None
+async def generate_fanout(endpoint: str, max_retries=3, min_cases=5, concurrency=FANOUT_CONCURRENCY,
+                          context: str = None, operation: dict = None):
+    """
+    Generates every category as its own concurrent LLM call and merges them into the
+    all-categories shape. Each category retries on its own, so one truncated category
+    never forces the others to be regenerated.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(category):
+        async with semaphore:
+            return await generate_test_cases_internal(endpoint, category, max_retries=max_retries,
+                                                      min_cases=min_cases, context=context, operation=operation)
+
+    outcomes = await asyncio.gather(*(run(cat) for cat in CATEGORIES))
+    result = {key: [] for key in CATEGORY_KEYS}
+    errors = []
+    for cat, cases in zip(CATEGORIES, outcomes):
+        if isinstance(cases, list):
+            result[cat + "_tests"] = cases
         else:
-            print(f"No JSON object found in response. Raw: {raw_response}")
-            return None
+            errors.append(f"{cat}: {cases.get('error', 'no test cases')}")
+    if not any(result.values()):
+        return empty_result("; ".join(errors) or "Failed to generate test cases after all attempts")
+    if errors:
+        logger.warning("Fan-out finished with failed categories", extra={"endpoint": endpoint, "errors": errors})
+    return result
 
-    for i in range(n):
-        single_prompt = f"""
-API Endpoint: {endpoint}
+async def generate_all_categories(endpoint: str, min_cases=5, context: str = None, operation: dict = None):
+    # Rule-based categories need their own path, so the LLM only writes the others
+    if GENERATION_FANOUT or RULE_CATEGORIES:
+        return await generate_fanout(endpoint, min_cases=min_cases, context=context, operation=operation)
+    return await generate_test_cases_internal(endpoint, min_cases=min_cases, context=context)
 
-Generate one {category} test case for this API endpoint.
-Return ONLY a valid JSON object for the test case, with ALL of these fields:
-- request_url (string)
-- http_method (string)
-- headers (object or N/A)
-- content_type (string or N/A)
-- request_body (object or N/A)
-- expected_response_code (number or string)
-- expected_response_body (object or string)
-
-Example:
-{{
-  "request_url": "https://api.example.com/resource/1",
-  "http_method": "GET",
-  "headers": {{"Authorization": "Bearer token"}},
-  "content_type": "application/json",
-  "request_body": {{}},
-  "expected_response_code": 200,
-  "expected_response_body": {{"id": 1, "name": "foo"}}
-}}
-
-Do not include any explanation, markdown, or extra text. Only output the JSON object.
-"""
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(
-                    "http://host.docker.internal:11434/api/generate",
-                    json={
-                        "model": "deepseek-coder:6.7b-instruct",
-                        "prompt": single_prompt,
-                        "system": "You are a JSON generator. Only output valid JSON objects. If the user input or your output is not valid JSON, fix it and return valid JSON only. Always parse and repair any malformed JSON in your output before returning.",
-                        "stream": False,
-                        "options": {
-                            "num_predict": 4096,  # Increased for more complete output
-                            "temperature": 0.1,
-                            "top_p": 0.8
-                            # No 'stop' parameter to avoid truncation
-                        }
-                    },
-                    timeout=60
-                )
-                if response.status_code != 200:
-                    print(f"Ollama API error: {response.text}")
-                    continue
-                result = response.json()
-                raw_response = result.get("response", "").strip()
-                print(f"\nRaw response from Ollama (Test {i+1}, Attempt {attempt+1}):\n{raw_response}")
-                test_case = clean_and_parse_json(raw_response)
-                if test_case:
-                    norm = normalize_test_case(test_case)
-                    # Fallback: if most fields are N/A, add a message
-                    na_count = sum(1 for v in norm.values() if v == "N/A")
-                    if na_count >= 5:
-                        norm["expected_response_body"] = f"LLM did not return a valid {category} test case. Raw: {raw_response[:200]}..."
-                    test_cases.append(norm)
-                    break
-                else:
-                    print(f"Failed to parse test case (Test {i+1}, Attempt {attempt+1})")
-            except Exception as e:
-                print(f"Exception during LLM call (Test {i+1}, Attempt {attempt+1}): {e}")
-                continue
+def test_case_cache_key(endpoint: str, category: str = None, min_cases=5, context: str = None):
+    options = {**GENERATION_OPTIONS, "min_cases": min_cases}
+    if LLM_STRUCTURED_OUTPUT:
+        options["format"] = "schema"
+    if context:
+        options["context"] = context
+    if RULE_CATEGORIES and (category is None or category in RULE_CATEGORIES):
+        options["rules"] = [RULES_VERSION, RULE_CATEGORIES, RULE_LLM_CASES]
+    return make_cache_key(endpoint, category, llm_client.model, PROMPT_TEMPLATE_VERSION, options)
+
+def is_cacheable(test_cases):
+    if isinstance(test_cases, dict):
+        return "error" not in test_cases and any(test_cases.get(key) for key in CATEGORY_KEYS)
+    return isinstance(test_cases, list) and len(test_cases) > 0
+
+def persist_run(endpoint: str, category, key: str, test_cases, started: float):
+    store_writer.submit({
+        "endpoint": endpoint,
+        "category": category,
+        "request_key": key,
+        "model": llm_client.model,
+        "prompt_version": PROMPT_TEMPLATE_VERSION,
+        "test_cases": test_cases,
+        "duration_ms": int((time.time() - started) * 1000),
+    })
+
+async def get_cached_test_cases(endpoint: str, category: str = None, min_cases=5, context: str = None,
+                                operation: dict = None):
+    # Cache the test case generation for similar endpoints
+    started = time.perf_counter()
+    if category in RULE_CATEGORIES and not RULE_LLM_CASES:
+        cases = rule_cases(endpoint, category, operation, limit=min_cases)
+        if len(cases) >= min_cases:
+            # Rebuilding takes microseconds, less than a cache lookup
+            observe_generation(category, "rules", started)
+            return cases
+    key = test_case_cache_key(endpoint, category, min_cases, context)
+    cached = await result_cache.get(key)
+    if cached is not None:
+        observe_generation(category, "cache", started)
+        return cached
+    # Stays "coalesced" unless this request's own generate() runs
+    source = {"name": "coalesced"}
+
+    async def generate():
+        # Suites generated earlier (by any worker, before any restart) come back from the DB
+        try:
+            stored = await asyncio.to_thread(test_case_store.latest_suite, key)
+        except Exception as e:
+            logger.warning("Test case store lookup failed: %s", e)
+            stored = None
+        if stored and is_cacheable(stored):
+            source["name"] = "db"
+            await result_cache.set(key, stored, endpoint=endpoint)
+            return stored
+        source["name"] = "llm"
+        return await generate_and_store(key, endpoint, category, min_cases, context, operation)
+
+    test_cases = await inflight.do(key, generate)
+    observe_generation(category, source["name"], started)
+    return test_cases
+
+async def generate_and_store(key: str, endpoint: str, category: str = None, min_cases=5, context: str = None,
+                             operation: dict = None):
+    started = time.time()
+    if category:
+        test_cases = await generate_test_cases_internal(endpoint, category, min_cases=min_cases, context=context,
+                                                        operation=operation)
+    else:
+        test_cases = await generate_all_categories(endpoint, min_cases=min_cases, context=context,
+                                                   operation=operation)
+    if is_cacheable(test_cases):
+        await result_cache.set(key, test_cases, endpoint=endpoint)
+        persist_run(endpoint, category, key, test_cases, started)
+    return test_cases
+
+SERVE_MODES = ("wait", "swr")
+# Default for requests that do not pick one; "wait" keeps the old behaviour
+SERVE_MODE = os.getenv("SERVE_MODE", "wait")
+# Background regenerations running at once, so upgrades never crowd out requests that are waiting
+REVALIDATE_CONCURRENCY = int(os.getenv("REVALIDATE_CONCURRENCY", "2"))
+CALLBACK_TIMEOUT = float(os.getenv("CALLBACK_TIMEOUT", "10"))
+# Comma-separated "host" or "host:port" entries callback_url may point at; empty disables callbacks
+CALLBACK_ALLOWED_HOSTS = {h.strip().lower() for h in os.getenv("CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()}
+
+def callback_allowed(url: str) -> bool:
+    # Callbacks are POSTed from inside the deployment's network, so only to hosts the operator listed
+    try:
+        parsed = urlparse(url)
+        host, port = (parsed.hostname or "").lower(), parsed.port
+    except ValueError:
+        return False
+    if parsed.scheme not in ("http", "https") or not host:
+        return False
+    return host in CALLBACK_ALLOWED_HOSTS or (port is not None and f"{host}:{port}" in CALLBACK_ALLOWED_HOSTS)
+
+# Background regeneration per cache key, so a burst of stale hits starts only one
+revalidations = {}
+background_tasks = set()
+revalidate_slots = asyncio.Semaphore(REVALIDATE_CONCURRENCY)
+
+def spawn(coro):
+    # Keeps a reference until the task finishes; shutdown cancels whatever is left
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def draft_test_cases(endpoint: str, category: str = None, min_cases=5, operation: dict = None):
+    # Rule-built stand-in, in the shape generate_testcases returns, until the LLM suite is ready
+    if category:
+        return rule_cases(endpoint, category, operation, limit=min_cases)
+    return {cat + "_tests": rule_cases(endpoint, cat, operation, limit=min_cases) for cat in CATEGORIES}
+
+def response_suite(test_cases, category: str = None):
+    # /generate-testcases always answers with all four *_tests keys
+    if not category:
+        return test_cases
+    result = {key: [] for key in CATEGORY_KEYS}
+    result[category + "_tests"] = test_cases
+    return result
+
+async def revalidate(key: str, endpoint: str, category: str, min_cases: int, context: str, operation: dict):
+    """Regenerates a stale or drafted suite with the LLM and stores it, for the next request and any listener."""
+    try:
+        async with revalidate_slots:
+            # Joins a foreground generation of the same key instead of running a second one
+            test_cases = await inflight.do(
+                key, lambda: generate_and_store(key, endpoint, category, min_cases, context, operation)
+            )
+    except Exception as e:
+        logger.exception("Background regeneration failed", extra={"endpoint": endpoint, "category": category})
+        test_cases = empty_result(str(e))
+    outcome = "upgraded" if is_cacheable(test_cases) else "failed"
+    metrics.REVALIDATIONS.labels(category or "all", outcome).inc()
+    logger.info("Background regeneration finished", extra={"endpoint": endpoint, "category": category,
+                                                           "outcome": outcome})
     return test_cases
 
-def filter_by_category(testcases, category):
+async def notify_upgrade(upgrade: asyncio.Task, callback_url: str, endpoint: str, category: str = None):
+    test_cases = await asyncio.shield(upgrade)
+    if is_cacheable(test_cases):
+        payload = {"testcases": json.dumps(response_suite(test_cases, category), ensure_ascii=False),
+                   "source": "llm", "freshness": "fresh"}
+    else:
+        payload = {"testcases": json.dumps([]), "error": test_cases.get("error", "Regeneration failed")}
+    try:
+        async with httpx.AsyncClient(timeout=CALLBACK_TIMEOUT) as client:
+            response = await client.post(callback_url, json={"endpoint": endpoint, "category": category, **payload})
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning("Upgrade callback failed: %s", e, extra={"endpoint": endpoint, "callback_url": callback_url})
+
+def schedule_revalidation(key: str, endpoint: str, category: str, min_cases: int, context: str = None,
+                          operation: dict = None, callback_url: str = None):
+    upgrade = revalidations.get(key)
+    if upgrade is None:
+        upgrade = spawn(revalidate(key, endpoint, category, min_cases, context, operation))
+        revalidations[key] = upgrade
+        upgrade.add_done_callback(lambda _: revalidations.pop(key, None))
+    if callback_url:
+        spawn(notify_upgrade(upgrade, callback_url, endpoint, category))
+    return upgrade
+
+async def serve_instant(endpoint: str, category: str = None, min_cases=5, context: str = None,
+                        operation: dict = None, callback_url: str = None):
     """
-    Filters a list of test cases to only include those matching the given category in their description or metadata.
-    If the input is already a list of only the selected category, returns as is.
+    Stale-while-revalidate: returns (test_cases, meta, upgrade) without waiting for the LLM.
+    Cached and recently stored suites are served as fresh. Otherwise the newest stored suite
+    (any age, model or prompt version) or else a rule-based draft is served, and `upgrade` is
+    the background task regenerating it; meta says which: {"source", "freshness", "revalidating"}.
     """
-    # Accept both full category name and short (e.g., 'positive' or 'positive_tests')
-    cat = category.lower()
-    filtered = []
-    for tc in testcases:
-        # Some LLMs add a 'category' field, some only have description
-        tc_cat = tc.get('category', '').lower() if isinstance(tc, dict) else ''
-        desc = tc.get('description', '').lower() if isinstance(tc, dict) else ''
-        if cat in tc_cat or cat in desc:
-            filtered.append(tc)
-    # If nothing matched, assume all are of the requested category (LLM may not label)
-    if not filtered and isinstance(testcases, list):
-        filtered = testcases
-    # Always return at least 5 (truncate or pad with N/A if needed)
-    if len(filtered) > 5:
-        filtered = filtered[:5]
-    elif len(filtered) < 5:
-        # Pad with dummy test cases if not enough
-        for _ in range(5 - len(filtered)):
-            filtered.append({
-                "description": f"Dummy {category} test case (insufficient generated)",
-                "request_url": "N/A",
-                "http_method": "N/A",
-                "request_body": {},
-                "expected_response_code": 0,
-                "expected_response_body": {}
-            })
-    return filtered
+    started = time.perf_counter()
+    if category in RULE_CATEGORIES and not RULE_LLM_CASES:
+        cases = rule_cases(endpoint, category, operation, limit=min_cases)
+        if len(cases) >= min_cases:
+            observe_generation(category, "rules", started)
+            return cases, {"source": "rules", "freshness": "fresh", "revalidating": False}, None
+    key = test_case_cache_key(endpoint, category, min_cases, context)
+    cached = await result_cache.get(key)
+    if cached is not None:
+        observe_generation(category, "cache", started)
+        return cached, {"source": "cache", "freshness": "fresh", "revalidating": False}, None
+    try:
+        run = await asyncio.to_thread(test_case_store.latest_run, key, endpoint, category)
+    except Exception as e:
+        logger.warning("Test case store lookup failed: %s", e)
+        run = None
+    if run and is_cacheable(run["test_cases"]):
+        test_cases = run["test_cases"]
+        meta = {"source": "db", "generated_at": run["created_at"]}
+        if run["request_key"] == key and time.time() - run["created_at"] <= STORE_SERVE_MAX_AGE:
+            await result_cache.set(key, test_cases, endpoint=endpoint)
+            observe_generation(category, "db", started)
+            return test_cases, {**meta, "freshness": "fresh", "revalidating": False}, None
+        meta["freshness"] = "stale"
+    else:
+        test_cases = draft_test_cases(endpoint, category, min_cases, operation)
+        meta = {"source": "rules", "freshness": "draft"}
+    upgrade = schedule_revalidation(key, endpoint, category, min_cases, context, operation, callback_url)
+    observe_generation(category, meta["freshness"], started)
+    return test_cases, {**meta, "revalidating": True}, upgrade
+
+def observe_generation(category: str, source: str, started: float):
+    metrics.GENERATION_SECONDS.labels(llm_client.model, category or "all", source).observe(time.perf_counter() - started)
+
+def stream_test_cases(endpoint: str, category: str = None, max_retries=3, min_cases=5):
+    # Concurrent identical streams follow one shared generation; late joiners replay what was already sent
+    key = "stream:" + test_case_cache_key(endpoint, category, min_cases)
+    return inflight.stream(key, lambda: generate_test_case_stream(endpoint, category, max_retries, min_cases))
+
+async def generate_test_case_stream(endpoint: str, category: str = None, max_retries=3, min_cases=5):
+    """
+    Streams test cases one by one as soon as each object is fully generated by Ollama.
+    Yields {"category": ..., "testcase": ...} events followed by a final {"done": true, ...} event.
+    Retries only while nothing has been emitted yet.
+    """
+    if category in RULE_CATEGORIES:
+        async for event in stream_rule_cases(endpoint, category, min_cases):
+            yield event
+        return
+    default_key = category + "_tests" if category else None
+    counts = {key: 0 for key in CATEGORY_KEYS}
+    metrics.current_category.set(category or "all")
+    stream_started = time.perf_counter()
+    cache_key = test_case_cache_key(endpoint, category, min_cases)
+    cached = await result_cache.get(cache_key)
+    if cached is not None:
+        observe_generation(category, "cache", stream_started)
+        cached_cases = {default_key: cached} if category else cached
+        for key in CATEGORY_KEYS:
+            for tc in cached_cases.get(key, []):
+                counts[key] += 1
+                yield {"category": key, "testcase": tc}
+        yield {"done": True, "counts": counts, "cached": True}
+        return
+    prefix, suffix = build_prompt_parts(endpoint, category, min_cases)
+    started = time.time()
+    collected = {key: [] for key in CATEGORY_KEYS}
+    # Per category, so a near-duplicate is never sent; fill_category tops up the slots it would have taken
+    deduplicators = {key: SuiteDeduplicator() for key in CATEGORY_KEYS}
+    error = None
+    for attempt in range(max_retries):
+        logger.debug("Streaming test cases", extra={"endpoint": endpoint, "category": category, "attempt": attempt + 1})
+        extractor = TestCaseExtractor()
+        raw_parts = []
+        try:
+            async for chunk in llm_client.stream_generate(suffix, options=GENERATION_OPTIONS, prefix=prefix,
+                                                          schema=generation_schema(category, min_cases)):
+                raw_parts.append(chunk.get("response", ""))
+                for key, tc in extractor.feed(raw_parts[-1]):
+                    key = default_key or key
+                    if key not in counts:
+                        continue
+                    # Category requests return a fixed number of cases, same as fill_category
+                    if category and counts[key] >= min_cases:
+                        continue
+                    valid, rejected = screen_cases([tc])
+                    if rejected:
+                        metrics.CASES_REJECTED.labels(key[: -len("_tests")], rejected[0][1][0]).inc()
+                        continue
+                    tc = valid[0]
+                    if not deduplicators[key].add(tc):
+                        continue
+                    counts[key] += 1
+                    collected[key].append(tc)
+                    yield {"category": key, "testcase": tc}
+            error = None
+        except LLMError as e:
+            logger.warning("Ollama API error: %s", e.text, extra={"endpoint": endpoint, "attempt": attempt + 1})
+            error, reason = str(e), "llm_error"
+        except httpx.TimeoutException:
+            logger.warning("Stream timed out", extra={"endpoint": endpoint, "attempt": attempt + 1})
+            error, reason = "Request timed out", "timeout"
+        except Exception as e:
+            logger.exception("Error during streamed generation", extra={"endpoint": endpoint, "attempt": attempt + 1})
+            error, reason = str(e), "error"
+        recent_generations.add(endpoint, category or "all", "".join(raw_parts), attempt=attempt + 1, stream=True,
+                               test_cases=sum(counts.values()), error=error)
+        if sum(counts.values()) > 0:
+            break
+        logger.info("No test cases streamed, retrying", extra={"endpoint": endpoint, "attempt": attempt + 1})
+        if attempt < max_retries - 1:
+            metrics.GENERATION_RETRIES.labels(category or "all", reason if error else "incomplete").inc()
+        if error and attempt < max_retries - 1:
+            await asyncio.sleep(llm_client.policy.backoff(attempt))
+    for key, deduplicator in deduplicators.items():
+        for kind, count in deduplicator.stats.items():
+            if count:
+                metrics.DUPLICATES_REMOVED.labels(key[: -len("_tests")], kind).inc(count)
+    if sum(counts.values()) > 0 and not error:
+        # Categories left short by rejected, duplicate or missing cases get a small repair call each
+        for key in [default_key] if category else CATEGORY_KEYS:
+            if counts[key] >= min_cases:
+                continue
+            streamed = {case_fingerprint(tc) for tc in collected[key]}
+            filled = await fill_category(endpoint, key[: -len("_tests")], collected[key], min_cases)
+            for tc in filled:
+                if case_fingerprint(tc) not in streamed:
+                    counts[key] += 1
+                    collected[key].append(tc)
+                    yield {"category": key, "testcase": tc}
+    done = {"done": True, "counts": counts}
+    if sum(counts.values()) == 0:
+        done["error"] = error or f"No test cases generated for endpoint: {endpoint}"
+    elif not error:
+        # Same shape generate_test_cases_internal returns, so both paths share cache entries
+        result = timed_filter(collected[default_key], category) if category else collected
+        await result_cache.set(cache_key, result, endpoint=endpoint)
+        persist_run(endpoint, category, cache_key, result, started)
+    observe_generation(category, "stream", stream_started)
+    yield done
+
+async def stream_rule_cases(endpoint: str, category: str, min_cases=5):
+    # Rule-based cases go out at once; LLM-written ones follow only for the slots the rules leave open
+    key = category + "_tests"
+    counts = {k: 0 for k in CATEGORY_KEYS}
+    started = time.perf_counter()
+    seeds = rule_cases(endpoint, category, limit=max(0, min_cases - RULE_LLM_CASES))
+    for tc in seeds:
+        counts[key] += 1
+        yield {"category": key, "testcase": tc}
+    if len(seeds) >= min_cases:
+        observe_generation(category, "rules", started)
+    else:
+        sent = {case_fingerprint(tc) for tc in seeds}
+        cases = await get_cached_test_cases(endpoint, category, min_cases)
+        for tc in cases if isinstance(cases, list) else []:
+            if case_fingerprint(tc) not in sent:
+                counts[key] += 1
+                yield {"category": key, "testcase": tc}
+    done = {"done": True, "counts": counts}
+    if counts[key] == 0:
+        done["error"] = f"No test cases generated for endpoint: {endpoint}"
+    yield done
+
+async def stream_fanout(endpoint: str, min_cases=5, concurrency=FANOUT_CONCURRENCY):
+    # Interleave the four per-category streams, forwarding each test case as soon as any of them yields it
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {key: 0 for key in CATEGORY_KEYS}
+    errors = []
+
+    async def pump(category):
+        try:
+            async with semaphore:
+                async for event in stream_test_cases(endpoint, category, min_cases=min_cases):
+                    await queue.put((category, event))
+        finally:
+            await queue.put((category, None))
+
+    tasks = [asyncio.create_task(pump(cat)) for cat in CATEGORIES]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            category, event = await queue.get()
+            if event is None:
+                remaining -= 1
+            elif event.get("done"):
+                if event.get("error"):
+                    errors.append(f"{category}: {event['error']}")
+            else:
+                counts[event["category"]] += 1
+                yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+    done = {"done": True, "counts": counts}
+    if errors:
+        done["error"] = "; ".join(errors)
+    yield done
+
+def suite_events(test_cases, category: str = None):
+    suite = response_suite(test_cases, category) if isinstance(test_cases, list) else test_cases
+    for key in CATEGORY_KEYS:
+        for tc in suite.get(key) or []:
+            yield {"category": key, "testcase": tc}
+
+async def stream_with_upgrade(endpoint: str, category: str = None, min_cases=5, callback_url: str = None):
+    """
+    Streams the suite serve_instant has at once, then, when it is stale or a draft, the upgraded
+    LLM suite once the background regeneration finishes. Each part opens with a {"suite": ...} event.
+    """
+    test_cases, meta, upgrade = await serve_instant(endpoint, category, min_cases, callback_url=callback_url)
+    counts = {"instant": 0, "upgrade": 0}
+    yield {"suite": "instant", **meta}
+    for event in suite_events(test_cases, category):
+        counts["instant"] += 1
+        yield event
+    done = {"done": True, "counts": counts, "upgraded": False}
+    if upgrade is not None:
+        # Shielded: a client disconnecting must not cancel the regeneration others may be waiting on
+        upgraded = await asyncio.shield(upgrade)
+        if is_cacheable(upgraded):
+            yield {"suite": "upgrade", "source": "llm", "freshness": "fresh"}
+            for event in suite_events(upgraded, category):
+                counts["upgrade"] += 1
+                yield event
+            done["upgraded"] = True
+        else:
+            done["error"] = upgraded.get("error") or f"No test cases generated for endpoint: {endpoint}"
+    yield done
+
+def format_stream_event(event, sse=False):
+    data = json.dumps(event, ensure_ascii=False)
+    return f"data: {data}\n\n" if sse else data + "\n"
+
+async def encode_stream(events, sse=False):
+    async for event in events:
+        yield format_stream_event(event, sse)
+
+def parse_prompt(prompt: str):
+    # Expect prompt to be: "<endpoint>\n<category>"
+    prompt_lines = prompt.split('\n')
+    endpoint = prompt_lines[0].strip()
+    # Try to infer category from prompt
+    category = None
+    for cat in ["positive", "negative", "edge", "security"]:
+        if cat in prompt.lower():
+            category = cat
+            break
+    return endpoint, category
 
 @app.post("/generate-testcases")
-async def generate_testcases(request: TestCaseRequest):
+async def generate_testcases(request: TestCaseRequest, http_request: Request):
+    serve = request.serve or SERVE_MODE
+    if serve not in SERVE_MODES:
+        raise HTTPException(status_code=400, detail=f"serve must be one of {', '.join(SERVE_MODES)}")
+    if request.callback_url and not callback_allowed(request.callback_url):
+        raise HTTPException(status_code=400, detail="callback_url must be an http(s) URL on an allowed host")
     try:
-        print(f"\n[DEBUG] Received prompt: {request.prompt}")
-        # Expect prompt to be: "<endpoint>\n<category>"
-        prompt_lines = request.prompt.split('\n')
-        endpoint = prompt_lines[0].strip()
-        print(f"[DEBUG] Parsed endpoint: {endpoint}")
-        # Try to infer category from prompt
-        category = None
-        for cat in ["positive", "negative", "edge", "security"]:
-            if cat in request.prompt.lower():
-                category = cat
-                break
-        print(f"[DEBUG] Inferred category: {category}")
+        endpoint, category = parse_prompt(request.prompt)
+        logger.debug("Received prompt", extra={"endpoint": endpoint, "category": category, "stream": request.stream,
+                                               "serve": serve})
+        if request.stream:
+            # NDJSON by default, Server-Sent Events when the client asks for them
+            sse = "text/event-stream" in http_request.headers.get("accept", "")
+            if serve == "swr":
+                events = stream_with_upgrade(endpoint, category, callback_url=request.callback_url)
+            elif not category and (GENERATION_FANOUT or RULE_CATEGORIES):
+                events = stream_fanout(endpoint)
+            else:
+                events = stream_test_cases(endpoint, category)
+            return StreamingResponse(
+                encode_stream(events, sse=sse),
+                media_type="text/event-stream" if sse else "application/x-ndjson",
+            )
+        if serve == "swr":
+            test_cases, meta, _ = await serve_instant(endpoint, category, min_cases=5,
+                                                      callback_url=request.callback_url)
+            return {"testcases": json.dumps(response_suite(test_cases, category), ensure_ascii=False), **meta}
         if not category:
             # No category specified, generate all categories at once
-            test_cases = generate_test_cases_internal(endpoint, min_cases=5)
-            print(f"[DEBUG] Generated test cases: {test_cases}")
+            test_cases = await get_cached_test_cases(endpoint, min_cases=5)
             if not test_cases or not any(isinstance(test_cases.get(cat+"_tests", []), list) and len(test_cases.get(cat+"_tests", [])) > 0 for cat in ["positive", "negative", "edge", "security"]):
                 return {
                     "testcases": json.dumps([]),
@@ -454,20 +1012,114 @@ async def generate_testcases(request: TestCaseRequest):
             }
         else:
             # Category specified, generate only that category, and ensure at least 5 test cases
-            test_cases = generate_test_cases_internal(endpoint, category, min_cases=5)
-            print(f"[DEBUG] Generated test cases: {test_cases}")
+            test_cases = await get_cached_test_cases(endpoint, category, min_cases=5)
             if not test_cases or (isinstance(test_cases, list) and len(test_cases) == 0):
                 return {
                     "testcases": json.dumps([]),
                     "error": f"No test cases generated for endpoint: {endpoint} and category: {category}"
                 }
             # Only return the selected category's test cases in the expected structure
-            result = {cat+"_tests": [] for cat in ["positive", "negative", "edge", "security"]}
-            result[category+"_tests"] = test_cases
             return {
-                "testcases": json.dumps(result, ensure_ascii=False)
+                "testcases": json.dumps(response_suite(test_cases, category), ensure_ascii=False)
             }
     except Exception as e:
-        print(f"\n[ERROR] in generate_testcases endpoint: {str(e)}")
+        logger.exception("generate_testcases failed", extra={"prompt": request.prompt})
         raise HTTPException(status_code=500, detail=str(e))
 
+
+SPEC_CONCURRENCY = int(os.getenv("SPEC_CONCURRENCY", "8"))
+
+async def generate_for_spec(spec: dict, category: str = None, limit: int = None, concurrency=SPEC_CONCURRENCY):
+    """
+    Feeds every operation of a parsed spec through generation on a bounded worker pool.
+    Operations are pulled lazily from iter_operations as workers free up, and results are
+    yielded in completion order with per-operation errors isolated.
+    """
+    operations = iter_operations(spec)
+    results = asyncio.Queue()
+    counter = {"next": 0}
+
+    async def worker():
+        while limit is None or counter["next"] < limit:
+            try:
+                operation = next(operations)
+            except StopIteration:
+                return
+            counter["next"] += 1
+            endpoint = operation_endpoint(operation)
+            item = {"operation_id": operation["operation_id"], "endpoint": endpoint}
+            try:
+                test_cases = await get_cached_test_cases(endpoint, category, context=describe_operation(operation),
+                                                         operation=operation)
+                # A failed category generation comes back as the empty_result dict, not a list
+                if category and isinstance(test_cases, list):
+                    test_cases = {**{key: [] for key in CATEGORY_KEYS}, category + "_tests": test_cases}
+                item["testcases"] = test_cases
+                if isinstance(test_cases, dict) and test_cases.get("error"):
+                    item["error"] = test_cases["error"]
+            except Exception as e:
+                item["error"] = str(e)
+            await results.put(item)
+
+    async def run_workers():
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            await results.put(None)
+
+    runner = asyncio.create_task(run_workers())
+    total = failed = 0
+    try:
+        while True:
+            item = await results.get()
+            if item is None:
+                break
+            total += 1
+            failed += 1 if item.get("error") else 0
+            yield item
+    finally:
+        runner.cancel()
+    yield {"done": True, "total": total, "succeeded": total - failed, "failed": failed}
+
+@app.post("/generate-from-spec")
+async def generate_from_spec(request: SpecRequest):
+    try:
+        spec = await asyncio.to_thread(load_spec, request.spec)
+    except SpecError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    category = request.category.lower().replace("_tests", "") if request.category else None
+    if category and category not in CATEGORIES:
+        raise HTTPException(status_code=400, detail=f"Unknown category: {request.category}")
+    return StreamingResponse(
+        encode_stream(generate_for_spec(spec, category, request.limit)),
+        media_type="application/x-ndjson",
+    )
+
+@app.get("/history/runs")
+async def history_runs(endpoint: str = None, limit: int = 50, offset: int = 0):
+    runs = await asyncio.to_thread(test_case_store.list_runs, endpoint, min(limit, 500), offset)
+    return {"runs": runs, "offset": offset}
+
+@app.get("/history/testcases")
+async def history_testcases(endpoint: str = None, category: str = None, model: str = None,
+                            limit: int = 50, before_id: int = None):
+    cases = await asyncio.to_thread(test_case_store.list_test_cases, endpoint, category, model, min(limit, 500), before_id)
+    # Keyset pagination: pass next_before_id back as before_id for the next page
+    return {"testcases": cases, "next_before_id": cases[-1]["id"] if len(cases) == min(limit, 500) else None}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {**result_cache.snapshot(), "inflight": inflight.snapshot()}
+
+@app.delete("/cache")
+async def invalidate_cache(endpoint: str = None):
+    # Drop every cached suite, or only those for one endpoint (e.g. ?endpoint=GET /users);
+    # other workers drop their in-memory copies within CACHE_INVALIDATION_CHECK seconds
+    removed = await result_cache.invalidate(endpoint)
+    await asyncio.to_thread(test_case_store.invalidate, endpoint)
+    return {"invalidated": removed, "endpoint": normalize_endpoint(endpoint) if endpoint else None}
+
+@app.get("/debug/generations")
+def debug_generations(limit: int = 20, endpoint: str = None):
+    # Newest first: the raw LLM output behind the last generations, untruncated
+    return {"generations": recent_generations.latest(limit, endpoint)}
@@ -0,0 +1,217 @@
+"""
+Offline micro-benchmark for the post-processing hot path: parsing, normalize_test_case and
+filter_by_category, run over a corpus of recorded raw Ollama responses. No LLM is needed.
+Each mode parses the whole corpus the way the app does with that LLM_STRUCTURED_OUTPUT setting:
+"structured" with parse_structured/parse_structured_case (the default, falling back to the
+extractor for off-schema output), "free" with parse_generation/clean_and_parse_json.
+
+    python bench/bench_postprocess.py                    # report and compare with baseline.json
+    python bench/bench_postprocess.py --mode structured  # only one mode
+    python bench/bench_postprocess.py --update-baseline  # record a new baseline on this machine
+    python bench/bench_postprocess.py --import-cassette cassettes/positive.cassette --category positive
+
+See bench/README.md for where the corpus comes from and how to add recorded responses.
+
+Exits with status 1 when a stage's latency or the salvage rate regresses against the
+baseline. Timings are machine-specific, so refresh the baseline when the hardware changes.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cassette import Cassette  # noqa: E402
+from json_extract import CATEGORY_KEYS  # noqa: E402
+from postprocess import (clean_and_parse_json, filter_by_category, normalize_test_case, parse_generation,  # noqa: E402
+                         parse_structured, parse_structured_case)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(HERE, "corpus.jsonl")
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+STAGES = ["parse", "parse_single", "normalize", "filter", "pipeline"]
+# Suite parser and single-case parser per mode
+PARSERS = {
+    "structured": (parse_structured, parse_structured_case),
+    "free": (parse_generation, clean_and_parse_json),
+}
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def import_cassette(cassette_path, category, corpus_path=CORPUS_PATH):
+    """Appends the responses of a cassette recorded with LLM_CASSETTE_MODE=record as corpus entries."""
+    names = {entry["name"] for entry in load_corpus(corpus_path)}
+    added = []
+    seen = {}
+    for fingerprint, exchange in Cassette(cassette_path, mode="replay").exchanges():
+        # Retries send identical requests, so one fingerprint can carry several different responses
+        seen[fingerprint] = seen.get(fingerprint, 0) + 1
+        if "response" in exchange:
+            text = exchange["response"].get("response", "")
+        else:
+            text = "".join(chunk.get("response", "") for chunk in exchange.get("chunks", []))
+        name = f"recorded_{category or 'all'}_{fingerprint[:12]}_{seen[fingerprint]}"
+        if not text or name in names:
+            continue
+        names.add(name)
+        added.append({"name": name, "kind": "recorded", "category": category, "response": text})
+    with open(corpus_path, "a", encoding="utf-8") as f:
+        for entry in added:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    return len(added)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def process(entry, timings, mode):
+    """Runs one response through every stage, appending per-stage durations in microseconds."""
+    clock = time.perf_counter_ns
+    parse_suite, parse_case = PARSERS[mode]
+    category = entry["category"]
+    t0 = clock()
+    candidate, count, _, report = parse_suite(entry["response"], category)
+    t1 = clock()
+    parse_case(entry["response"])
+    t2 = clock()
+    lists = [candidate] if category else [candidate[key] for key in CATEGORY_KEYS]
+    normalized = [[normalize_test_case(tc) for tc in cases] for cases in lists]
+    t3 = clock()
+    if category:
+        filter_by_category(normalized[0], category)
+    else:
+        for key, cases in zip(CATEGORY_KEYS, normalized):
+            filter_by_category(cases, key.replace("_tests", ""))
+    t4 = clock()
+    timings["parse"].append((t1 - t0) / 1000)
+    timings["parse_single"].append((t2 - t1) / 1000)
+    timings["normalize"].append((t3 - t2) / 1000)
+    timings["filter"].append((t4 - t3) / 1000)
+    timings["pipeline"].append((t4 - t0 - (t2 - t1)) / 1000)
+    return count, report
+
+
+def run(corpus, iterations, mode):
+    timings = {stage: [] for stage in STAGES}
+    outcomes = {}
+    started = time.perf_counter()
+    # The parsers log every failed response; keep that out of the measurements
+    engine_logger = logging.getLogger("ai_engine")
+    level = engine_logger.level
+    engine_logger.setLevel(logging.CRITICAL + 1)
+    try:
+        for _ in range(iterations):
+            for entry in corpus:
+                outcomes[entry["name"]] = process(entry, timings, mode)
+    finally:
+        engine_logger.setLevel(level)
+    elapsed = time.perf_counter() - started
+
+    truncated = [e for e in corpus if e["kind"] == "truncated"]
+    salvaged = [e for e in truncated if outcomes[e["name"]][0] > 0]
+    failed = [e for e in corpus if outcomes[e["name"]][0] == 0]
+    return {
+        "mode": mode,
+        "responses": len(corpus) * iterations,
+        "throughput_per_s": round(len(corpus) * iterations / elapsed, 1),
+        "stages": {
+            stage: {
+                "p50_us": round(percentile(samples, 50), 2),
+                "p95_us": round(percentile(samples, 95), 2),
+                "p99_us": round(percentile(samples, 99), 2),
+            }
+            for stage, samples in timings.items()
+        },
+        "salvage_rate": round(len(salvaged) / len(truncated), 4) if truncated else 1.0,
+        "cases_recovered": sum(count for count, _ in outcomes.values()),
+        "parse_failure_rate": round(len(failed) / len(corpus), 4),
+        "failed_responses": sorted(e["name"] for e in failed),
+    }
+
+
+def describe_corpus(corpus):
+    recorded = sum(1 for entry in corpus if entry["kind"] == "recorded")
+    return {
+        "entries": len(corpus),
+        "recorded": recorded,
+        "note": "Hand-written responses modeled on observed failure modes, not recorded Ollama output"
+                if not recorded else "Includes responses recorded from Ollama through cassettes",
+    }
+
+
+def compare(result, baseline, tolerance):
+    regressions = []
+    for stage, stats in baseline.get("stages", {}).items():
+        current = result["stages"].get(stage)
+        if current is None:
+            continue
+        for metric in ("p50_us", "p95_us"):
+            if current[metric] > stats[metric] * (1 + tolerance):
+                regressions.append(f"{stage} {metric}: {current[metric]} > {stats[metric]} (+{int(tolerance * 100)}%)")
+    if result["salvage_rate"] < baseline.get("salvage_rate", 0):
+        regressions.append(f"salvage_rate: {result['salvage_rate']} < {baseline['salvage_rate']}")
+    if result["parse_failure_rate"] > baseline.get("parse_failure_rate", 1):
+        regressions.append(f"parse_failure_rate: {result['parse_failure_rate']} > {baseline['parse_failure_rate']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed latency slowdown vs baseline")
+    parser.add_argument("--mode", choices=[*PARSERS, "all"], default="all")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--import-cassette", metavar="PATH", help="add a recorded cassette's responses to the corpus")
+    parser.add_argument("--category", choices=["positive", "negative", "edge", "security"],
+                        help="category the imported session generated (omit for all-category suites)")
+    args = parser.parse_args()
+
+    if args.import_cassette:
+        added = import_cassette(args.import_cassette, args.category, args.corpus)
+        print(f"Added {added} recorded responses to {args.corpus}")
+        return 0
+
+    corpus = load_corpus(args.corpus)
+    modes = list(PARSERS) if args.mode == "all" else [args.mode]
+    results = {mode: run(corpus, args.iterations, mode) for mode in modes}
+    print(json.dumps(results, indent=2))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.update_baseline:
+        # Modes not run this time keep their recorded baseline
+        for mode, result in results.items():
+            baseline[mode] = {k: result[k] for k in ("stages", "salvage_rate", "parse_failure_rate")}
+        baseline["corpus"] = describe_corpus(corpus)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    regressions = []
+    for mode, result in results.items():
+        if mode not in baseline:
+            print(f"No {mode} baseline found; run with --update-baseline to record one")
+            continue
+        regressions += [f"{mode} {regression}" for regression in compare(result, baseline[mode], args.tolerance)]
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
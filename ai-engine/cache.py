@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("ai_engine.cache")
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "testcase_cache.db")
+# How often each worker looks for invalidations issued by other workers (at most this stale)
+CACHE_INVALIDATION_CHECK = float(os.getenv("CACHE_INVALIDATION_CHECK", "1"))
+
+
+def normalize_endpoint(endpoint: str) -> str:
+    # "get  /users/ " and "GET /users" should share a cache entry
+    parts = endpoint.strip().split(None, 1)
+    if len(parts) == 2 and parts[0].isalpha():
+        method, path = parts[0].upper(), parts[1].strip()
+    else:
+        method, path = "", endpoint.strip()
+    path = re.sub(r"\s+", " ", path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+    return f"{method} {path}".strip()
+
+
+def make_cache_key(endpoint: str, category, model: str, template_version: str, options: dict) -> str:
+    payload = json.dumps(
+        {
+            "endpoint": normalize_endpoint(endpoint),
+            "category": category,
+            "model": model,
+            "template": template_version,
+            "options": options,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MemoryLRU:
+    """In-process LRU tier with per-entry TTL and a byte budget."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, size, endpoint, value)
+        self._bytes = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return entry[3]
+
+    def set(self, key, value, size: int, endpoint: str = "", expires_at: float = None):
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (expires_at or time.time() + self.ttl, size, endpoint, value)
+        self._bytes += size
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def invalidate(self, endpoint: str = None):
+        if endpoint is None:
+            count = len(self._data)
+            self._data.clear()
+            self._bytes = 0
+            return count
+        keys = [k for k, entry in self._data.items() if entry[2] == endpoint]
+        for k in keys:
+            self._remove(k)
+        return len(keys)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteStore:
+    """
+    Persistent tier shared by every uvicorn worker on the host and surviving restarts.
+    WAL mode lets concurrent workers read while one writes.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS testcase_cache (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_testcase_cache_endpoint ON testcase_cache (endpoint)")
+            # Latest invalidation per endpoint ("" for everything), replayed by every worker on its memory tier
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS cache_invalidations (
+                    endpoint TEXT PRIMARY KEY,
+                    invalidated_at REAL NOT NULL
+                )"""
+            )
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, endpoint, expires_at FROM testcase_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] < time.time():
+                conn.execute("DELETE FROM testcase_cache WHERE key = ?", (key,))
+                return None
+            return row
+
+    def set(self, key, value: str, endpoint: str, expires_at: float):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO testcase_cache (key, endpoint, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, endpoint, value, expires_at),
+            )
+
+    def invalidate(self, endpoint: str = None):
+        with self._connect() as conn:
+            if endpoint is None:
+                cur = conn.execute("DELETE FROM testcase_cache")
+            else:
+                cur = conn.execute("DELETE FROM testcase_cache WHERE endpoint = ?", (endpoint,))
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_invalidations (endpoint, invalidated_at) VALUES (?, ?)",
+                (endpoint or "", time.time()),
+            )
+            return cur.rowcount
+
+    def invalidations_since(self, since: float):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT endpoint, invalidated_at FROM cache_invalidations WHERE invalidated_at > ?", (since,)
+            ).fetchall()
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM testcase_cache WHERE expires_at < ?", (time.time(),)).rowcount
+
+
+class TieredCache:
+    """
+    Memory LRU in front of the SQLite store. Disk hits are promoted into memory.
+    SQLite calls run in a thread so they never block the event loop.
+    Invalidations are recorded in the store too, and every worker replays the ones it has not
+    seen on its own memory tier, checking at most every CACHE_INVALIDATION_CHECK seconds.
+    """
+
+    def __init__(self, memory: MemoryLRU = None, store: SQLiteStore = None, ttl=CACHE_TTL,
+                 invalidation_check=CACHE_INVALIDATION_CHECK):
+        self.memory = memory or MemoryLRU(ttl=ttl)
+        self.store = store
+        self.ttl = ttl
+        self.invalidation_check = invalidation_check
+        # Memory starts empty, so only invalidations issued from now on matter
+        self._invalidations_seen = time.time()
+        self._invalidations_checked = 0.0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "invalidations": 0}
+
+    async def _sync_invalidations(self):
+        now = time.monotonic()
+        if self.store is None or now - self._invalidations_checked < self.invalidation_check:
+            return
+        self._invalidations_checked = now
+        try:
+            rows = await asyncio.to_thread(self.store.invalidations_since, self._invalidations_seen)
+        except sqlite3.Error as e:
+            logger.warning("Cache invalidation check failed: %s", e)
+            return
+        for endpoint, invalidated_at in rows:
+            self.memory.invalidate(endpoint or None)
+            self._invalidations_seen = max(self._invalidations_seen, invalidated_at)
+
+    async def get(self, key):
+        await self._sync_invalidations()
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+        if self.store is not None:
+            try:
+                row = await asyncio.to_thread(self.store.get, key)
+            except sqlite3.Error as e:
+                logger.warning("Cache store read failed: %s", e)
+                row = None
+            if row is not None:
+                raw, endpoint, expires_at = row
+                value = json.loads(raw)
+                self.memory.set(key, value, len(raw), endpoint=endpoint, expires_at=expires_at)
+                self.stats["disk_hits"] += 1
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key, value, endpoint: str = ""):
+        endpoint = normalize_endpoint(endpoint) if endpoint else ""
+        raw = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + self.ttl
+        self.memory.set(key, value, len(raw), endpoint=endpoint, expires_at=expires_at)
+        self.stats["sets"] += 1
+        if self.store is not None:
+            try:
+                await asyncio.to_thread(self.store.set, key, raw, endpoint, expires_at)
+            except sqlite3.Error as e:
+                logger.warning("Cache store write failed: %s", e)
+
+    async def invalidate(self, endpoint: str = None):
+        endpoint = normalize_endpoint(endpoint) if endpoint else None
+        removed = self.memory.invalidate(endpoint)
+        if self.store is not None:
+            removed = max(removed, await asyncio.to_thread(self.store.invalidate, endpoint))
+        self.stats["invalidations"] += 1
+        return removed
+
+    def snapshot(self):
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+        }
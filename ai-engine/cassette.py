@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import struct
+import zlib
+
+# passthrough (default): talk to Ollama; record: talk to Ollama and save every exchange;
+# replay: answer from the cassette only, without any network access
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "passthrough")
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "cassettes/session.cassette")
+CASSETTE_MODES = ("passthrough", "record", "replay")
+
+_HEADER = struct.Struct(">32sI")  # raw sha256 fingerprint, compressed record length
+
+
+def request_fingerprint(payload: dict) -> str:
+    """Stable hash of everything that determines Ollama's output (model, prompt, system, options, stream)."""
+    payload = {key: value for key, value in payload.items() if key != "keep_alive"}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when no recorded exchange matches the request."""
+
+
+class Cassette:
+    """
+    Append-only log of LLM exchanges. Each record is a fixed header (fingerprint, length)
+    followed by a zlib-compressed JSON body, so a session stays small on disk and a crash
+    loses at most the record being written. A sidecar .idx file maps fingerprints to record
+    offsets; it is rebuilt by scanning the log when missing or stale.
+
+    Replay reads the whole log into memory once, so lookups are a dict access plus one
+    decompress. A request recorded several times (retries send identical payloads) is
+    replayed in the order it was recorded, wrapping around at the end.
+    """
+
+    def __init__(self, path: str = LLM_CASSETTE_PATH, mode: str = LLM_CASSETTE_MODE):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {', '.join(CASSETTE_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.index = {}  # fingerprint -> [(offset, length), ...]
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        self._data = b""
+        self._positions = {}
+        self._file = None
+        self._index_dirty = False
+        if mode == "passthrough":
+            return
+        if os.path.exists(path):
+            self._load()
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassette not found: {path}")
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "ab")
+
+    @property
+    def index_path(self):
+        return self.path + ".idx"
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        index = None
+        try:
+            with open(self.index_path) as f:
+                stored = json.load(f)
+            if stored.get("size") == len(data):
+                index = {fp: [tuple(entry) for entry in entries] for fp, entries in stored["records"].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+        if index is None:
+            index, end = self._scan(data)
+            self._index_dirty = True
+            if end < len(data) and self.mode == "record":
+                # Drop a torn tail so new records stay aligned
+                with open(self.path, "r+b") as f:
+                    f.truncate(end)
+        self.index = index
+        if self.mode == "replay":
+            self._data = data
+
+    @staticmethod
+    def _scan(data: bytes):
+        index = {}
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            digest, length = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            if start + length > len(data):
+                break  # torn write at the tail; ignore it
+            index.setdefault(digest.hex(), []).append((start, length))
+            offset = start + length
+        return index, offset
+
+    def lookup(self, payload: dict):
+        fingerprint = request_fingerprint(payload)
+        entries = self.index.get(fingerprint)
+        if not entries:
+            self.stats["misses"] += 1
+            raise CassetteMiss(f"No recorded response for request {fingerprint[:12]} (model {payload.get('model')})")
+        position = self._positions.get(fingerprint, 0)
+        self._positions[fingerprint] = position + 1
+        start, length = entries[position % len(entries)]
+        self.stats["replayed"] += 1
+        return json.loads(zlib.decompress(self._data[start:start + length]))
+
+    def exchanges(self):
+        """Every recorded (fingerprint, exchange) in recording order; needs replay mode."""
+        records = sorted((start, length, fp) for fp, entries in self.index.items() for start, length in entries)
+        for start, length, fingerprint in records:
+            yield fingerprint, json.loads(zlib.decompress(self._data[start:start + length]))
+
+    def record(self, payload: dict, exchange: dict):
+        """exchange is {"response": body} for calls, {"chunks": [...]} for streams or {"status": .., "text": ..} for errors."""
+        if self._file is None:
+            return
+        fingerprint = request_fingerprint(payload)
+        body = zlib.compress(json.dumps(exchange, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+        offset = self._file.tell() + _HEADER.size
+        self._file.write(_HEADER.pack(bytes.fromhex(fingerprint), len(body)) + body)
+        self.index.setdefault(fingerprint, []).append((offset, len(body)))
+        self.stats["recorded"] += 1
+        self._index_dirty = True
+
+    def snapshot(self):
+        return {"mode": self.mode, "path": self.path, "fingerprints": len(self.index), **self.stats}
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            size = self._file.tell()
+            self._file.close()
+            self._file = None
+        elif self._index_dirty and os.path.exists(self.path):
+            size = os.path.getsize(self.path)
+        else:
+            return
+        if self._index_dirty:
+            with open(self.index_path, "w") as f:
+                json.dump({"size": size, "records": self.index}, f, separators=(",", ":"))
+            self._index_dirty = False
@@ -0,0 +1,180 @@
+import json
+import os
+import random
+import re
+import zlib
+from urllib.parse import urlparse
+
+# Cases with the same shape (method, URL template, body keys, headers, status) count as duplicates from
+# this description/body similarity on; cases with another body, headers or status only from
+# DEDUP_TEXT_SIMILARITY, and cases for another method or URL template never. Same-shape
+# security cases often differ only in the field they attack, so this sits well above the band cut-off.
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.8"))
+DEDUP_TEXT_SIMILARITY = float(os.getenv("DEDUP_TEXT_SIMILARITY", "0.85"))
+# 16 bands of 4 rows: pairs above ~0.5 Jaccard almost always share a band
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(MINHASH_BANDS * MINHASH_ROWS)]
+_WORD = re.compile(r"[a-z0-9]+")
+# Quotes, brackets, operators and the like: the value is a payload aimed at this field
+_PAYLOAD = re.compile(r"[^\w\s@.:/+-]")
+_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I)
+
+
+def url_template(url) -> str:
+    """Path with ids replaced by placeholders and query values dropped: /users/42?page=2 -> /users/{n}?page"""
+    parsed = urlparse(str(url).strip())
+    segments = []
+    for segment in parsed.path.rstrip("/").split("/"):
+        if re.fullmatch(r"-?\d+", segment):
+            segment = "{n}"
+        elif _UUID.match(segment) or re.fullmatch(r"[0-9a-fA-F]{16,}", segment):
+            segment = "{id}"
+        segments.append(segment)
+    query = "&".join(sorted(part.split("=", 1)[0] for part in parsed.query.split("&") if part))
+    return "/".join(segments) + ("?" + query if query else "")
+
+
+def body_shape(body, depth: int = 0):
+    # Key paths and value types, without the values
+    if isinstance(body, dict):
+        if depth >= 2:
+            return "{}"
+        return "{" + ",".join(f"{key}:{body_shape(body[key], depth + 1)}" for key in sorted(body, key=str)) + "}"
+    if isinstance(body, list):
+        return "[" + (body_shape(body[0], depth + 1) if body else "") + "]"
+    return type(body).__name__
+
+
+def _headers(tc: dict) -> dict:
+    headers = tc.get("headers")
+    return {str(k).lower(): str(v) for k, v in headers.items()} if isinstance(headers, dict) else {}
+
+
+def case_shape(tc: dict) -> tuple:
+    return (
+        str(tc.get("http_method", "")).strip().upper(),
+        url_template(tc.get("request_url", "")),
+        body_shape(tc.get("request_body")),
+        ",".join(sorted(_headers(tc))),
+        str(tc.get("expected_response_code", "")).strip(),
+    )
+
+
+def case_fingerprint(tc: dict) -> tuple:
+    # Exact duplicates: same request and expected status, whatever the description says
+    body = tc.get("request_body")
+    return (
+        str(tc.get("http_method", "")).strip().upper(),
+        str(tc.get("request_url", "")).strip().rstrip("/"),
+        json.dumps(body, sort_keys=True) if isinstance(body, (dict, list)) else str(body),
+        json.dumps(_headers(tc), sort_keys=True),
+        str(tc.get("expected_response_code", "")).strip(),
+    )
+
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}{key}.")
+    elif isinstance(value, list):
+        for item in value[:20]:
+            yield from _flatten(item, prefix)
+    else:
+        yield f"{prefix}{value}".lower()
+        # Which field carries a payload counts apart from the payload's text
+        if isinstance(value, str) and _PAYLOAD.search(value):
+            yield f"{prefix}~payload"
+
+
+def shingles(tc: dict) -> set:
+    """Description words and word pairs, plus the body's key=value leaves, the fields holding a payload, headers and the URL path."""
+    words = _WORD.findall(str(tc.get("description", "")).lower())
+    tokens = set(words)
+    tokens.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    tokens.update(_flatten(tc.get("request_body"), "body."))
+    tokens.update(f"header {key}={value}".lower() for key, value in _headers(tc).items())
+    tokens.add("url " + urlparse(str(tc.get("request_url", ""))).path.rstrip("/").lower())
+    return {zlib.crc32(token.encode("utf-8")) for token in tokens}
+
+
+def minhash(hashes: set) -> list:
+    return [min((a * x + b) % _PRIME for x in hashes) for a, b in _PERMUTATIONS]
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class SuiteDeduplicator:
+    """
+    Keeps a suite free of exact and near-duplicate test cases as cases are added one by one.
+    Candidate pairs come from MinHash LSH bands, so each add() only compares against the few
+    kept cases that share a band instead of all of them; candidates are then confirmed with
+    the exact Jaccard similarity of their shingle sets.
+    """
+
+    def __init__(self, similarity: float = DEDUP_SIMILARITY, text_similarity: float = DEDUP_TEXT_SIMILARITY):
+        self.similarity = similarity
+        self.text_similarity = text_similarity
+        self.kept = []  # (shape, shingles) per kept case
+        self.nearest = []  # highest similarity of each kept case to any other kept case
+        self._fingerprints = set()
+        self._bands = {}  # (band, band hash) -> indexes of kept cases
+        self.stats = {"exact": 0, "near": 0}
+
+    def add(self, tc: dict, force: bool = False) -> bool:
+        """
+        Returns False (and keeps nothing) when tc duplicates a case already kept.
+        force=True keeps it regardless, e.g. for cases accepted elsewhere that later ones must not repeat.
+        """
+        fingerprint = case_fingerprint(tc)
+        if fingerprint in self._fingerprints and not force:
+            self.stats["exact"] += 1
+            return False
+        shape, hashes = case_shape(tc), shingles(tc)
+        band_keys = []
+        if hashes:
+            signature = minhash(hashes)
+            band_keys = [(band, hash(tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS])))
+                         for band in range(MINHASH_BANDS)]
+        candidates = {index for key in band_keys for index in self._bands.get(key, ())}
+        scores = {}
+        for index in candidates:
+            other_shape, other_hashes = self.kept[index]
+            score = jaccard(hashes, other_hashes)
+            if shape == other_shape:
+                limit = self.similarity
+            else:
+                # Method and URL template decide what is being tested, however alike the text
+                limit = self.text_similarity if shape[:2] == other_shape[:2] else None
+            if limit is not None and score >= limit and not force:
+                self.stats["near"] += 1
+                return False
+            scores[index] = score
+        index = len(self.kept)
+        self.kept.append((shape, hashes))
+        self.nearest.append(max(scores.values(), default=0.0))
+        for other, score in scores.items():
+            self.nearest[other] = max(self.nearest[other], score)
+        self._fingerprints.add(fingerprint)
+        for key in band_keys:
+            self._bands.setdefault(key, []).append(index)
+        return True
+
+    def diversity(self) -> float:
+        """1.0 when no kept case resembles another; lower as cases share more of their text and body."""
+        if not self.nearest:
+            return 1.0
+        return 1.0 - sum(self.nearest) / len(self.nearest)
+
+    def snapshot(self):
+        return {
+            "kept": len(self.kept),
+            "distinct_shapes": len({shape for shape, _ in self.kept}),
+            "duplicates_removed": self.stats["exact"] + self.stats["near"],
+            "diversity": round(self.diversity(), 3),
+        }
@@ -0,0 +1,169 @@
+import json
+
+CATEGORY_KEYS = ["positive_tests", "negative_tests", "edge_tests", "security_tests"]
+
+
+def is_case_array_key(key):
+    # Arrays of test cases inside the root object, e.g. "positive_tests": [...]
+    return isinstance(key, str) and (key.endswith("_tests") or key in ("tests", "test_cases", "testcases"))
+
+
+class _Frame:
+    __slots__ = ("kind", "key", "start", "is_case_array", "has_case_array")
+
+    def __init__(self, kind, key, start):
+        self.kind = kind
+        self.key = key
+        self.start = start
+        self.is_case_array = False
+        self.has_case_array = False
+
+
+class TestCaseExtractor:
+    """
+    Resumable scanner that pulls complete test-case objects out of LLM text as it arrives.
+    Feed it chunks in order; every test-case object that has been fully closed is returned
+    together with the category array it belongs to (None for a bare root array/object).
+    Prose before the JSON and trailing commas before a closing bracket are tolerated, and
+    everything recovered before a truncation point is kept. report() describes what is missing.
+    """
+
+    def __init__(self):
+        self._text = []        # cleaned characters of the value currently being scanned
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._last_string = None
+        self._string_start = None
+        self._pending_key = None
+        self._last_sig = -1    # index in _text of the last non-whitespace character
+        self.parse_errors = 0
+        self.roots_closed = 0
+        self.counts = {}
+        self.closed_arrays = []
+
+    def feed(self, chunk: str):
+        found = []
+        text = self._text
+        for ch in chunk:
+            if self._in_string:
+                text.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = "".join(text[self._string_start + 1:-1])
+                    self._last_sig = len(text) - 1
+                continue
+            if not self._stack:
+                # Outside any JSON value: skip prose until an object or array opens
+                if ch not in "{[":
+                    continue
+                text.clear()
+                self._last_sig = -1
+            if ch in " \t\r\n":
+                if self._stack:
+                    text.append(ch)
+                continue
+            if ch in "}]":
+                if self._last_sig >= 0 and text[self._last_sig] == ",":
+                    # Drop a trailing comma before the closing bracket
+                    del text[self._last_sig]
+                text.append(ch)
+                self._last_sig = len(text) - 1
+                frame = self._stack.pop()
+                item = self._close_frame(frame)
+                if item is not None:
+                    found.append(item)
+                continue
+            text.append(ch)
+            self._last_sig = len(text) - 1
+            if ch == '"':
+                self._in_string = True
+                self._string_start = len(text) - 1
+            elif ch == ":":
+                self._pending_key = self._last_string
+            elif ch in "{[":
+                parent = self._stack[-1] if self._stack else None
+                key = None
+                if parent is not None and parent.kind == "{":
+                    key = self._pending_key
+                frame = _Frame(ch, key, len(text) - 1)
+                if ch == "[":
+                    if parent is None:
+                        frame.is_case_array = True
+                    elif len(self._stack) == 1 and parent.kind == "{" and is_case_array_key(key):
+                        frame.is_case_array = True
+                        parent.has_case_array = True
+                self._stack.append(frame)
+                self._pending_key = None
+        return found
+
+    def _close_frame(self, frame):
+        parent = self._stack[-1] if self._stack else None
+        if frame.kind == "[":
+            if frame.is_case_array and frame.key is not None:
+                self.closed_arrays.append(frame.key)
+            if parent is None:
+                self.roots_closed += 1
+            return None
+        if parent is not None:
+            if parent.kind == "[" and parent.is_case_array:
+                return self._emit(parent.key, frame.start)
+            return None
+        self.roots_closed += 1
+        # A root object without any *_tests arrays is itself a single test case
+        if not frame.has_case_array:
+            return self._emit(None, frame.start)
+        return None
+
+    def _emit(self, category, start):
+        raw = "".join(self._text[start:])
+        try:
+            obj = json.loads(raw)
+        except json.JSONDecodeError:
+            self.parse_errors += 1
+            return None
+        self.counts[category] = self.counts.get(category, 0) + 1
+        return category, obj
+
+    def _partial_case_open(self):
+        for depth, frame in enumerate(self._stack):
+            if frame.kind != "{":
+                continue
+            if depth == 0 and not frame.has_case_array:
+                return True
+            if depth > 0 and self._stack[depth - 1].is_case_array:
+                return True
+        return False
+
+    def report(self):
+        """Summary of the scan so far: counts per category, truncation and dropped partial cases."""
+        return {
+            "complete": self.roots_closed > 0 and not self._stack,
+            "truncated": bool(self._stack),
+            "open_array": next((f.key for f in self._stack if f.is_case_array), None),
+            "partial_case_dropped": self._partial_case_open(),
+            "counts": dict(self.counts),
+            "closed_arrays": list(self.closed_arrays),
+            "parse_errors": self.parse_errors,
+        }
+
+
+def extract_test_cases(raw: str, default_category: str = None):
+    """
+    Single pass over a complete LLM response.
+    Returns ({category_key: [test cases]}, report); cases without a category array land under default_category.
+    """
+    extractor = TestCaseExtractor()
+    cases = {}
+    for key, tc in extractor.feed(raw):
+        cases.setdefault(key or default_category, []).append(tc)
+    return cases, extractor.report()
+
+
+def missing_categories(cases: dict, min_cases: int, keys=CATEGORY_KEYS):
+    # Categories that came back with fewer than min_cases recovered test cases
+    return [key for key in keys if len(cases.get(key, [])) < min_cases]
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import httpx
+
+from cassette import LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, Cassette, CassetteMiss
+from llm_pool import OLLAMA_URLS, LLMPool, parse_nodes
+from metrics import observe_llm_call
+from retry_policy import RetryPolicy
+
+logger = logging.getLogger("ai_engine.llm_client")
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://host.docker.internal:11434/api/generate")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "deepseek-coder:6.7b-instruct")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+# Upper bound on generations in flight per Ollama node from this worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+# How long Ollama keeps the model loaded after a call; "-1" keeps it resident
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+# Send only the per-endpoint suffix plus the context returned when the shared prefix was
+# primed at warm-up. Off by default: Ollama already reuses the KV cache for a repeated
+# prompt prefix, and the context turns the prefix into a separate conversation turn.
+LLM_PREFIX_CONTEXT = os.getenv("LLM_PREFIX_CONTEXT", "0") == "1"
+LLM_WARMUP = os.getenv("LLM_WARMUP", "1") == "1"
+LLM_WARMUP_RETRY_INTERVAL = float(os.getenv("LLM_WARMUP_RETRY_INTERVAL", "10"))
+
+SYSTEM_PROMPT = "You are a JSON generator. Only output valid JSON objects. If the user input or your output is not valid JSON, fix it and return valid JSON only. Always parse and repair any malformed JSON in your output before returning."
+
+
+class LLMError(Exception):
+    """Raised when Ollama answers with a non-200 status."""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"Ollama API error {status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+def _consume_result(task: asyncio.Task):
+    # Losing hedges are cancelled or fail unobserved; mark their outcome as retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+class LLMClient:
+    """
+    Shared async transport for Ollama's /api/generate.
+    One long-lived httpx.AsyncClient keeps connections alive between calls, and an LLMPool
+    spreads calls over the configured Ollama nodes within each node's concurrency cap.
+    With a cassette in record mode every exchange is saved; in replay mode calls are
+    answered from the cassette and never reach the network.
+    """
+
+    def __init__(self, url: str = OLLAMA_URL, model: str = OLLAMA_MODEL,
+                 timeout: float = LLM_TIMEOUT, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_connections: int = LLM_MAX_CONNECTIONS, cassette: Cassette = None, nodes: str = OLLAMA_URLS):
+        self.model = model
+        self.timeout = timeout
+        self.pool = LLMPool(parse_nodes(nodes, url, max_concurrency), unavailable_error=lambda text: LLMError(503, text))
+        # Room for every node's generations plus its health probe
+        self.max_connections = max(max_connections, self.pool.capacity + len(self.pool.nodes))
+        self.policy = RetryPolicy(max_timeout=timeout)
+        self.cassette = cassette if cassette is not None and cassette.mode != "passthrough" else None
+        self._client = None
+        self.prefix_contexts = {}
+        self.readiness = {"state": "cold", "nodes": {node.url: {"state": "cold"} for node in self.pool.nodes}}
+
+    @property
+    def ready(self):
+        return self.readiness["state"] == "ready"
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=LLM_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self.pool.start(self._client)
+
+    async def close(self):
+        await self.pool.stop()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.cassette is not None:
+            self.cassette.close()
+
+    def build_payload(self, prompt: str, options: dict, system: str = SYSTEM_PROMPT, model: str = None,
+                      context: list = None, schema: dict = None) -> dict:
+        payload = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "system": system,
+            "stream": False,
+            "options": options,
+            "keep_alive": LLM_KEEP_ALIVE,
+        }
+        if context:
+            # Token state returned by an earlier call; the model continues that conversation
+            payload["context"] = context
+        if schema:
+            # Structured output: Ollama constrains decoding to this JSON Schema
+            payload["format"] = schema
+        return payload
+
+    async def generate(self, prompt: str, options: dict, system: str = SYSTEM_PROMPT, model: str = None,
+                       timeout: float = None, context: list = None, prefix: str = None, schema: dict = None) -> dict:
+        """
+        Runs one non-streaming generation and returns Ollama's JSON body; prefix is the shared
+        static part of the prompt (see warm_up) and schema an optional JSON Schema the output
+        must follow. When the call runs longer than its node
+        usually takes, a hedged duplicate goes to another node and the slower one is cancelled.
+        Raises LLMError on non-200 and httpx.TimeoutException on timeout.
+        """
+        prompt, context = self._apply_prefix(prompt, prefix, context, model)
+        payload = self.build_payload(prompt, options, system, model, context, schema)
+        if self.cassette is not None and self.cassette.mode == "replay":
+            return self._replay(payload)["response"]
+        await self.start()
+        self.policy.on_request()
+        primary_started = asyncio.get_running_loop().create_future()
+        primary = asyncio.ensure_future(self._post(payload, timeout, started=primary_started))
+        primary.add_done_callback(_consume_result)
+        tasks, errors = {primary}, []
+        try:
+            await asyncio.wait({primary, primary_started}, return_when=asyncio.FIRST_COMPLETED)
+            if primary_started.done() and not primary.done():
+                node, started_at = primary_started.result()
+                delay = self.policy.hedge_delay(node)
+                if delay is not None:
+                    done, _ = await asyncio.wait(tasks, timeout=max(0.0, started_at + delay - time.monotonic()))
+                    if not done and self.policy.spend_hedge():
+                        hedge = asyncio.ensure_future(self._post(payload, timeout, exclude=node))
+                        hedge.add_done_callback(_consume_result)
+                        tasks.add(hedge)
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                    elif task.result() is not None:
+                        if task is not primary:
+                            self.policy.stats["hedge_wins"] += 1
+                        return task.result()
+            raise errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _post(self, payload: dict, timeout: float = None, started: asyncio.Future = None, exclude=None):
+        # A hedge (exclude set) only runs if another node has a free slot right now
+        node = await self.pool.acquire(exclude=exclude, wait=exclude is None)
+        if node is None:
+            self.policy.refund_hedge()
+            return None
+        mode = "call" if exclude is None else "hedge"
+        call_started = time.monotonic()
+        try:
+            async with self.pool.lease(node):
+                if started is not None:
+                    started.set_result((node, time.monotonic()))
+                response = await self._client.post(
+                    node.url,
+                    json=payload,
+                    timeout=timeout if timeout is not None else self.policy.attempt_timeout(node),
+                )
+                if response.status_code != 200:
+                    self._record(payload, {"status": response.status_code, "text": response.text})
+                    raise LLMError(response.status_code, response.text)
+                body = response.json()
+        except asyncio.CancelledError:
+            observe_llm_call(payload["model"], mode, time.monotonic() - call_started, "cancelled")
+            raise
+        except httpx.TimeoutException:
+            observe_llm_call(payload["model"], mode, time.monotonic() - call_started, "timeout")
+            raise
+        except Exception:
+            observe_llm_call(payload["model"], mode, time.monotonic() - call_started, "error")
+            raise
+        observe_llm_call(payload["model"], mode, time.monotonic() - call_started, "ok", body)
+        self._record(payload, {"response": body})
+        return body
+
+    async def stream_generate(self, prompt: str, options: dict, system: str = SYSTEM_PROMPT,
+                              model: str = None, prefix: str = None, schema: dict = None):
+        """
+        Streams one generation, yielding Ollama's NDJSON chunks as they arrive.
+        The read timeout applies per chunk, so long generations are fine as long as tokens keep flowing.
+        """
+        prompt, context = self._apply_prefix(prompt, prefix, None, model)
+        payload = self.build_payload(prompt, options, system, model, context, schema)
+        payload["stream"] = True
+        if self.cassette is not None and self.cassette.mode == "replay":
+            for chunk in self._replay(payload)["chunks"]:
+                yield chunk
+            return
+        await self.start()
+        chunks = []
+        async with self.pool.lease(track_latency=False) as node:
+            call_started = time.monotonic()
+            async with self._client.stream("POST", node.url, json=payload) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    self._record(payload, {"status": response.status_code, "text": response.text})
+                    observe_llm_call(payload["model"], "stream", time.monotonic() - call_started, "error")
+                    raise LLMError(response.status_code, response.text)
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if self.cassette is not None:
+                        chunks.append(chunk)
+                    if chunk.get("done"):
+                        # The final chunk carries the same durations and counts as a non-streamed body
+                        observe_llm_call(payload["model"], "stream", time.monotonic() - call_started, "ok", chunk)
+                    yield chunk
+                    if chunk.get("done"):
+                        break
+        # Only complete streams are recorded; an abandoned one would replay as a truncation
+        if chunks and chunks[-1].get("done"):
+            self._record(payload, {"chunks": chunks})
+
+    def _apply_prefix(self, prompt: str, prefix: str, context: list, model: str):
+        if prefix is None:
+            return prompt, context
+        primed = self.prefix_contexts.get((model or self.model, prefix)) if LLM_PREFIX_CONTEXT else None
+        if primed and not context:
+            return prompt, primed
+        return prefix + prompt, context
+
+    async def warm_up(self, prefixes: list):
+        """
+        Loads the model on every node and evaluates each shared prompt prefix once, so the
+        first real request neither pays the cold start nor a full prompt evaluation.
+        Each node retries in the background until it answers; readiness is reported on
+        /health and turns ready as soon as one node is warm.
+        """
+        if self.cassette is not None and self.cassette.mode == "replay":
+            self.readiness["state"] = "ready"
+            return
+        await self.start()
+        self.readiness["state"] = "warming"
+        await asyncio.gather(*(self._warm_node(node, prefixes) for node in self.pool.nodes))
+
+    async def _warm_node(self, node, prefixes: list):
+        status = self.readiness["nodes"][node.url]
+        while True:
+            status["state"] = "warming"
+            try:
+                started = time.perf_counter()
+                # An empty prompt only loads the model into memory
+                load = {"model": self.model, "prompt": "", "stream": False, "keep_alive": LLM_KEEP_ALIVE}
+                response = await self._client.post(node.url, json=load)
+                if response.status_code != 200:
+                    raise LLMError(response.status_code, response.text)
+                status["cold_start_ms"] = round((time.perf_counter() - started) * 1000)
+                status["prefix_eval_ms"] = {}
+                for index, prefix in enumerate(prefixes):
+                    started = time.perf_counter()
+                    payload = self.build_payload(prefix, {"num_predict": 1, "temperature": 0})
+                    response = await self._client.post(node.url, json=payload)
+                    if response.status_code != 200:
+                        raise LLMError(response.status_code, response.text)
+                    body = response.json()
+                    if body.get("context"):
+                        self.prefix_contexts[(self.model, prefix)] = body["context"]
+                    status["prefix_eval_ms"][f"prefix_{index}"] = round((time.perf_counter() - started) * 1000)
+                status.update(state="ready", error=None)
+                self.readiness["state"] = "ready"
+                logger.info("LLM warm-up done for %s", node.url, extra={"warmup": dict(status)})
+                return
+            except (httpx.HTTPError, LLMError) as e:
+                status.update(state="unavailable", error=str(e) or type(e).__name__)
+                logger.warning("LLM warm-up failed for %s, retrying in %ss: %s", node.url, LLM_WARMUP_RETRY_INTERVAL, status["error"])
+                await asyncio.sleep(LLM_WARMUP_RETRY_INTERVAL)
+
+    def _replay(self, payload: dict) -> dict:
+        try:
+            exchange = self.cassette.lookup(payload)
+        except CassetteMiss as e:
+            # An unrecorded request fails like an Ollama error, so callers degrade the same way
+            raise LLMError(404, str(e)) from e
+        if "status" in exchange:
+            raise LLMError(exchange["status"], exchange["text"])
+        return exchange
+
+    def _record(self, payload: dict, exchange: dict):
+        if self.cassette is not None:
+            self.cassette.record(payload, exchange)
+
+
+llm_client = LLMClient(cassette=Cassette(LLM_CASSETTE_PATH, LLM_CASSETTE_MODE))
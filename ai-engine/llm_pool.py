@@ -0,0 +1,203 @@
+import asyncio
+import collections
+import contextlib
+import itertools
+import logging
+import os
+import time
+
+import httpx
+
+logger = logging.getLogger("ai_engine.llm_pool")
+
+# Comma-separated Ollama instances, each "url" or "url|max_concurrency"; empty means OLLAMA_URL only
+OLLAMA_URLS = os.getenv("OLLAMA_URLS", "")
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "10"))
+LLM_HEALTH_TIMEOUT = float(os.getenv("LLM_HEALTH_TIMEOUT", "2"))
+# Consecutive failures that open a node's circuit, and how long it stays open before a trial request
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# Successful call durations kept per node for the latency percentiles
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+
+
+def generate_url(url: str) -> str:
+    url = url.strip().rstrip("/")
+    return url if url.endswith("/api/generate") else url + "/api/generate"
+
+
+def parse_nodes(spec: str, default_url: str, default_concurrency: int):
+    """"http://gpu1:11434|4, http://gpu2:11434" -> [(generate url, max concurrency), ...]"""
+    nodes = []
+    for entry in (spec or default_url).split(","):
+        if not entry.strip():
+            continue
+        url, _, cap = entry.partition("|")
+        nodes.append((generate_url(url), int(cap) if cap.strip() else default_concurrency))
+    return nodes
+
+
+class LLMNode:
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url
+        self.base_url = url[: -len("/api/generate")]
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.healthy = True
+        self.breaker = "closed"  # closed -> open after repeated failures -> half_open trial -> closed
+        self.failures = 0
+        self.opened_at = 0.0
+        self.stats = {"requests": 0, "errors": 0, "ejections": 0}
+        self.latencies = collections.deque(maxlen=LLM_LATENCY_WINDOW)
+
+    def latency_percentile(self, pct: float):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def accepts(self, now: float) -> bool:
+        if not self.healthy or self.in_flight >= self.max_concurrency:
+            return False
+        if self.breaker == "open":
+            return now - self.opened_at >= LLM_BREAKER_COOLDOWN
+        if self.breaker == "half_open":
+            return self.in_flight == 0  # a single trial request at a time
+        return True
+
+    def usable(self, now: float) -> bool:
+        """Could take work once a slot frees up, i.e. it is worth waiting for."""
+        return self.healthy and (self.breaker != "open" or now - self.opened_at >= LLM_BREAKER_COOLDOWN)
+
+    def snapshot(self):
+        return {
+            "url": self.url, "max_concurrency": self.max_concurrency, "in_flight": self.in_flight,
+            "healthy": self.healthy, "breaker": self.breaker, "failures": self.failures, **self.stats,
+            "latency_p50_ms": round(self.latency_percentile(50) * 1000) if self.latencies else None,
+            "latency_p95_ms": round(self.latency_percentile(95) * 1000) if self.latencies else None,
+        }
+
+
+class LLMPool:
+    """
+    Routes each LLM call to the node with the fewest outstanding requests relative to its
+    capacity. Calls beyond every node's cap wait for a free slot. A node is skipped while
+    its health probe fails, and its circuit opens after LLM_BREAKER_THRESHOLD consecutive
+    failures; after LLM_BREAKER_COOLDOWN one trial request decides whether it rejoins.
+    """
+
+    def __init__(self, nodes: list, unavailable_error=RuntimeError):
+        self.nodes = [LLMNode(url, cap) for url, cap in nodes]
+        self.unavailable_error = unavailable_error
+        self.waiting = 0  # calls blocked in acquire() for a free slot
+        self._released = None
+        self._probe_task = None
+        self._turn = itertools.count()
+
+    @property
+    def capacity(self):
+        return sum(node.max_concurrency for node in self.nodes)
+
+    def start(self, client: httpx.AsyncClient):
+        self._released = asyncio.Event()
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop(client))
+
+    async def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+
+    def _pick(self, now: float, exclude=None):
+        candidates = [node for node in self.nodes if node.accepts(now) and node is not exclude]
+        if not candidates:
+            return None
+        # Rotate the starting point so equally loaded nodes share the work
+        turn = next(self._turn) % len(self.nodes)
+        return min(candidates, key=lambda n: (n.in_flight / n.max_concurrency, (self.nodes.index(n) - turn) % len(self.nodes)))
+
+    async def acquire(self, exclude: LLMNode = None, wait: bool = True) -> LLMNode:
+        """Takes a slot on the best node other than exclude; with wait=False returns None when none is free."""
+        while True:
+            now = time.monotonic()
+            node = self._pick(now, exclude)
+            if node is not None:
+                if node.breaker == "open":
+                    node.breaker = "half_open"
+                node.in_flight += 1
+                node.stats["requests"] += 1
+                return node
+            if not wait:
+                return None
+            if not any(node.usable(now) for node in self.nodes):
+                raise self.unavailable_error("No healthy LLM node available")
+            self._released.clear()
+            self.waiting += 1
+            try:
+                # Re-check periodically as well: a cooldown can end without any release
+                await asyncio.wait_for(self._released.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.waiting -= 1
+
+    def release(self, node: LLMNode, ok: bool = None, duration: float = None):
+        """ok=True/False records the outcome for the breaker; None (cancelled) leaves it unchanged."""
+        node.in_flight -= 1
+        if ok:
+            if duration is not None:
+                node.latencies.append(duration)
+            node.failures = 0
+            node.breaker = "closed"
+        elif ok is False:
+            node.failures += 1
+            node.stats["errors"] += 1
+            if node.breaker == "half_open" or node.failures >= LLM_BREAKER_THRESHOLD:
+                if node.breaker != "open":
+                    node.stats["ejections"] += 1
+                    logger.warning("Circuit opened for LLM node %s after %d failures", node.url, node.failures)
+                node.breaker = "open"
+                node.opened_at = time.monotonic()
+        elif node.breaker == "half_open":
+            node.breaker = "open"  # the trial never finished; wait for the next one
+        self._released.set()
+
+    @contextlib.asynccontextmanager
+    async def lease(self, node: LLMNode = None, track_latency: bool = True):
+        """
+        Holds a slot for the duration of one call; pass a node already taken with acquire() to
+        use it. Streams pass track_latency=False since their duration includes the consumer.
+        """
+        node = node or await self.acquire()
+        started = time.monotonic()
+        try:
+            yield node
+        except (asyncio.CancelledError, GeneratorExit):
+            self.release(node, None)
+            raise
+        except Exception as e:
+            # A 4xx means the node answered and the request was at fault
+            self.release(node, getattr(e, "status_code", 500) < 500)
+            raise
+        else:
+            self.release(node, True, time.monotonic() - started if track_latency else None)
+
+    async def _probe_loop(self, client: httpx.AsyncClient):
+        while True:
+            await asyncio.gather(*(self._probe(client, node) for node in self.nodes))
+            await asyncio.sleep(LLM_HEALTH_INTERVAL)
+
+    async def _probe(self, client: httpx.AsyncClient, node: LLMNode):
+        try:
+            response = await client.get(node.base_url + "/api/tags", timeout=LLM_HEALTH_TIMEOUT)
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        if healthy != node.healthy:
+            logger.warning("LLM node %s is now %s", node.url, "healthy" if healthy else "unreachable")
+            node.healthy = healthy
+            if healthy:
+                self._released.set()
+
+    def snapshot(self):
+        return [node.snapshot() for node in self.nodes]
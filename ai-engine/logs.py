@@ -0,0 +1,149 @@
+import collections
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+from metrics import LOG_RECORDS_DROPPED
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json (one object per line, for log shipping) or text (for a terminal)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Share of records kept per level, e.g. "DEBUG=0.05,INFO=0.5"; unlisted levels keep everything
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "DEBUG=0.1")
+# Longer message and field strings are cut; full payloads go to the generation ring buffer
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))
+# Records beyond this backlog are dropped rather than blocking a request on stdout
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Raw LLM responses kept in memory for /debug/generations
+DEBUG_GENERATIONS = int(os.getenv("DEBUG_GENERATIONS", "50"))
+
+_RECORD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
+
+
+def truncate(value, limit: int = LOG_MAX_FIELD_CHARS):
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}... [{len(value) - limit} more chars]"
+    return value
+
+
+def parse_sample_rates(spec: str) -> dict:
+    rates = {}
+    for entry in spec.split(","):
+        level, _, rate = entry.partition("=")
+        if level.strip() and rate.strip():
+            rates[logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps each record with its level's configured probability."""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra= fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate(record.getMessage()),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = truncate(value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(f"{key}={truncate(value)!r}" for key, value in record.__dict__.items()
+                          if key not in _RECORD_ATTRS)
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {truncate(record.getMessage())}"
+        if fields:
+            line += " " + fields
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread without waiting. Formatting happens on that
+    thread; here the message is only frozen so later mutation of args cannot change it.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class LogPipeline:
+    def __init__(self, listener: logging.handlers.QueueListener):
+        self.listener = listener
+
+    def stop(self):
+        # Drains what is already queued before returning
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+
+def configure_logging(name: str = "ai_engine") -> LogPipeline:
+    """Routes the ai_engine logger through a bounded queue to a stdout writer thread."""
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    logger.addHandler(handler)
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    return LogPipeline(listener)
+
+
+class RecentGenerations:
+    """Bounded ring buffer of the last raw LLM responses, newest last."""
+
+    def __init__(self, size: int = DEBUG_GENERATIONS, normalize=str.strip):
+        self._entries = collections.deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self.normalize = normalize
+
+    def add(self, endpoint: str, category, raw_response: str, **details):
+        self._entries.append({
+            "id": next(self._ids), "ts": round(time.time(), 3), "endpoint": self.normalize(endpoint),
+            "category": category, "raw_response": raw_response, **details,
+        })
+
+    def latest(self, limit: int = 20, endpoint: str = None):
+        if endpoint is not None:
+            endpoint = self.normalize(endpoint)
+        entries = [e for e in self._entries if endpoint is None or e["endpoint"] == endpoint]
+        return entries[-limit:][::-1] if limit > 0 else []
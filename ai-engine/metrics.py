@@ -0,0 +1,143 @@
+import contextvars
+
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Category of the generation the current task works on, so LLM calls made deep inside it are labeled too
+current_category = contextvars.ContextVar("current_category", default="all")
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+CPU_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+TOKEN_RATE_BUCKETS = (1, 2.5, 5, 10, 20, 30, 50, 75, 100, 200, 500)
+
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_seconds", "Wall time of one Ollama call as seen by this worker",
+    ["model", "category", "mode", "outcome"], buckets=LATENCY_BUCKETS,
+)
+LLM_PROMPT_EVAL_SECONDS = Histogram(
+    "llm_prompt_eval_seconds", "Ollama prompt_eval_duration", ["model", "category"], buckets=LATENCY_BUCKETS,
+)
+LLM_EVAL_SECONDS = Histogram(
+    "llm_eval_seconds", "Ollama eval_duration (token generation)", ["model", "category"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second", "eval_count / eval_duration", ["model", "category"], buckets=TOKEN_RATE_BUCKETS,
+)
+LLM_TOKENS = Counter("llm_tokens", "Tokens evaluated (prompt) and generated (eval)", ["model", "category", "kind"])
+PARSE_SECONDS = Histogram("parse_seconds", "Extracting test cases from one raw response", ["category"], buckets=CPU_BUCKETS)
+NORMALIZE_SECONDS = Histogram("normalize_seconds", "Normalizing and filtering one suite", ["category"], buckets=CPU_BUCKETS)
+GENERATION_SECONDS = Histogram(
+    "generation_seconds", "End-to-end time to return a suite, by where it came from",
+    ["model", "category", "source"], buckets=LATENCY_BUCKETS,
+)
+GENERATION_RETRIES = Counter("generation_retries", "Generation attempts repeated or resumed", ["category", "reason"])
+PARSE_OUTCOMES = Counter(
+    "generation_parse_outcomes",
+    "Raw responses by parse result: validated (schema fast path), complete, salvaged (partial) or failed",
+    ["category", "outcome"],
+)
+CASES_REJECTED = Counter(
+    "generated_cases_rejected", "Generated test cases failing validation, by the first problem found",
+    ["category", "reason"],
+)
+DUPLICATES_REMOVED = Counter(
+    "generated_cases_duplicates", "Generated test cases dropped as exact or near duplicates of a kept one",
+    ["category", "kind"],
+)
+SUITE_DIVERSITY = Histogram(
+    "suite_diversity", "1 - mean similarity of each kept test case to its nearest neighbour", ["category"],
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+REVALIDATIONS = Counter(
+    "background_regenerations", "Stale or drafted suites regenerated after serving them, by outcome",
+    ["category", "outcome"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "HTTP handler time until the response starts", ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+LOG_RECORDS_DROPPED = Counter("log_records_dropped", "Log records dropped because the log queue was full")
+
+
+def observe_llm_call(model: str, mode: str, seconds: float, outcome: str, body: dict = None):
+    category = current_category.get()
+    LLM_CALL_SECONDS.labels(model, category, mode, outcome).observe(seconds)
+    if not body:
+        return
+    # Ollama reports durations in nanoseconds
+    if body.get("prompt_eval_duration"):
+        LLM_PROMPT_EVAL_SECONDS.labels(model, category).observe(body["prompt_eval_duration"] / 1e9)
+    if body.get("prompt_eval_count"):
+        LLM_TOKENS.labels(model, category, "prompt").inc(body["prompt_eval_count"])
+    if body.get("eval_duration"):
+        LLM_EVAL_SECONDS.labels(model, category).observe(body["eval_duration"] / 1e9)
+        if body.get("eval_count"):
+            LLM_TOKENS_PER_SECOND.labels(model, category).observe(body["eval_count"] / (body["eval_duration"] / 1e9))
+    if body.get("eval_count"):
+        LLM_TOKENS.labels(model, category, "eval").inc(body["eval_count"])
+
+
+def observe_parse(category: str, seconds: float, count: int, report: dict):
+    PARSE_SECONDS.labels(category).observe(seconds)
+    if count == 0:
+        outcome = "failed"
+    elif report.get("structured"):
+        outcome = "validated"
+    elif report["truncated"] or report["parse_errors"]:
+        outcome = "salvaged"
+    else:
+        outcome = "complete"
+    PARSE_OUTCOMES.labels(category, outcome).inc()
+
+
+class RuntimeCollector:
+    """Reads the counters the cache, single-flight, LLM pool, retry policy and store writer already keep, at scrape time."""
+
+    def __init__(self, model: str, result_cache, inflight, pool, policy, store_writer):
+        self.model = model
+        self.result_cache = result_cache
+        self.inflight = inflight
+        self.pool = pool
+        self.policy = policy
+        self.store_writer = store_writer
+
+    def collect(self):
+        cache = self.result_cache.snapshot()
+        lookups = CounterMetricFamily("cache_lookups", "Result cache lookups by outcome", labels=["result"])
+        for result, key in (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses")):
+            lookups.add_metric([result], cache[key])
+        yield lookups
+        yield GaugeMetricFamily("cache_memory_entries", "Entries in the in-process LRU", value=cache["memory_entries"])
+        yield GaugeMetricFamily("cache_memory_bytes", "Bytes held by the in-process LRU", value=cache["memory_bytes"])
+
+        flights = self.inflight.snapshot()
+        coalesced = CounterMetricFamily("singleflight_calls", "Generations started vs joined", labels=["role"])
+        coalesced.add_metric(["leader"], flights["leaders"])
+        coalesced.add_metric(["coalesced"], flights["coalesced"])
+        yield coalesced
+        yield GaugeMetricFamily("singleflight_in_flight", "Distinct generations running", value=flights["in_flight"])
+
+        in_flight = GaugeMetricFamily("llm_node_in_flight", "Calls running on each Ollama node", labels=["node", "model"])
+        healthy = GaugeMetricFamily("llm_node_up", "1 when the node passes probes and its circuit is not open", labels=["node"])
+        for node in self.pool.nodes:
+            in_flight.add_metric([node.url, self.model], node.in_flight)
+            healthy.add_metric([node.url], 1 if node.healthy and node.breaker != "open" else 0)
+        yield in_flight
+        yield healthy
+        yield GaugeMetricFamily("llm_queue_depth", "Calls waiting for a free node slot", value=self.pool.waiting)
+
+        policy = self.policy.snapshot()
+        hedges = CounterMetricFamily("llm_hedges", "Hedged duplicate calls", labels=["outcome"])
+        hedges.add_metric(["sent"], policy["hedged"])
+        hedges.add_metric(["won"], policy["hedge_wins"])
+        hedges.add_metric(["denied"], policy["hedges_denied"])
+        yield hedges
+
+        yield GaugeMetricFamily(
+            "store_write_queue_depth", "Generation runs waiting to be persisted",
+            value=self.store_writer.queue_depth,
+        )
+
+
+def register_runtime(**sources):
+    REGISTRY.register(RuntimeCollector(**sources))
@@ -0,0 +1,219 @@
+import json
+
+import yaml
+
+try:
+    # libyaml is several times faster on multi-MB specs
+    from yaml import CSafeLoader as SpecLoader
+except ImportError:
+    from yaml import SafeLoader as SpecLoader
+
+HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch", "trace")
+MAX_SCHEMA_DEPTH = 4
+MAX_SCHEMA_PROPERTIES = 25
+# Keywords kept per field for rule-based test values
+FIELD_KEYWORDS = ("type", "format", "enum", "minimum", "maximum", "minLength", "maxLength", "minItems", "maxItems", "pattern")
+
+
+class SpecError(ValueError):
+    """Raised when the input is not an OpenAPI 3 document."""
+
+
+def load_spec(text: str) -> dict:
+    text = text.strip()
+    if not text:
+        raise SpecError("Empty OpenAPI spec")
+    try:
+        spec = json.loads(text) if text[0] == "{" else yaml.load(text, Loader=SpecLoader)
+    except (json.JSONDecodeError, yaml.YAMLError) as e:
+        raise SpecError(f"Could not parse spec: {e}")
+    if not isinstance(spec, dict) or not str(spec.get("openapi", "")).startswith("3"):
+        raise SpecError("Only OpenAPI 3.x documents are supported")
+    if not isinstance(spec.get("paths"), dict):
+        raise SpecError("Spec has no paths")
+    return spec
+
+
+class RefResolver:
+    """Resolves local "#/..." references lazily, memoizing each target once."""
+
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self._cache = {}
+
+    def resolve(self, node):
+        seen = set()
+        while isinstance(node, dict) and "$ref" in node:
+            ref = node["$ref"]
+            if ref in seen or not isinstance(ref, str) or not ref.startswith("#/"):
+                return {}
+            seen.add(ref)
+            if ref not in self._cache:
+                target = self.spec
+                for part in ref[2:].split("/"):
+                    part = part.replace("~1", "/").replace("~0", "~")
+                    target = target.get(part, {}) if isinstance(target, dict) else {}
+                self._cache[ref] = target
+            node = self._cache[ref]
+        return node
+
+
+def summarize_schema(schema, resolver: RefResolver, depth=0):
+    """
+    Compact, prompt-friendly rendering of a JSON schema, e.g.
+    {name: string (required), age: integer >=0, tags: [string]}.
+    """
+    ref_name = schema.get("$ref", "").rsplit("/", 1)[-1] if isinstance(schema, dict) else ""
+    schema = resolver.resolve(schema)
+    if not isinstance(schema, dict) or not schema:
+        return "any"
+    if depth >= MAX_SCHEMA_DEPTH:
+        return ref_name or schema.get("type", "any")
+    for combiner in ("oneOf", "anyOf", "allOf"):
+        if combiner in schema:
+            parts = [summarize_schema(s, resolver, depth + 1) for s in schema[combiner][:4]]
+            joiner = " & " if combiner == "allOf" else " | "
+            return joiner.join(parts)
+    if "enum" in schema:
+        return "enum(" + ", ".join(json.dumps(v) for v in schema["enum"][:10]) + ")"
+    kind = schema.get("type")
+    if kind == "array" or "items" in schema:
+        return "[" + summarize_schema(schema.get("items", {}), resolver, depth + 1) + "]"
+    if kind == "object" or "properties" in schema:
+        required = set(schema.get("required", []))
+        fields = []
+        for name, prop in list(schema.get("properties", {}).items())[:MAX_SCHEMA_PROPERTIES]:
+            rendered = summarize_schema(prop, resolver, depth + 1)
+            fields.append(f"{name}: {rendered}" + (" (required)" if name in required else ""))
+        return "{" + ", ".join(fields) + "}" if fields else "object"
+    constraints = []
+    for key, label in (("format", ""), ("minimum", ">="), ("maximum", "<="),
+                       ("minLength", "minLength "), ("maxLength", "maxLength "), ("pattern", "pattern ")):
+        if key in schema:
+            constraints.append(f"{label}{schema[key]}")
+    return " ".join([kind or "any"] + constraints)
+
+
+def field_spec(schema, resolver: RefResolver) -> dict:
+    """Resolved type and constraints of one field, e.g. {"type": "integer", "minimum": 1}."""
+    schema = resolver.resolve(schema)
+    if not isinstance(schema, dict):
+        return {}
+    if schema.get("allOf"):
+        merged = {}
+        for part in schema["allOf"][:4]:
+            merged.update(field_spec(part, resolver))
+        return merged
+    for combiner in ("oneOf", "anyOf"):
+        if schema.get(combiner):
+            return field_spec(schema[combiner][0], resolver)
+    spec = {key: schema[key] for key in FIELD_KEYWORDS if key in schema}
+    if isinstance(spec.get("type"), list):
+        # OpenAPI 3.1 nullable types: ["string", "null"]
+        spec["type"] = next((t for t in spec["type"] if t != "null"), "string")
+    if "type" not in spec:
+        spec["type"] = "object" if "properties" in schema else "array" if "items" in schema else "string"
+    return spec
+
+
+def body_fields(schema, resolver: RefResolver) -> dict:
+    """Top-level properties of an object body: name -> field_spec plus "required"."""
+    schema = resolver.resolve(schema)
+    if not isinstance(schema, dict):
+        return {}
+    properties, required = {}, set(schema.get("required", []))
+    for part in [schema] + [resolver.resolve(p) for p in schema.get("allOf", [])[:4]]:
+        if isinstance(part, dict):
+            properties.update(part.get("properties", {}))
+            required.update(part.get("required", []))
+    fields = {}
+    for name, prop in list(properties.items())[:MAX_SCHEMA_PROPERTIES]:
+        fields[name] = {**field_spec(prop, resolver), "required": name in required}
+    return fields
+
+
+def iter_operations(spec: dict):
+    """
+    Yields one operation dict per (path, method), resolving only the schemas that operation
+    references, so the caller can start generating before the whole spec has been walked.
+    """
+    resolver = RefResolver(spec)
+    servers = spec.get("servers") or [{}]
+    base_url = servers[0].get("url", "") if isinstance(servers[0], dict) else ""
+    for path, path_item in spec["paths"].items():
+        path_item = resolver.resolve(path_item)
+        if not isinstance(path_item, dict):
+            continue
+        shared_params = path_item.get("parameters", [])
+        for method in HTTP_METHODS:
+            operation = path_item.get(method)
+            if not isinstance(operation, dict):
+                continue
+            params = []
+            for param in list(shared_params) + list(operation.get("parameters", [])):
+                param = resolver.resolve(param)
+                if not isinstance(param, dict) or "name" not in param:
+                    continue
+                params.append({
+                    "name": param["name"],
+                    "in": param.get("in", "query"),
+                    "required": bool(param.get("required", param.get("in") == "path")),
+                    "schema": summarize_schema(param.get("schema", {}), resolver),
+                    "spec": field_spec(param.get("schema", {}), resolver),
+                })
+            body = None
+            request_body = resolver.resolve(operation.get("requestBody", {}))
+            content = request_body.get("content", {}) if isinstance(request_body, dict) else {}
+            if content:
+                content_type = "application/json" if "application/json" in content else next(iter(content))
+                body = {
+                    "content_type": content_type,
+                    "required": bool(request_body.get("required", False)),
+                    "schema": summarize_schema(content[content_type].get("schema", {}), resolver),
+                    "fields": body_fields(content[content_type].get("schema", {}), resolver),
+                }
+            responses = {}
+            declared = operation.get("responses")
+            for code, response in (declared.items() if isinstance(declared, dict) else ()):
+                response = resolver.resolve(response)
+                # Unresolvable references and malformed entries say nothing about the response
+                if not isinstance(response, dict):
+                    continue
+                response_content = response.get("content")
+                media = next(iter(response_content.values()), None) if isinstance(response_content, dict) else None
+                schema = media.get("schema") if isinstance(media, dict) else None
+                responses[str(code)] = summarize_schema(schema, resolver) if schema else response.get("description", "")
+            yield {
+                "operation_id": operation.get("operationId") or f"{method}_{path}",
+                "method": method.upper(),
+                "path": path,
+                "base_url": base_url,
+                "summary": operation.get("summary") or operation.get("description", ""),
+                "security": bool(operation.get("security", spec.get("security"))),
+                "parameters": params,
+                "request_body": body,
+                "responses": responses,
+            }
+
+
+def operation_endpoint(operation: dict) -> str:
+    return f"{operation['method']} {operation['base_url'].rstrip('/')}{operation['path']}"
+
+
+def describe_operation(operation: dict) -> str:
+    # Prompt context so the LLM uses the real parameter names, body fields and status codes
+    lines = []
+    if operation["summary"]:
+        lines.append(f"Summary: {operation['summary']}")
+    if operation["security"]:
+        lines.append("Requires authentication.")
+    for param in operation["parameters"]:
+        required = "required" if param["required"] else "optional"
+        lines.append(f"Parameter {param['name']} (in {param['in']}, {required}): {param['schema']}")
+    if operation["request_body"]:
+        body = operation["request_body"]
+        required = "required" if body["required"] else "optional"
+        lines.append(f"Request body ({body['content_type']}, {required}): {body['schema']}")
+    for code, schema in operation["responses"].items():
+        lines.append(f"Response {code}: {schema}")
+    return "\n".join(lines)
@@ -0,0 +1,187 @@
+import json
+import logging
+from urllib.parse import urlparse
+
+from json_extract import CATEGORY_KEYS, extract_test_cases, missing_categories
+from schemas import HTTP_METHODS, validate_case, validate_cases
+
+logger = logging.getLogger("ai_engine.postprocess")
+
+REQUIRED_KEYS = [
+    "request_url",
+    "http_method",
+    "headers",
+    # "content_type",  # Removed content_type from required keys
+    "request_body",
+    "expected_response_code",
+    "expected_response_body",
+    "description"  # Add description to required keys
+]
+
+
+def normalize_test_case(tc):
+    # If the test case is not a dict, return a dict with all N/A
+    if not isinstance(tc, dict):
+        return {k: "N/A" for k in REQUIRED_KEYS}
+    # If it already has the required keys, return as is
+    if all(k in tc for k in REQUIRED_KEYS):
+        return tc
+    # Try to map common LLM keys to expected keys
+    mapping = {
+        "url": "request_url",
+        "method": "http_method",
+        "status": "expected_response_code",
+        "data": "expected_response_body",
+        "body": "request_body",
+        "response_code": "expected_response_code",
+        "response_body": "expected_response_body",
+        "desc": "description"
+    }
+    norm = {k: tc.get(k, "N/A") for k in REQUIRED_KEYS}
+    for src, dst in mapping.items():
+        if src in tc and norm[dst] == "N/A":
+            norm[dst] = tc[src]
+    # If the LLM returned a nested 'data' or 'body', use as response/request body
+    if "data" in tc and norm["expected_response_body"] == "N/A":
+        norm["expected_response_body"] = tc["data"]
+    if "body" in tc and norm["request_body"] == "N/A":
+        norm["request_body"] = tc["body"]
+    # If the LLM returned a 'desc' or similar, use as description
+    if "desc" in tc and norm["description"] == "N/A":
+        norm["description"] = tc["desc"]
+    return norm
+
+
+def clean_and_parse_json(raw_response):
+    # Take the first complete test-case object the extractor can recover
+    cases, report = extract_test_cases(raw_response)
+    for arr in cases.values():
+        if arr:
+            return arr[0]
+    logger.info("No JSON object found in response", extra={"report": report, "raw_response": raw_response})
+    return None
+
+
+def parse_generation(raw_response: str, category: str = None, min_cases=5):
+    """
+    Turns one raw LLM response into (candidate, count, enough, report).
+    candidate is the category's list or the *_tests dict; enough tells the caller whether
+    retrying could help: only when the output was cut off before min_cases were recovered.
+    """
+    category_key = category + "_tests" if category else None
+    cases, report = extract_test_cases(raw_response, default_category=category_key)
+    if category:
+        # Fall back to everything recovered if the LLM used other category keys
+        candidate = cases.get(category_key) or [tc for lst in cases.values() for tc in lst]
+        count = len(candidate)
+        enough = count >= min_cases or (count > 0 and not report["truncated"])
+    else:
+        candidate = {key: cases.get(key, []) for key in CATEGORY_KEYS}
+        count = sum(len(v) for v in candidate.values())
+        report["missing"] = missing_categories(candidate, min_cases)
+        enough = count > 0 and (not report["missing"] or not report["truncated"])
+    return candidate, count, enough, report
+
+
+def parse_structured(raw_response: str, category: str = None, min_cases=5):
+    """
+    Fast path for schema-constrained output: one json.loads and a model validation.
+    Anything that does not validate (truncated, off-schema) goes through parse_generation.
+    Same return shape as parse_generation; report["structured"] marks the fast path.
+    """
+    try:
+        data = json.loads(raw_response)
+        if category:
+            candidate = validate_cases(data[category + "_tests"])
+            count = len(candidate)
+        else:
+            candidate = {key: validate_cases(data.get(key, [])) for key in CATEGORY_KEYS}
+            count = sum(len(v) for v in candidate.values())
+    except (ValueError, KeyError, TypeError):
+        return parse_generation(raw_response, category, min_cases)
+    report = {"structured": True, "truncated": False, "parse_errors": 0}
+    if category:
+        # A complete response cannot be improved by retrying the same prompt
+        return candidate, count, count > 0, report
+    report["missing"] = missing_categories(candidate, min_cases)
+    return candidate, count, count > 0, report
+
+
+def parse_structured_case(raw_response: str):
+    # Single test case: validated directly, or recovered by the tolerant extractor
+    try:
+        return validate_case(json.loads(raw_response))
+    except (ValueError, TypeError):
+        return clean_and_parse_json(raw_response)
+
+
+def filter_by_category(testcases, category):
+    """
+    Filters a list of test cases to only include those matching the given category in their description or metadata.
+    If the input is already a list of only the selected category, returns as is.
+    Nothing is capped here: the caller keeps the first distinct cases and regenerates shortfalls.
+    """
+    # Accept both full category name and short (e.g., 'positive' or 'positive_tests')
+    cat = category.lower()
+    filtered = []
+    for tc in testcases:
+        # Some LLMs add a 'category' field, some only have description
+        tc_cat = tc.get('category', '').lower() if isinstance(tc, dict) else ''
+        desc = tc.get('description', '').lower() if isinstance(tc, dict) else ''
+        if cat in tc_cat or cat in desc:
+            filtered.append(tc)
+    # If nothing matched, assume all are of the requested category (LLM may not label)
+    if not filtered and isinstance(testcases, list):
+        filtered = testcases
+    return filtered
+
+
+PLACEHOLDER_DESCRIPTIONS = {"test case", "description", "string", "n/a", "todo", "test"}
+
+
+def case_problems(tc) -> list:
+    """
+    Reasons a normalized test case cannot be used as is: missing_field, bad_url,
+    bad_method, bad_status or weak_description. Empty when the case is fine.
+    """
+    if not isinstance(tc, dict):
+        return ["missing_field"]
+    problems = []
+    if any(tc.get(key) in (None, "", "N/A") for key in ("description", "request_url", "http_method", "expected_response_code")):
+        problems.append("missing_field")
+    url = str(tc.get("request_url") or "").strip()
+    if url and url != "N/A":
+        parsed = urlparse(url)
+        # Absolute http(s) URLs or plain paths; templated segments like {id} are fine
+        if " " in url or not (url.startswith("/") or (parsed.scheme in ("http", "https") and parsed.netloc)):
+            problems.append("bad_url")
+    method = tc.get("http_method")
+    if method not in (None, "", "N/A") and str(method).strip().upper() not in HTTP_METHODS:
+        problems.append("bad_method")
+    code = tc.get("expected_response_code")
+    if code not in (None, "", "N/A"):
+        try:
+            if not 100 <= int(str(code).strip()) <= 599:
+                problems.append("bad_status")
+        except ValueError:
+            problems.append("bad_status")
+    description = str(tc.get("description") or "").strip()
+    if description and description != "N/A":
+        lowered = description.lower()
+        if (len(description) < 10 or len(description.split()) < 2 or lowered in PLACEHOLDER_DESCRIPTIONS
+                or lowered.startswith("dummy")):
+            problems.append("weak_description")
+    return problems
+
+
+def screen_cases(testcases):
+    """Normalizes every case and splits them into (accepted, [(case, problems), ...])."""
+    accepted, rejected = [], []
+    for tc in testcases or []:
+        norm = normalize_test_case(tc)
+        problems = case_problems(norm)
+        if problems:
+            rejected.append((norm, problems))
+        else:
+            accepted.append(norm)
+    return accepted, rejected
@@ -0,0 +1,66 @@
+import os
+import random
+
+LLM_HEDGING = os.getenv("LLM_HEDGING", "1") == "1"
+# A duplicate request is sent once the primary has run longer than this percentile of its node's latency
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Hedges may add at most this share of extra load; LLM_HEDGE_BURST lets a few through back to back
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_HEDGE_BURST = float(os.getenv("LLM_HEDGE_BURST", "3"))
+LLM_LATENCY_MIN_SAMPLES = int(os.getenv("LLM_LATENCY_MIN_SAMPLES", "20"))
+# Per-attempt timeout: this multiple of the node's p99, kept between the floor and LLM_TIMEOUT
+LLM_ATTEMPT_TIMEOUT_FACTOR = float(os.getenv("LLM_ATTEMPT_TIMEOUT_FACTOR", "3"))
+LLM_MIN_ATTEMPT_TIMEOUT = float(os.getenv("LLM_MIN_ATTEMPT_TIMEOUT", "15"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+
+
+class RetryPolicy:
+    """
+    Decides when to hedge a slow LLM call, how long one attempt may take and how long to
+    back off after a failure, from the rolling latency each LLMNode keeps.
+    Hedges are paid for from a token bucket that refills by LLM_HEDGE_BUDGET per request,
+    so they never exceed that share of the traffic.
+    """
+
+    def __init__(self, max_timeout: float, hedging: bool = LLM_HEDGING):
+        self.max_timeout = max_timeout
+        self.hedging = hedging
+        self._tokens = LLM_HEDGE_BURST
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "hedges_denied": 0}
+
+    def on_request(self):
+        self.stats["requests"] += 1
+        self._tokens = min(LLM_HEDGE_BURST, self._tokens + LLM_HEDGE_BUDGET)
+
+    def hedge_delay(self, node):
+        """Seconds after which the call on node should be hedged, or None while there is no estimate."""
+        if not self.hedging or len(node.latencies) < LLM_LATENCY_MIN_SAMPLES:
+            return None
+        return node.latency_percentile(LLM_HEDGE_PERCENTILE)
+
+    def spend_hedge(self) -> bool:
+        if self._tokens < 1:
+            self.stats["hedges_denied"] += 1
+            return False
+        self._tokens -= 1
+        self.stats["hedged"] += 1
+        return True
+
+    def refund_hedge(self):
+        # No other node could take the hedge
+        self._tokens = min(LLM_HEDGE_BURST, self._tokens + 1)
+        self.stats["hedged"] -= 1
+
+    def attempt_timeout(self, node) -> float:
+        if len(node.latencies) < LLM_LATENCY_MIN_SAMPLES:
+            return self.max_timeout
+        estimate = node.latency_percentile(99) * LLM_ATTEMPT_TIMEOUT_FACTOR
+        return max(LLM_MIN_ATTEMPT_TIMEOUT, min(self.max_timeout, estimate))
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number attempt + 1."""
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+    def snapshot(self):
+        return {**self.stats, "hedge_tokens": round(self._tokens, 2)}
@@ -0,0 +1,380 @@
+import base64
+import json
+import re
+from http import HTTPStatus
+from itertools import islice
+from urllib.parse import quote, urlencode
+
+from schemas import HTTP_METHODS
+
+# Categories that are formulaic enough to build from payloads and the endpoint's shape alone;
+# positive and negative ones can be drafted too, but only to stand in until the LLM's are ready
+RULE_BASED_CATEGORIES = ("edge", "security")
+# Part of the cache key: bump whenever payloads or rules change so old suites are not served
+RULES_VERSION = "1"
+DEFAULT_BASE_URL = "https://api.example.com"
+WRITE_METHODS = ("POST", "PUT", "PATCH")
+# Assumed body for write endpoints that come without a spec
+GENERIC_BODY_FIELDS = {"name": {"type": "string", "required": True}}
+VALID_TOKEN = "Bearer {{token}}"
+OVERSIZED_STRING = 10_000
+
+
+def _jwt(header: dict, claims: dict, signature: str = "") -> str:
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part, separators=(",", ":")).encode()).rstrip(b"=").decode()
+    return f"{encode(header)}.{encode(claims)}.{signature}"
+
+
+SQL_INJECTION = (
+    ("tautology", "' OR '1'='1"),
+    ("stacked query", "1; DROP TABLE users--"),
+    ("UNION select", "' UNION SELECT username, password FROM users--"),
+)
+XSS = (
+    ("script tag", "<script>alert(1)</script>"),
+    ("event handler", "\"><img src=x onerror=alert(1)>"),
+)
+COMMAND_INJECTION = (
+    ("shell separator", "; cat /etc/passwd"),
+    ("command substitution", "$(sleep 10)"),
+)
+PATH_TRAVERSAL = ("../../../etc/passwd",)
+NOSQL_INJECTION = (
+    ("$ne operator", {"$ne": None}),
+    ("$gt operator", {"$gt": ""}),
+)
+INVALID_CREDENTIALS = (
+    ("an invalid bearer token", "Bearer invalid-token"),
+    ("an expired JWT", "Bearer " + _jwt({"alg": "HS256", "typ": "JWT"}, {"sub": "user", "exp": 1}, "c2lnbmF0dXJl")),
+    ("an unsigned JWT (alg none)", "Bearer " + _jwt({"alg": "none", "typ": "JWT"}, {"sub": "admin", "role": "admin"})),
+    ("a malformed Authorization header", "Basic"),
+)
+XXE_PAYLOAD = '<?xml version="1.0"?><!DOCTYPE d [<!ENTITY x SYSTEM "file:///etc/passwd">]><d>&x;</d>'
+FORMAT_EXAMPLES = {
+    "email": "user@example.com",
+    "uuid": "123e4567-e89b-12d3-a456-426614174000",
+    "date": "2024-01-31",
+    "date-time": "2024-01-31T12:00:00Z",
+    "uri": "https://example.com/resource",
+    "ipv4": "192.0.2.1",
+}
+INVALID_FORMATS = {
+    "email": "not-an-email",
+    "uuid": "not-a-uuid",
+    "date": "2024-13-45",
+    "date-time": "yesterday",
+    "uri": "not a uri",
+    "ipv4": "999.1.1.1",
+}
+_PATH_PARAM = re.compile(r"\{([^}/]+)\}")
+# Stands for "leave this parameter or field out" in EndpointModel.case
+OMIT = object()
+
+
+def _param(value) -> str:
+    # URL text for a parameter value: JSON spelling for booleans and null, str() for the rest
+    return json.dumps(value) if value is None or isinstance(value, bool) else str(value)
+
+
+def split_endpoint(endpoint: str):
+    """Method and absolute URL template: "POST /users/{id}" -> ("POST", "https://api.example.com/users/{id}")."""
+    parts = endpoint.strip().split()
+    method = "GET"
+    if parts and parts[0].upper() in HTTP_METHODS:
+        method = parts.pop(0).upper()
+    url = parts[0] if parts else "/"
+    if not re.match(r"https?://", url):
+        url = DEFAULT_BASE_URL + "/" + url.lstrip("/")
+    return method, url.rstrip("/")
+
+
+def example_value(spec: dict):
+    """A valid value for a field spec, the baseline every rule changes one field of."""
+    if spec.get("enum"):
+        return spec["enum"][0]
+    kind = spec.get("type", "string")
+    if kind in ("integer", "number"):
+        value = max(1, spec["minimum"]) if spec.get("minimum") is not None else 1
+        if spec.get("maximum") is not None:
+            value = min(value, spec["maximum"])
+        return int(value) if kind == "integer" else float(value)
+    if kind == "boolean":
+        return True
+    if kind == "array":
+        return ["example"] * spec.get("minItems", 0)
+    if kind == "object":
+        return {}
+    value = FORMAT_EXAMPLES.get(spec.get("format"), "example")
+    if spec.get("minLength", 0) > len(value):
+        value += "x" * (spec["minLength"] - len(value))
+    return value[:spec["maxLength"]] if spec.get("maxLength") is not None else value
+
+
+def edge_values(spec: dict):
+    """Yields (what, value, valid) boundary and malformed values for one field spec."""
+    kind = spec.get("type", "string")
+    required = spec.get("required", False)
+    if spec.get("enum"):
+        yield f"the last allowed value ({json.dumps(spec['enum'][-1])})", spec["enum"][-1], True
+        yield "a value outside the allowed set", "NOT_A_VALID_OPTION", False
+    elif kind in ("integer", "number"):
+        low, high = spec.get("minimum"), spec.get("maximum")
+        if low is not None:
+            yield f"the minimum ({low})", low, True
+            yield f"one below the minimum ({low - 1})", low - 1, False
+        if high is not None:
+            yield f"the maximum ({high})", high, True
+            yield f"one above the maximum ({high + 1})", high + 1, False
+        if low is None:
+            yield "a negative number (-1)", -1, False
+        yield "an integer overflow (2^63)", 2 ** 63, False
+        yield "a string instead of a number", "abc", False
+        if kind == "integer":
+            yield "a decimal instead of an integer (1.5)", 1.5, False
+    elif kind == "string":
+        low, high = spec.get("minLength"), spec.get("maxLength")
+        if high is not None:
+            yield f"exactly the maximum length ({high} characters)", "a" * high, True
+            yield f"one character over the maximum length ({high + 1} characters)", "a" * (high + 1), False
+        else:
+            yield f"a {OVERSIZED_STRING:,}-character string", "a" * OVERSIZED_STRING, False
+        if low and low > 1:
+            yield f"one character under the minimum length ({low - 1} characters)", "a" * (low - 1), False
+        if required or low:
+            yield "an empty string", "", False
+        if spec.get("format") in INVALID_FORMATS:
+            yield f"an invalid {spec['format']}", INVALID_FORMATS[spec["format"]], False
+        elif not spec.get("pattern"):
+            yield "Unicode text (accents, CJK, emoji)", "Zoë 名前 🙂", True
+            if required:
+                yield "whitespace only", "   ", False
+    elif kind == "boolean":
+        yield 'the string "yes" instead of a boolean', "yes", False
+    elif kind == "array":
+        if spec.get("minItems"):
+            yield "an empty array", [], False
+        if spec.get("maxItems") is not None:
+            yield f"one item over the maximum ({spec['maxItems'] + 1} items)", ["example"] * (spec["maxItems"] + 1), False
+        yield "a single value instead of an array", "example", False
+    elif kind == "object":
+        yield "an array instead of an object", [], False
+    if required:
+        yield "null", None, False
+
+
+class EndpointModel:
+    """What the rules know about one endpoint: method, URL template, parameters, body fields and auth."""
+
+    def __init__(self, endpoint: str, operation: dict = None):
+        self.method, self.url = split_endpoint(endpoint)
+        params = operation["parameters"] if operation else []
+        self.path_params = {p["name"]: p.get("spec") or {} for p in params if p["in"] == "path"}
+        for name in _PATH_PARAM.findall(self.url):
+            self.path_params.setdefault(name, {"type": "integer" if name.lower().endswith("id") else "string"})
+        self.query_params = {p["name"]: {**(p.get("spec") or {}), "required": p["required"]}
+                             for p in params if p["in"] == "query"}
+        body = operation.get("request_body") if operation else None
+        if operation is None:
+            self.has_body = self.method in WRITE_METHODS
+            self.body_fields = GENERIC_BODY_FIELDS if self.has_body else {}
+        else:
+            self.has_body = body is not None
+            self.body_fields = body.get("fields") or {} if body else {}
+        # Without a spec, assume the API wants a token like most do
+        self.secured = operation["security"] if operation else True
+        responses = operation["responses"] if operation else {}
+        success = sorted(code for code in responses if code.isdigit() and code.startswith("2"))
+        self.success_code = int(success[0]) if success else {"POST": 201, "DELETE": 204}.get(self.method, 200)
+        self.error_code = next((int(code) for code in ("400", "422") if code in responses), 400)
+        self.path_values = {name: example_value(spec) for name, spec in self.path_params.items()}
+        self.query_values = {name: example_value(spec) for name, spec in self.query_params.items() if spec["required"]}
+        self.body = {name: example_value(spec) for name, spec in self.body_fields.items()} if self.has_body else None
+
+    def targets(self, *locations):
+        """(location, name, spec, label) for every parameter and body field in the given locations."""
+        for location, fields, label in (("path", self.path_params, "path parameter"),
+                                        ("query", self.query_params, "query parameter"),
+                                        ("body", self.body_fields, "body field")):
+            if location in locations:
+                for name, spec in fields.items():
+                    yield location, name, spec, f"{label} '{name}'"
+
+    def case(self, description: str, code: int, at=None, value=None, **overrides):
+        """The baseline request with at most one value replaced; overrides set method, headers or body."""
+        path_values, query_values = dict(self.path_values), dict(self.query_values)
+        body = overrides.get("body", self.body)
+        if at == "path":
+            path_values.update(value)
+        elif at == "query":
+            query_values.update(value)
+        elif at == "body":
+            body = {key: item for key, item in {**(body or {}), **value}.items() if item is not OMIT}
+        query_values = {key: item for key, item in query_values.items() if item is not OMIT}
+        url = _PATH_PARAM.sub(lambda m: quote(_param(path_values.get(m.group(1), 1)), safe=""), self.url)
+        if query_values:
+            url += ("&" if "?" in url else "?") + urlencode({k: _param(v) for k, v in query_values.items()}, quote_via=quote)
+        headers = {"Accept": "application/json"}
+        if self.secured:
+            headers["Authorization"] = VALID_TOKEN
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        headers.update(overrides.get("headers", {}))
+        return {
+            "description": description,
+            "request_url": url,
+            "http_method": overrides.get("method", self.method),
+            "headers": {key: value for key, value in headers.items() if value is not None},
+            "request_body": body,
+            "expected_response_code": code,
+            "expected_response_body": {"error": HTTPStatus(code).phrase} if code >= 400 else None,
+        }
+
+
+def _round_robin(families):
+    # One case from each family in turn, so any prefix of the result is varied
+    iterators = [iter(family) for family in families]
+    while iterators:
+        for iterator in list(iterators):
+            try:
+                yield next(iterator)
+            except StopIteration:
+                iterators.remove(iterator)
+
+
+def _valid_requests(model: EndpointModel):
+    fields = " with all fields" if model.body_fields else ""
+    yield model.case(f"Valid {model.method} request{fields} returns {model.success_code}", model.success_code)
+    optional = [name for name, spec in model.body_fields.items() if not spec.get("required")]
+    if optional and len(optional) < len(model.body_fields):
+        body = {name: value for name, value in model.body.items() if name not in optional}
+        yield model.case(f"Valid request with only the required fields returns {model.success_code}",
+                         model.success_code, body=body)
+
+
+def _valid_values(model: EndpointModel):
+    # Every other allowed enum value, and optional query parameters the baseline leaves out
+    for location, name, spec, label in model.targets("query", "body"):
+        for value in (spec.get("enum") or [])[1:4]:
+            yield model.case(f"{label[0].upper() + label[1:]} set to {json.dumps(value)} is accepted",
+                             model.success_code, at=location, value={name: value})
+        if location == "query" and not spec.get("required"):
+            yield model.case(f"Optional {label} is accepted", model.success_code,
+                             at=location, value={name: example_value(spec)})
+
+
+def positive_families(model: EndpointModel):
+    return [_valid_requests(model), _valid_values(model)]
+
+
+def _missing_values(model: EndpointModel):
+    for location, name, spec, label in model.targets("query", "body"):
+        if not spec.get("required"):
+            continue
+        yield model.case(f"Request missing the required {label} is rejected", model.error_code,
+                         at=location, value={name: OMIT})
+
+
+def _wrong_requests(model: EndpointModel):
+    if model.secured:
+        yield model.case("Request without an Authorization header returns 401", 401, headers={"Authorization": None})
+    for _, name, spec, label in model.targets("path"):
+        missing = 999999999 if spec.get("type") in ("integer", "number") else "does-not-exist"
+        yield model.case(f"Unknown {label} returns 404", 404, at="path", value={name: missing})
+    if model.has_body:
+        yield model.case("Request body sent as text/plain is rejected", 415, body="name=example",
+                         headers={"Content-Type": "text/plain"})
+
+
+def negative_families(model: EndpointModel):
+    return [_missing_values(model), _wrong_requests(model)]
+
+
+def _field_edges(model: EndpointModel, location, name, spec, label):
+    subject = label[0].upper() + label[1:]
+    for what, value, valid in edge_values(spec):
+        verdict = "is accepted" if valid else "is rejected"
+        yield model.case(f"{subject} set to {what} {verdict}", model.success_code if valid else model.error_code,
+                         at=location, value={name: value})
+
+
+def _path_edges(model: EndpointModel, name, spec, label):
+    missing = 999999999 if spec.get("type") in ("integer", "number") else "does-not-exist"
+    yield model.case(f"{label[0].upper() + label[1:]} pointing to a resource that does not exist returns 404",
+                     404, at="path", value={name: missing})
+    yield from _field_edges(model, "path", name, spec, label)
+
+
+def _body_edges(model: EndpointModel):
+    required = any(spec.get("required") for spec in model.body_fields.values())
+    yield model.case("Empty JSON object as the request body " + ("is rejected" if required else "is accepted"),
+                     model.error_code if required else model.success_code, body={})
+    yield model.case("Malformed JSON in the request body is rejected", 400, body='{"name": "example",')
+    yield model.case("Request without a body is rejected", model.error_code, body=None)
+
+
+def edge_families(model: EndpointModel):
+    families = [_body_edges(model)] if model.has_body else []
+    families += [_path_edges(model, name, spec, label) for _, name, spec, label in model.targets("path")]
+    families += [_field_edges(model, *target) for target in model.targets("query", "body")]
+    return families
+
+
+def _auth_attacks(model: EndpointModel):
+    if not model.secured:
+        return
+    yield model.case("Request without an Authorization header is rejected", 401,
+                     headers={"Authorization": None})
+    for what, credentials in INVALID_CREDENTIALS:
+        yield model.case(f"Request with {what} is rejected", 401, headers={"Authorization": credentials})
+
+
+def _payload_attacks(model: EndpointModel, attack: str, payloads, targets, strings_only=True):
+    for kind, payload in payloads:
+        for location, name, spec, label in targets:
+            if strings_only and spec.get("type", "string") != "string":
+                continue
+            yield model.case(f"{attack} ({kind}) in {label} is rejected", model.error_code,
+                             at=location, value={name: payload})
+
+
+def _protocol_attacks(model: EndpointModel):
+    yield model.case("TRACE request is rejected (cross-site tracing)", 405, method="TRACE")
+    if model.has_body:
+        yield model.case("XML body with an external entity (XXE) is rejected", 415, body=XXE_PAYLOAD,
+                         headers={"Content-Type": "application/xml"})
+
+
+def security_families(model: EndpointModel):
+    every = list(model.targets("path", "query", "body"))
+    return [
+        _auth_attacks(model),
+        _payload_attacks(model, "SQL injection", SQL_INJECTION, every, strings_only=False),
+        _payload_attacks(model, "Cross-site scripting", XSS, list(model.targets("query", "body"))),
+        _payload_attacks(model, "Command injection", COMMAND_INJECTION, every),
+        _payload_attacks(model, "Path traversal", [("dot-dot-slash", p) for p in PATH_TRAVERSAL],
+                         list(model.targets("path")), strings_only=False),
+        _payload_attacks(model, "NoSQL operator injection", NOSQL_INJECTION, list(model.targets("body")),
+                         strings_only=False),
+        _protocol_attacks(model),
+    ]
+
+
+FAMILIES = {
+    "positive": positive_families,
+    "negative": negative_families,
+    "edge": edge_families,
+    "security": security_families,
+}
+
+
+def rule_cases(endpoint: str, category: str, operation: dict = None, limit: int = None) -> list:
+    """
+    Test cases of one category built from the payload library and the endpoint's parameters
+    and body fields (from the OpenAPI operation when there is one), without calling the LLM.
+    Families are interleaved and built lazily, so asking for the first few costs only those.
+    """
+    if category not in FAMILIES:
+        return []
+    model = EndpointModel(endpoint, operation)
+    return list(islice(_round_robin(FAMILIES[category](model)), limit))
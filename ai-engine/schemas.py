@@ -0,0 +1,64 @@
+from typing import Any, Dict, List, Literal
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+from json_extract import CATEGORY_KEYS
+
+HTTP_METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS", "TRACE")
+
+
+class TestCase(BaseModel):
+    """Shape of one generated test case; its JSON Schema is what constrains Ollama's output."""
+
+    description: str = Field(min_length=1)
+    request_url: str = Field(min_length=1)
+    http_method: Literal[HTTP_METHODS]
+    headers: Dict[str, str]
+    request_body: Any
+    expected_response_code: int = Field(ge=100, le=599)
+    expected_response_body: Any
+
+
+def _compact_schema(model) -> dict:
+    # Titles and the docstring are noise to the grammar; keep only the constraints
+    schema = model.model_json_schema()
+    schema.pop("title", None)
+    schema.pop("description", None)
+    for field in schema["properties"].values():
+        field.pop("title", None)
+    return schema
+
+
+_case_list = TypeAdapter(List[TestCase])
+_case_schema = _compact_schema(TestCase)
+
+
+def _array(min_cases: int) -> dict:
+    return {"type": "array", "items": _case_schema, "minItems": min_cases}
+
+
+def case_schema() -> dict:
+    return _case_schema
+
+
+def category_schema(category: str, min_cases: int) -> dict:
+    # An object with the one "<category>_tests" array, the same shape the tolerant parser understands
+    key = category + "_tests"
+    return {"type": "object", "properties": {key: _array(min_cases)}, "required": [key]}
+
+
+def suite_schema(min_cases: int) -> dict:
+    return {
+        "type": "object",
+        "properties": {key: _array(min_cases) for key in CATEGORY_KEYS},
+        "required": list(CATEGORY_KEYS),
+    }
+
+
+def validate_cases(items) -> list:
+    """Validates a list of test cases; raises pydantic.ValidationError (a ValueError) on any mismatch."""
+    return [case.model_dump(mode="json") for case in _case_list.validate_python(items)]
+
+
+def validate_case(item) -> dict:
+    return TestCase.model_validate(item).model_dump(mode="json")
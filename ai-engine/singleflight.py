@@ -0,0 +1,97 @@
+import asyncio
+import logging
+
+logger = logging.getLogger("ai_engine.singleflight")
+
+
+class _Broadcast:
+    """Event log of one in-flight stream that any number of subscribers can replay and follow."""
+
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self.changed = asyncio.Condition()
+
+    async def publish(self, event):
+        async with self.changed:
+            self.events.append(event)
+            self.changed.notify_all()
+
+    async def close(self):
+        async with self.changed:
+            self.finished = True
+            self.changed.notify_all()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: position < len(self.events) or self.finished)
+                pending = self.events[position:]
+                finished = self.finished
+            for event in pending:
+                yield event
+            position += len(pending)
+            if finished and position >= len(self.events):
+                return
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical work: the first caller for a key starts it, everyone
+    else arriving while it runs awaits the same result. The shared task is shielded so a
+    disconnecting caller never cancels it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self._producers = set()
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key, factory):
+        task = self._calls.get(key)
+        if task is None:
+            self.stats["leaders"] += 1
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, key, factory):
+        """Same as do() for async generators: late joiners replay what was already produced."""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.stats["leaders"] += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+
+            async def produce():
+                try:
+                    async for event in factory():
+                        await broadcast.publish(event)
+                except Exception as e:
+                    # Nobody awaits the producer, so subscribers learn of the failure from the stream itself
+                    logger.exception("Shared stream failed", extra={"key": key})
+                    if not (broadcast.events and isinstance(broadcast.events[-1], dict)
+                            and broadcast.events[-1].get("done")):
+                        await broadcast.publish({"done": True, "error": str(e) or type(e).__name__})
+                finally:
+                    self._streams.pop(key, None)
+                    await broadcast.close()
+
+            producer = asyncio.ensure_future(produce())
+            self._producers.add(producer)
+            producer.add_done_callback(self._producers.discard)
+        else:
+            self.stats["coalesced"] += 1
+        async for event in broadcast.subscribe():
+            yield event
+
+    def in_flight(self, key):
+        return key in self._calls or key in self._streams
+
+    def snapshot(self):
+        return {**self.stats, "in_flight": len(self._calls) + len(self._streams)}
@@ -0,0 +1,66 @@
+import asyncio
+
+from cache import MemoryLRU, SQLiteStore, TieredCache, make_cache_key
+
+
+def workers(tmp_path, count=2):
+    # Separate memory tiers over one SQLite file, like uvicorn workers on one host
+    path = str(tmp_path / "cache.db")
+    return [TieredCache(MemoryLRU(), SQLiteStore(path), invalidation_check=0) for _ in range(count)]
+
+
+def test_disk_hit_is_promoted_to_memory(tmp_path):
+    async def scenario():
+        first, second = workers(tmp_path)
+        await first.set("key", {"positive_tests": [1]}, endpoint="GET /users")
+        assert await second.get("key") == {"positive_tests": [1]}
+        assert await second.get("key") == {"positive_tests": [1]}
+        return second.stats
+
+    stats = asyncio.run(scenario())
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+
+
+def test_invalidation_reaches_other_workers_memory(tmp_path):
+    async def scenario():
+        first, second = workers(tmp_path)
+        await first.set("users", [1], endpoint="GET /users")
+        await first.set("orders", [2], endpoint="GET /orders")
+        await second.get("users")
+        await second.get("orders")
+        await first.invalidate("get /users/")
+        return await second.get("users"), await second.get("orders")
+
+    assert asyncio.run(scenario()) == (None, [2])
+
+
+def test_invalidate_everything(tmp_path):
+    async def scenario():
+        first, second = workers(tmp_path)
+        await first.set("users", [1], endpoint="GET /users")
+        await second.get("users")
+        await first.invalidate()
+        return await second.get("users")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_memory_respects_invalidation_check_interval(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "cache.db")
+        first = TieredCache(MemoryLRU(), SQLiteStore(path), invalidation_check=0)
+        second = TieredCache(MemoryLRU(), SQLiteStore(path), invalidation_check=3600)
+        await first.set("users", [1], endpoint="GET /users")
+        await second.get("users")
+        await first.invalidate("GET /users")
+        # Checked once on the first get, not again within the hour
+        return await second.get("users")
+
+    assert asyncio.run(scenario()) == [1]
+
+
+def test_cache_key_ignores_endpoint_formatting():
+    options = {"min_cases": 5}
+    assert make_cache_key("get  /users/ ", None, "m", "1", options) == make_cache_key("GET /users", None, "m", "1", options)
+    assert make_cache_key("GET /users", "edge", "m", "1", options) != make_cache_key("GET /users", None, "m", "1", options)
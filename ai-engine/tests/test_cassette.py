@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from cassette import Cassette, CassetteMiss
+from llm_client import LLMClient, LLMError
+
+OPTIONS = {"temperature": 0.1}
+
+
+def record(path, *exchanges):
+    cassette = Cassette(path, mode="record")
+    for payload, exchange in exchanges:
+        cassette.record(payload, exchange)
+    cassette.close()
+
+
+def test_replay_returns_recorded_exchanges_in_order(tmp_path):
+    path = str(tmp_path / "session.cassette")
+    payload = {"model": "llama3", "prompt": "GET /users", "stream": False}
+    record(path, (payload, {"response": {"response": "first"}}), (payload, {"response": {"response": "second"}}))
+    cassette = Cassette(path, mode="replay")
+    # keep_alive does not change the output, so it is not part of the fingerprint
+    replies = [cassette.lookup({**payload, "keep_alive": "5m"})["response"]["response"] for _ in range(3)]
+    assert replies == ["first", "second", "first"]
+    with pytest.raises(CassetteMiss):
+        cassette.lookup({**payload, "prompt": "GET /orders"})
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    path = str(tmp_path / "session.cassette")
+    payload = {"model": "llama3", "prompt": "GET /users"}
+    record(path, (payload, {"response": {"response": "ok"}}))
+    with open(path, "ab") as f:
+        f.write(b"\x00" * 10)
+    assert Cassette(path, mode="replay").lookup(payload) == {"response": {"response": "ok"}}
+
+
+def test_client_turns_a_replay_miss_into_an_llm_error(tmp_path):
+    path = str(tmp_path / "session.cassette")
+    record(path)
+    client = LLMClient(cassette=Cassette(path, mode="replay"))
+    with pytest.raises(LLMError) as raised:
+        asyncio.run(client.generate("GET /users", OPTIONS))
+    assert raised.value.status_code == 404
+    assert isinstance(raised.value.__cause__, CassetteMiss)
+
+
+def test_client_replays_recorded_errors(tmp_path):
+    path = str(tmp_path / "session.cassette")
+    payload = LLMClient().build_payload("GET /users", OPTIONS)
+    record(path, (payload, {"status": 500, "text": "model not loaded"}))
+    client = LLMClient(cassette=Cassette(path, mode="replay"))
+    with pytest.raises(LLMError) as raised:
+        asyncio.run(client.generate("GET /users", OPTIONS))
+    assert raised.value.status_code == 500
@@ -0,0 +1,53 @@
+import dedup
+
+BASE = {
+    "http_method": "POST",
+    "request_url": "http://api.example.com/users",
+    "headers": {"Content-Type": "application/json"},
+    "expected_response_code": 400,
+}
+DESCRIPTION = "Rejects a SQL injection payload in the request body"
+
+
+def injection(field: str, payload: str = "' OR 1=1 --", description: str = DESCRIPTION) -> dict:
+    body = {"name": "Alice", "email": "alice@example.com", "role": "user"}
+    return {**BASE, "description": description, "request_body": {**body, field: payload}}
+
+
+def test_default_threshold_is_pinned():
+    assert dedup.DEDUP_SIMILARITY == 0.8
+    assert dedup.SuiteDeduplicator().similarity == 0.8
+
+
+def test_injections_into_different_fields_are_kept():
+    deduplicator = dedup.SuiteDeduplicator()
+    assert all(deduplicator.add(injection(field)) for field in ("name", "email", "role"))
+    assert deduplicator.stats == {"exact": 0, "near": 0}
+
+
+def test_near_identical_cases_are_merged():
+    deduplicator = dedup.SuiteDeduplicator()
+    assert deduplicator.add(injection("name"))
+    # The exact fingerprint ignores the description, so a reworded copy is an exact duplicate
+    assert not deduplicator.add(injection("name", description="Rejects a SQL injection payload in the body"))
+    assert not deduplicator.add(injection("name", payload="admin' --"))
+    assert deduplicator.stats == {"exact": 1, "near": 1}
+
+
+def test_same_text_for_another_method_or_url_is_kept():
+    deduplicator = dedup.SuiteDeduplicator()
+    assert deduplicator.add(injection("name"))
+    assert deduplicator.add({**injection("name"), "request_url": "http://api.example.com/orders"})
+    assert deduplicator.add({**injection("name"), "http_method": "PUT"})
+
+
+def test_text_duplicates_of_another_shape_are_merged():
+    deduplicator = dedup.SuiteDeduplicator()
+    assert deduplicator.add(injection("name"))
+    assert not deduplicator.add({**injection("name"), "expected_response_code": 422})
+    assert deduplicator.stats == {"exact": 0, "near": 1}
+
+
+def test_url_template_replaces_ids_and_drops_query_values():
+    assert dedup.url_template("http://api/users/42/orders/3fa85f64-5717-4562-b3fc-2c963f66afa6?page=2&q=x") == \
+        "/users/{n}/orders/{id}?page&q"
@@ -0,0 +1,74 @@
+import json
+
+import json_extract
+from json_extract import extract_test_cases, missing_categories
+
+CASES = [
+    {"description": "Fetch user", "request_url": "/users/1", "http_method": "GET", "expected_response_code": 200},
+    {"description": "Unknown user", "request_url": "/users/999", "http_method": "GET", "expected_response_code": 404},
+]
+SUITE = json.dumps({"positive_tests": CASES[:1], "negative_tests": CASES[1:], "edge_tests": [], "security_tests": []},
+                   indent=2)
+
+
+def test_complete_suite():
+    cases, report = extract_test_cases(SUITE)
+    assert cases == {"positive_tests": CASES[:1], "negative_tests": CASES[1:]}
+    assert report["complete"] and not report["truncated"]
+    assert missing_categories(cases, 1) == ["edge_tests", "security_tests"]
+
+
+def test_truncated_output_keeps_every_closed_case():
+    raw = json.dumps(CASES)
+    cut = raw[: raw.index("Unknown user")]
+    cases, report = extract_test_cases(cut, default_category="positive_tests")
+    assert cases == {"positive_tests": CASES[:1]}
+    assert report["truncated"] and report["partial_case_dropped"]
+
+
+def test_trailing_commas_are_tolerated():
+    raw = '{"positive_tests": [{"description": "Fetch user", "http_method": "GET",},],}'
+    cases, report = extract_test_cases(raw)
+    assert cases == {"positive_tests": [{"description": "Fetch user", "http_method": "GET"}]}
+    assert report["parse_errors"] == 0
+
+
+def test_prose_and_markdown_around_the_json_are_skipped():
+    raw = "Sure! Here are the tests:\n```json\n" + json.dumps(CASES) + "\n```\nLet me know if you need more."
+    cases, report = extract_test_cases(raw, default_category="negative_tests")
+    assert cases == {"negative_tests": CASES}
+    assert report["complete"]
+
+
+def test_braces_inside_strings_do_not_confuse_the_scanner():
+    case = {"description": 'Body with "{[" inside', "request_body": {"q": "}]"}}
+    cases, _ = extract_test_cases(json.dumps([case]))
+    assert cases == {None: [case]}
+
+
+def test_chunked_feed_yields_cases_as_they_close():
+    extractor = json_extract.TestCaseExtractor()
+    found = []
+    for start in range(0, len(SUITE), 7):
+        found.extend(extractor.feed(SUITE[start:start + 7]))
+    assert found == [("positive_tests", CASES[0]), ("negative_tests", CASES[1])]
+    assert extractor.report()["closed_arrays"] == ["positive_tests", "negative_tests", "edge_tests", "security_tests"]
+
+
+def test_chunked_feed_matches_a_single_pass_at_any_split():
+    single, _ = extract_test_cases(SUITE)
+    for split in range(1, len(SUITE)):
+        extractor = json_extract.TestCaseExtractor()
+        found = extractor.feed(SUITE[:split]) + extractor.feed(SUITE[split:])
+        assert {key: [tc for k, tc in found if k == key] for key, _ in found} == single
+
+
+def test_single_case_object():
+    cases, _ = extract_test_cases(json.dumps(CASES[0]), default_category="edge_tests")
+    assert cases == {"edge_tests": [CASES[0]]}
+
+
+def test_no_json_at_all():
+    cases, report = extract_test_cases("I cannot help with that.")
+    assert cases == {}
+    assert not report["complete"]
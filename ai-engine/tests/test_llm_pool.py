@@ -0,0 +1,211 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import llm_pool
+import retry_policy
+from llm_client import LLMClient, LLMError
+
+OPTIONS = {"temperature": 0.1}
+
+
+class StubOllama(ThreadingHTTPServer):
+    """A local /api/generate that answers with its own name, or fails, as the test sets it."""
+
+    daemon_threads = True
+
+    def __init__(self, name):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.name = name
+        self.status = 200
+        self.delay = 0.0
+        self.hits = 0
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.reply(200, {"models": []})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.hits += 1
+        time.sleep(self.server.delay)
+        if self.server.status != 200:
+            self.reply(self.server.status, {"error": f"{self.server.name} failed"})
+        else:
+            self.reply(200, {"response": self.server.name, "done": True})
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stubs():
+    servers = []
+
+    def start(*names):
+        for name in names:
+            server = StubOllama(name)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            servers.append(server)
+        return servers[-len(names):]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def client_for(*servers, concurrency=1):
+    return LLMClient(nodes=",".join(f"{server.url}|{concurrency}" for server in servers), timeout=5)
+
+
+async def call(client):
+    try:
+        return (await client.generate("GET /users", OPTIONS))["response"]
+    except LLMError as e:
+        return e.status_code
+
+
+def test_failing_node_is_ejected_and_calls_fail_over(stubs, monkeypatch):
+    monkeypatch.setattr(llm_pool, "LLM_BREAKER_COOLDOWN", 60)
+    broken, healthy = stubs("broken", "healthy")
+    broken.status = 500
+
+    async def scenario():
+        client = client_for(broken, healthy)
+        try:
+            first = [await call(client) for _ in range(2 * llm_pool.LLM_BREAKER_THRESHOLD)]
+            after = [await call(client) for _ in range(5)]
+            return first, after, client.pool.snapshot()
+        finally:
+            await client.close()
+
+    first, after, snapshot = asyncio.run(scenario())
+    assert first.count(500) == llm_pool.LLM_BREAKER_THRESHOLD
+    assert after == ["healthy"] * 5
+    assert broken.hits == llm_pool.LLM_BREAKER_THRESHOLD
+    assert snapshot[0]["breaker"] == "open" and snapshot[0]["ejections"] == 1
+    assert snapshot[1]["breaker"] == "closed" and snapshot[1]["errors"] == 0
+
+
+def test_client_errors_do_not_open_the_breaker(stubs):
+    (node,) = stubs("rejecting")
+    node.status = 400
+
+    async def scenario():
+        client = client_for(node)
+        try:
+            outcomes = [await call(client) for _ in range(llm_pool.LLM_BREAKER_THRESHOLD + 1)]
+            return outcomes, client.pool.snapshot()[0]
+        finally:
+            await client.close()
+
+    outcomes, snapshot = asyncio.run(scenario())
+    assert outcomes == [400] * (llm_pool.LLM_BREAKER_THRESHOLD + 1)
+    assert snapshot["breaker"] == "closed"
+
+
+def test_breaker_reopens_on_a_failed_trial_and_closes_on_a_good_one(stubs, monkeypatch):
+    monkeypatch.setattr(llm_pool, "LLM_BREAKER_COOLDOWN", 0.2)
+    (node,) = stubs("flaky")
+    node.status = 500
+
+    async def scenario():
+        client = client_for(node)
+        states = []
+        try:
+            for _ in range(llm_pool.LLM_BREAKER_THRESHOLD):
+                await call(client)
+            states.append((client.pool.nodes[0].breaker, await call(client)))
+            await asyncio.sleep(0.25)
+            states.append((client.pool.nodes[0].breaker, await call(client)))
+            states.append((client.pool.nodes[0].breaker, await call(client)))
+            node.status = 200
+            await asyncio.sleep(0.25)
+            states.append((client.pool.nodes[0].breaker, await call(client)))
+            return states, client.pool.nodes[0].breaker
+        finally:
+            await client.close()
+
+    states, final = asyncio.run(scenario())
+    # Open: rejected without reaching the node until the cooldown ends
+    assert states[0] == ("open", 503)
+    # The trial fails, so the circuit opens again straight away
+    assert states[1] == ("open", 500)
+    assert states[2] == ("open", 503)
+    # After another cooldown a successful trial closes it
+    assert states[3] == ("open", "flaky")
+    assert final == "closed"
+    assert node.hits == llm_pool.LLM_BREAKER_THRESHOLD + 2
+
+
+def test_slow_call_is_hedged_to_another_node(stubs):
+    slow, fast = stubs("slow", "fast")
+    slow.delay = 2.0
+
+    async def scenario():
+        client = client_for(slow, fast)
+        # The first pick on a fresh pool is the first node; give it a latency history to hedge against
+        client.pool.nodes[0].latencies.extend([0.05] * retry_policy.LLM_LATENCY_MIN_SAMPLES)
+        try:
+            started = time.monotonic()
+            result = await call(client)
+            elapsed = time.monotonic() - started
+            # The losing primary is cancelled on the way out and releases its slot on its next step
+            await asyncio.sleep(0.05)
+            return result, elapsed, client.policy.snapshot(), client.pool.snapshot()
+        finally:
+            await client.close()
+
+    result, elapsed, policy, nodes = asyncio.run(scenario())
+    assert result == "fast"
+    assert elapsed < 1.0
+    assert policy["hedged"] == 1 and policy["hedge_wins"] == 1
+    # The cancelled primary does not count against its node
+    assert nodes[0]["in_flight"] == 0 and nodes[0]["breaker"] == "closed" and nodes[0]["errors"] == 0
+
+
+def test_hedges_stay_within_the_budget():
+    policy = retry_policy.RetryPolicy(max_timeout=60, hedging=True)
+    burst = int(retry_policy.LLM_HEDGE_BURST)
+    assert [policy.spend_hedge() for _ in range(burst + 1)] == [True] * burst + [False]
+    # A little over one token's worth of requests earns the next hedge
+    for _ in range(int(1 / retry_policy.LLM_HEDGE_BUDGET) + 1):
+        policy.on_request()
+    assert policy.spend_hedge()
+    assert not policy.spend_hedge()
+    assert policy.stats["hedged"] == burst + 1 and policy.stats["hedges_denied"] == 2
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = retry_policy.RetryPolicy(max_timeout=60)
+    for attempt in range(8):
+        ceiling = min(retry_policy.LLM_BACKOFF_MAX, retry_policy.LLM_BACKOFF_BASE * 2 ** attempt)
+        delays = [policy.backoff(attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert len(set(delays)) > 1
+    assert max(policy.backoff(20) for _ in range(200)) <= retry_policy.LLM_BACKOFF_MAX
+
+
+def test_attempt_timeout_follows_node_latency():
+    policy = retry_policy.RetryPolicy(max_timeout=60)
+    node = llm_pool.LLMNode("http://gpu1:11434/api/generate", 1)
+    assert policy.attempt_timeout(node) == 60
+    node.latencies.extend([1.0] * retry_policy.LLM_LATENCY_MIN_SAMPLES)
+    assert policy.attempt_timeout(node) == retry_policy.LLM_MIN_ATTEMPT_TIMEOUT
+    node.latencies.extend([30.0] * retry_policy.LLM_LATENCY_MIN_SAMPLES)
+    assert policy.attempt_timeout(node) == 60
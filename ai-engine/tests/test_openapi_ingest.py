@@ -0,0 +1,45 @@
+from openapi_ingest import iter_operations, operation_endpoint
+
+SPEC = {
+    "openapi": "3.0.0",
+    "servers": [{"url": "https://api.example.com/"}],
+    "components": {
+        "responses": {"NotFound": {"description": "No such user"}},
+        "schemas": {"User": {"type": "object", "properties": {"id": {"type": "integer"}}}},
+    },
+    "paths": {
+        "/users/{id}": {
+            "parameters": [{"name": "id", "in": "path", "schema": {"type": "integer"}}],
+            "get": {
+                "operationId": "getUser",
+                "responses": {
+                    "200": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/User"}}}},
+                    "404": {"$ref": "#/components/responses/NotFound"},
+                },
+            },
+        },
+    },
+}
+
+
+def test_operations_resolve_references():
+    (operation,) = iter_operations(SPEC)
+    assert operation_endpoint(operation) == "GET https://api.example.com/users/{id}"
+    assert operation["parameters"][0]["required"] is True
+    assert operation["responses"] == {"200": "{id: integer}", "404": "No such user"}
+
+
+def test_malformed_responses_are_skipped():
+    spec = {"openapi": "3.0.0", "paths": {"/health": {"get": {"responses": {
+        "200": "#/components/responses/Ok",
+        "404": {"$ref": "#/components/responses/Missing"},
+        "500": {"description": "Server error", "content": {"application/json": "oops"}},
+    }}}}}
+    (operation,) = iter_operations(spec)
+    assert operation["responses"] == {"404": "", "500": "Server error"}
+
+
+def test_non_mapping_responses_are_ignored():
+    spec = {"openapi": "3.0.0", "paths": {"/health": {"get": {"responses": ["200"]}}}}
+    (operation,) = iter_operations(spec)
+    assert operation["responses"] == {}
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"positive_tests": [1]}
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        return results, calls, flight.snapshot()
+
+    results, calls, snapshot = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result == {"positive_tests": [1]} for result in results)
+    assert snapshot == {"leaders": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    async def scenario():
+        flight = SingleFlight()
+        attempts = []
+
+        async def failing():
+            attempts.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("ollama down")
+
+        outcomes = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+        retried = await flight.do("key", lambda: asyncio.sleep(0, result="ok"))
+        return outcomes, attempts, retried
+
+    outcomes, attempts, retried = asyncio.run(scenario())
+    assert len(attempts) == 1
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert retried == "ok"
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first
+
+    result, first = asyncio.run(scenario())
+    assert result == "done"
+    assert first.cancelled()
+
+
+def test_late_stream_subscribers_replay_earlier_events():
+    async def scenario():
+        flight = SingleFlight()
+        gate = asyncio.Event()
+
+        async def events():
+            yield {"testcase": 1}
+            await gate.wait()
+            yield {"testcase": 2}
+            yield {"done": True}
+
+        async def collect():
+            return [event async for event in flight.stream("key", events)]
+
+        early = asyncio.create_task(collect())
+        await asyncio.sleep(0.01)
+        late = asyncio.create_task(collect())
+        await asyncio.sleep(0.01)
+        gate.set()
+        return await early, await late, flight.stats
+
+    early, late, stats = asyncio.run(scenario())
+    assert early == late == [{"testcase": 1}, {"testcase": 2}, {"done": True}]
+    assert stats == {"leaders": 1, "coalesced": 1}
+
+
+@pytest.mark.parametrize("finished", [False, True])
+def test_failing_stream_ends_with_an_error_event(finished):
+    async def scenario():
+        flight = SingleFlight()
+
+        async def events():
+            yield {"testcase": 1}
+            if finished:
+                yield {"done": True, "counts": {}}
+            raise RuntimeError("cache write failed")
+
+        return [event async for event in flight.stream("key", events)]
+
+    events = asyncio.run(scenario())
+    if finished:
+        assert events == [{"testcase": 1}, {"done": True, "counts": {}}]
+    else:
+        assert events == [{"testcase": 1}, {"done": True, "error": "cache write failed"}]
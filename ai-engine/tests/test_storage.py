@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+import storage
+
+CASE = {"description": "Fetch user", "http_method": "GET", "request_url": "/users/1", "expected_response_code": 200}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return storage.TestCaseStore(f"sqlite:///{tmp_path / 'testcases.db'}")
+
+
+def run(key, test_cases, category=None, endpoint="GET /users/{id}", created_at=None, model="llama3"):
+    return {"endpoint": endpoint, "category": category, "request_key": key, "model": model, "prompt_version": "2",
+            "test_cases": test_cases, "duration_ms": 12, "created_at": created_at or time.time()}
+
+
+def test_latest_suite_returns_the_newest_run_for_a_key(store):
+    older = {"positive_tests": [CASE], "negative_tests": [], "edge_tests": [], "security_tests": []}
+    newer = {**older, "edge_tests": [{**CASE, "description": "Huge id"}]}
+    store.save_runs([run("all", older, created_at=time.time() - 10), run("all", newer)])
+    suite = store.latest_suite("all")
+    assert suite["positive_tests"] == [CASE]
+    assert [tc["description"] for tc in suite["edge_tests"]] == ["Huge id"]
+    assert store.latest_suite("other") is None
+
+
+def test_category_runs_come_back_as_lists(store):
+    store.save_runs([run("edge", [CASE, {**CASE, "description": "Zero id"}], category="edge")])
+    assert [tc["description"] for tc in store.latest_suite("edge")] == ["Fetch user", "Zero id"]
+
+
+def test_latest_suite_honours_max_age(store):
+    store.save_runs([run("all", {"positive_tests": [CASE]}, created_at=time.time() - 3600)])
+    assert store.latest_suite("all", max_age=60) is None
+    assert store.latest_suite("all", max_age=7200)["positive_tests"] == [CASE]
+
+
+def test_invalidate_hides_earlier_runs_but_keeps_history(store):
+    store.save_runs([
+        run("users", {"positive_tests": [CASE]}, created_at=time.time() - 5),
+        run("orders", {"positive_tests": [CASE]}, endpoint="GET /orders", created_at=time.time() - 5),
+    ])
+    store.invalidate("get /users/{id}/")
+    assert store.latest_suite("users") is None
+    assert store.latest_suite("orders") is not None
+    assert len(store.list_runs("GET /users/{id}")) == 1
+    store.save_runs([run("users", {"positive_tests": [CASE]})])
+    assert store.latest_suite("users") is not None
+
+
+def test_latest_run_falls_back_to_the_endpoint_under_another_key(store):
+    store.save_runs([run("old-prompt", [CASE], category="positive", created_at=time.time() - 60)])
+    found = store.latest_run("new-prompt", "GET /users/{id}", "positive")
+    assert found["request_key"] == "old-prompt"
+    assert found["test_cases"] == [CASE]
+    assert store.latest_run("new-prompt", "GET /users/{id}", "negative") is None
+
+
+def test_list_test_cases_paginates_newest_first(store):
+    cases = [{**CASE, "description": f"case {i}"} for i in range(5)]
+    store.save_runs([run("positive", cases, category="positive")])
+    first = store.list_test_cases(category="positive", limit=3)
+    second = store.list_test_cases(category="positive", limit=3, before_id=first[-1]["id"])
+    assert [row["testcase"]["description"] for row in first + second] == [f"case {i}" for i in (4, 3, 2, 1, 0)]
+
+
+def test_rejects_unknown_database_urls():
+    with pytest.raises(ValueError):
+        storage.TestCaseStore("mysql://localhost/db")
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# A running job whose heartbeat is older than this is assumed orphaned and re-queued
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "600"))
+
+TERMINAL_STATES = ("completed", "failed", "cancelled")
+
+logger = logging.getLogger("backend.jobs")
+
+
+class JobStore:
+    """SQLite-backed persistent job queue and result log, shared by every backend worker process."""
+
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    endpoints TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+                CREATE TABLE IF NOT EXISTS job_results (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    endpoint_index INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                );
+                """
+            )
+        finally:
+            conn.close()
+
+    def create(self, endpoints: list):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, status, endpoints, total, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(endpoints), len(endpoints), now, now),
+            )
+        finally:
+            conn.close()
+        return job_id
+
+    def claim_next(self):
+        # BEGIN IMMEDIATE takes the write lock up front so two workers never claim the same job
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, endpoints FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?", (time.time(), row["id"]))
+            conn.execute("COMMIT")
+            return row["id"], json.loads(row["endpoints"])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def add_result(self, job_id: str, item: dict):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute("SELECT COUNT(*) FROM job_results WHERE job_id = ?", (job_id,)).fetchone()[0]
+            conn.execute(
+                "INSERT INTO job_results (job_id, seq, endpoint_index, result) VALUES (?, ?, ?, ?)",
+                (job_id, seq, item.get("index", seq), json.dumps(item, ensure_ascii=False)),
+            )
+            column = "failed" if item.get("error") else "completed"
+            conn.execute(
+                f"UPDATE jobs SET {column} = {column} + 1, updated_at = ? WHERE id = ?", (time.time(), job_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def finish(self, job_id: str, status: str, error: str = None):
+        conn = self._connect()
+        try:
+            # Never overwrite a cancellation with a late completion
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status != 'cancelled'",
+                (status, error, time.time(), job_id),
+            )
+        finally:
+            conn.close()
+
+    def cancel(self, job_id: str):
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+            return cur.rowcount > 0
+        finally:
+            conn.close()
+
+    def get(self, job_id: str):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT id, status, total, completed, failed, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT result FROM job_results WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (job_id, offset, limit),
+            ).fetchall()
+            return [json.loads(row["result"]) for row in rows]
+        finally:
+            conn.close()
+
+    def queue_depth(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        finally:
+            conn.close()
+
+    def requeue_stale(self, stale_seconds=JOB_STALE_SECONDS):
+        # A re-queued job runs again from its first endpoint, so its partial results and counters go too
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = [
+                row["id"] for row in conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'running' AND updated_at < ?", (time.time() - stale_seconds,)
+                )
+            ]
+            for job_id in stale:
+                conn.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', completed = 0, failed = 0, updated_at = ? WHERE id = ?",
+                    (time.time(), job_id),
+                )
+            conn.execute("COMMIT")
+            return len(stale)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+class JobManager:
+    """
+    Drains the persistent queue with a fixed pool of asyncio workers.
+    runner(endpoints) must be an async generator yielding one result dict per endpoint
+    followed by a {"done": true} summary, like main.run_batch.
+    """
+
+    def __init__(self, store: JobStore, runner, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        self.store = store
+        self.runner = runner
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._running = {}  # job_id -> task, for jobs executing in this process
+        self._cancelled = set()  # running jobs stopped through cancel(), whose CancelledError is expected
+
+    async def start(self):
+        requeued = await asyncio.to_thread(self.store.requeue_stale)
+        if requeued:
+            logger.warning("Re-queued %d orphaned jobs", requeued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, endpoints: list):
+        job_id = await asyncio.to_thread(self.store.create, endpoints)
+        self._wakeup.set()
+        return job_id
+
+    async def cancel(self, job_id: str):
+        cancelled = await asyncio.to_thread(self.store.cancel, job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            self._cancelled.add(job_id)
+            task.cancel()
+        return cancelled
+
+    async def _worker(self):
+        while True:
+            claimed = await asyncio.to_thread(self.store.claim_next)
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    # Other processes enqueue too, so fall back to polling
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job_id, endpoints = claimed
+            task = asyncio.create_task(self._run(job_id, endpoints))
+            self._running[job_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                # Only a cancel() of this job is absorbed; stop() cancelling the worker must end it
+                if job_id not in self._cancelled or asyncio.current_task().cancelling():
+                    raise
+            finally:
+                self._running.pop(job_id, None)
+                self._cancelled.discard(job_id)
+
+    async def _run(self, job_id: str, endpoints: list):
+        try:
+            async for item in self.runner(endpoints):
+                if item.get("done"):
+                    continue
+                await asyncio.to_thread(self.store.add_result, job_id, item)
+                # Pick up cancellations issued through another process
+                job = await asyncio.to_thread(self.store.get, job_id)
+                if job and job["status"] == "cancelled":
+                    return
+            await asyncio.to_thread(self.store.finish, job_id, "completed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            await asyncio.to_thread(self.store.finish, job_id, "failed", str(e))
@@ -1,9 +1,44 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
 from pydantic import BaseModel
-import requests
+from contextlib import asynccontextmanager
+import asyncio
+import httpx
+import json
+import os
+import time
+from .jobs import JobStore, JobManager, TERMINAL_STATES
+from . import metrics
 
-app = FastAPI(title="API Insight Backend")
+AI_ENGINE_URL = os.getenv("AI_ENGINE_URL", "http://ai-engine:8001")
+AI_ENGINE_TIMEOUT = float(os.getenv("AI_ENGINE_TIMEOUT", "200"))
+# Endpoints analyzed in parallel by one /analyze-api batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+
+ai_engine = None
+job_manager = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client to the ai-engine for the whole process
+    global ai_engine, job_manager
+    ai_engine = httpx.AsyncClient(
+        base_url=AI_ENGINE_URL,
+        timeout=httpx.Timeout(AI_ENGINE_TIMEOUT, connect=5.0),
+        limits=httpx.Limits(max_connections=BATCH_CONCURRENCY * 2, max_keepalive_connections=BATCH_CONCURRENCY * 2),
+    )
+    job_manager = JobManager(JobStore(), runner=run_batch)
+    job_queue_metrics = metrics.register_job_queue(job_manager)
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+    REGISTRY.unregister(job_queue_metrics)
+    await ai_engine.aclose()
+
+app = FastAPI(title="API Insight Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,28 +48,218 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not the raw path, so job ids do not explode the series
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
+
 class APISpec(BaseModel):
     endpoints: list
+    stream: bool = False
+    batch: bool = False
+    # Passed through to the ai-engine: "swr" answers at once from cache, history or rule drafts.
+    # The ai-engine validates both and answers 400 for a bad serve mode or a callback_url off its allow-list.
+    serve: str = None
+    callback_url: str = None
+
+    def engine_options(self) -> dict:
+        return self.model_dump(include={"serve", "callback_url"}, exclude_none=True)
+
+async def generate_for_endpoint(endpoint: str, **options):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        ai_response = await ai_engine.post("/generate-testcases", json={"prompt": endpoint, **options})
+        if ai_response.status_code == 400:
+            return {"error": ai_response.json().get("detail")}
+        ai_response.raise_for_status()
+        result = ai_response.json()
+        outcome = "generation_error" if result.get("error") else "ok"
+        return result
+    except httpx.TimeoutException:
+        outcome = "timeout"
+        raise
+    finally:
+        metrics.AI_ENGINE_REQUEST_SECONDS.labels("/generate-testcases", outcome).observe(time.perf_counter() - started)
+
+async def stream_from_ai_engine(endpoint: str, accept: str, **options):
+    # Pass the ai-engine's NDJSON/SSE stream through chunk by chunk without buffering
+    try:
+        async with ai_engine.stream(
+            "POST",
+            "/generate-testcases",
+            json={"prompt": endpoint, "stream": True, **options},
+            headers={"Accept": accept},
+        ) as ai_response:
+            if ai_response.status_code == 400:
+                await ai_response.aread()
+                error = json.dumps({"done": True, "error": ai_response.json().get("detail")})
+                yield (f"data: {error}\n\n" if accept == "text/event-stream" else error + "\n").encode()
+                return
+            ai_response.raise_for_status()
+            async for chunk in ai_response.aiter_raw():
+                yield chunk
+    except httpx.HTTPError as e:
+        error = '{"done": true, "error": ' + json.dumps(str(e)) + '}'
+        yield (f"data: {error}\n\n" if accept == "text/event-stream" else error + "\n").encode()
+
+async def run_batch(endpoints: list, concurrency=BATCH_CONCURRENCY, **options):
+    """
+    Analyzes every endpoint through a bounded worker pool and yields one result per endpoint
+    in completion order. A failing endpoint only produces an error entry for itself.
+    """
+    queue = asyncio.Queue()
+    for index, endpoint in enumerate(endpoints):
+        queue.put_nowait((index, endpoint))
+    results = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                index, endpoint = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            item = {"index": index, "endpoint": endpoint}
+            try:
+                item.update(await generate_for_endpoint(endpoint, **options))
+            except httpx.HTTPError as e:
+                item["error"] = str(e) or type(e).__name__
+            except Exception as e:
+                item["error"] = str(e)
+            await results.put(item)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(endpoints)))]
+    failed = 0
+    try:
+        for _ in range(len(endpoints)):
+            item = await results.get()
+            if item.get("error"):
+                failed += 1
+            metrics.BATCH_ITEMS.labels("failed" if item.get("error") else "succeeded").inc()
+            yield item
+    finally:
+        for task in workers:
+            task.cancel()
+    yield {"done": True, "total": len(endpoints), "succeeded": len(endpoints) - failed, "failed": failed}
+
+async def encode_batch(items):
+    async for item in items:
+        yield json.dumps(item, ensure_ascii=False) + "\n"
 
 @app.post("/analyze-api")
-def analyze_api(spec: APISpec):
+async def analyze_api(spec: APISpec, request: Request):
     try:
-        # Get the first endpoint from the list
         if not spec.endpoints or len(spec.endpoints) == 0:
             return {"error": "No endpoints provided"}
-            
-        endpoint = spec.endpoints[0]  # Take the first endpoint
-        
-        # Format the request for the AI engine
-        ai_response = requests.post(
-            "http://ai-engine:8001/generate-testcases", 
-            json={"prompt": endpoint}
-        )
-        ai_response.raise_for_status()
-        return ai_response.json()
-    except requests.exceptions.RequestException as e:
+
+        if len(spec.endpoints) > 1 or spec.batch:
+            if len(spec.endpoints) > MAX_BATCH_SIZE:
+                return {"error": f"Too many endpoints: {len(spec.endpoints)} (max {MAX_BATCH_SIZE})"}
+            # Batch mode: one NDJSON line per endpoint as soon as it finishes
+            return StreamingResponse(encode_batch(run_batch(spec.endpoints, **spec.engine_options())), media_type="application/x-ndjson")
+
+        endpoint = spec.endpoints[0]
+
+        if spec.stream:
+            sse = "text/event-stream" in request.headers.get("accept", "")
+            accept = "text/event-stream" if sse else "application/x-ndjson"
+            return StreamingResponse(stream_from_ai_engine(endpoint, accept, **spec.engine_options()), media_type=accept)
+
+        return await generate_for_endpoint(endpoint, **spec.engine_options())
+    except httpx.HTTPError as e:
         return {"error": str(e)}
 
+class SpecUpload(BaseModel):
+    spec: str
+    category: str = None
+    limit: int = None
+
+async def stream_spec_results(upload: SpecUpload):
+    try:
+        async with ai_engine.stream("POST", "/generate-from-spec", json=upload.model_dump(exclude_none=True)) as ai_response:
+            if ai_response.status_code == 400:
+                await ai_response.aread()
+                yield json.dumps({"done": True, "error": ai_response.json().get("detail")}) + "\n"
+                return
+            ai_response.raise_for_status()
+            async for chunk in ai_response.aiter_raw():
+                yield chunk
+    except httpx.HTTPError as e:
+        yield json.dumps({"done": True, "error": str(e)}) + "\n"
+
+@app.post("/analyze-spec")
+async def analyze_spec(upload: SpecUpload):
+    # Whole-spec generation: one NDJSON line per OpenAPI operation as it completes
+    return StreamingResponse(stream_spec_results(upload), media_type="application/x-ndjson")
+
+class JobRequest(BaseModel):
+    endpoints: list
+
+@app.post("/jobs", status_code=202)
+async def create_job(job: JobRequest):
+    if not job.endpoints:
+        raise HTTPException(status_code=400, detail="No endpoints provided")
+    if len(job.endpoints) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Too many endpoints: {len(job.endpoints)} (max {MAX_BATCH_SIZE})")
+    job_id = await job_manager.submit(job.endpoints)
+    return {"job_id": job_id, "status": "queued"}
+
+async def get_job_or_404(job_id: str):
+    job = await asyncio.to_thread(job_manager.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return await get_job_or_404(job_id)
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = 0, limit: int = 100):
+    job = await get_job_or_404(job_id)
+    results = await asyncio.to_thread(job_manager.store.results, job_id, offset, min(limit, 1000))
+    return {"job": job, "offset": offset, "results": results}
+
+async def stream_job(job_id: str):
+    # Follow the result log until the job reaches a terminal state; works whichever process runs the job
+    offset = 0
+    while True:
+        results = await asyncio.to_thread(job_manager.store.results, job_id, offset, 100)
+        for item in results:
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+        offset += len(results)
+        if results:
+            continue
+        job = await asyncio.to_thread(job_manager.store.get, job_id)
+        if job["status"] in TERMINAL_STATES:
+            remaining = await asyncio.to_thread(job_manager.store.results, job_id, offset, 1000000)
+            for item in remaining:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            yield json.dumps({"done": True, **job}) + "\n"
+            return
+        await asyncio.sleep(job_manager.poll_interval)
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job_results(job_id: str):
+    await get_job_or_404(job_id)
+    return StreamingResponse(stream_job(job_id), media_type="application/x-ndjson")
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    await get_job_or_404(job_id)
+    cancelled = await job_manager.cancel(job_id)
+    return {"job_id": job_id, "cancelled": cancelled}
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,34 @@
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "HTTP handler time until the response starts", ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+AI_ENGINE_REQUEST_SECONDS = Histogram(
+    "ai_engine_request_seconds", "Calls from the backend to the ai-engine", ["path", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+BATCH_ITEMS = Counter("batch_items", "Endpoints analyzed by batches and jobs", ["outcome"])
+
+
+class JobQueueCollector:
+    """Counts queued jobs in the shared job store at scrape time."""
+
+    def __init__(self, job_manager):
+        self.job_manager = job_manager
+
+    def collect(self):
+        try:
+            depth = self.job_manager.store.queue_depth()
+        except Exception:
+            return
+        yield GaugeMetricFamily("job_queue_depth", "Jobs waiting for a worker", value=depth)
+
+
+def register_job_queue(job_manager):
+    collector = JobQueueCollector(job_manager)
+    REGISTRY.register(collector)
+    return collector
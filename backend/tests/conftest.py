@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the service as the "app" package, the way uvicorn loads app.main
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
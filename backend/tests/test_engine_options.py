@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import main
+
+
+def engine(handler):
+    return httpx.AsyncClient(base_url="http://ai-engine", transport=httpx.MockTransport(handler))
+
+
+def rejecting(requests):
+    # Stands in for the ai-engine's own callback_url check
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        if body.get("callback_url", "").startswith("http://169.254."):
+            return httpx.Response(400, json={"detail": "callback_url must be an http(s) URL on an allowed host"})
+        return httpx.Response(200, json={"positive_tests": []})
+
+    return handler
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    seen = []
+    monkeypatch.setattr(main, "ai_engine", engine(rejecting(seen)))
+    return seen
+
+
+def test_options_are_forwarded_unchanged():
+    spec = main.APISpec(endpoints=["GET /users"], serve="swr", callback_url="http://169.254.169.254/latest")
+    assert spec.engine_options() == {"serve": "swr", "callback_url": "http://169.254.169.254/latest"}
+    assert main.APISpec(endpoints=["GET /users"]).engine_options() == {}
+
+
+def test_engine_rejection_reaches_the_client(requests):
+    result = asyncio.run(main.generate_for_endpoint("GET /users", callback_url="http://169.254.169.254/latest"))
+    assert result == {"error": "callback_url must be an http(s) URL on an allowed host"}
+    assert requests == [{"prompt": "GET /users", "callback_url": "http://169.254.169.254/latest"}]
+    assert asyncio.run(main.generate_for_endpoint("GET /users")) == {"positive_tests": []}
+
+
+@pytest.mark.parametrize("accept, prefix", [("application/x-ndjson", ""), ("text/event-stream", "data: ")])
+def test_engine_rejection_ends_the_stream(requests, accept, prefix):
+    async def collect():
+        return b"".join([chunk async for chunk in main.stream_from_ai_engine(
+            "GET /users", accept, callback_url="http://169.254.169.254/latest")]).decode()
+
+    text = asyncio.run(collect())
+    assert text.startswith(prefix)
+    assert json.loads(text[len(prefix):]) == {"done": True, "error": "callback_url must be an http(s) URL on an allowed host"}
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from app.jobs import JobManager, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def runner(delay=0.0, release: asyncio.Event = None):
+    # Same contract as main.run_batch: one item per endpoint, then a summary
+    async def run(endpoints):
+        for index, endpoint in enumerate(endpoints):
+            if release is not None:
+                await release.wait()
+            await asyncio.sleep(delay)
+            item = {"index": index, "endpoint": endpoint}
+            if endpoint.startswith("BAD"):
+                item["error"] = "boom"
+            yield item
+        yield {"done": True}
+
+    return run
+
+
+async def wait_for_status(store, job_id, *statuses, timeout=5.0):
+    async def poll():
+        while store.get(job_id)["status"] not in statuses:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+    return store.get(job_id)
+
+
+def test_job_runs_to_completion(store):
+    async def scenario():
+        manager = JobManager(store, runner(), workers=1, poll_interval=0.01)
+        await manager.start()
+        try:
+            job_id = await manager.submit(["GET /a", "BAD /b", "GET /c"])
+            return job_id, await wait_for_status(store, job_id, "completed")
+        finally:
+            await manager.stop()
+
+    job_id, job = asyncio.run(scenario())
+    assert (job["total"], job["completed"], job["failed"]) == (3, 2, 1)
+    assert [item["endpoint"] for item in store.results(job_id)] == ["GET /a", "BAD /b", "GET /c"]
+
+
+def test_cancelled_job_leaves_the_worker_running(store):
+    async def scenario():
+        release = asyncio.Event()
+        manager = JobManager(store, runner(release=release), workers=1, poll_interval=0.01)
+        await manager.start()
+        try:
+            first = await manager.submit(["GET /a"])
+            second = await manager.submit(["GET /b"])
+            await wait_for_status(store, first, "running")
+            assert await manager.cancel(first)
+            release.set()
+            return store.get(first), await wait_for_status(store, second, "completed")
+        finally:
+            await manager.stop()
+
+    first, second = asyncio.run(scenario())
+    assert first["status"] == "cancelled"
+    assert second["completed"] == 1
+
+
+def test_stop_returns_without_claiming_queued_jobs(store):
+    async def scenario():
+        manager = JobManager(store, runner(release=asyncio.Event()), workers=1, poll_interval=0.01)
+        await manager.start()
+        first = await manager.submit(["GET /a"])
+        second = await manager.submit(["GET /b"])
+        await wait_for_status(store, first, "running")
+        await asyncio.wait_for(manager.stop(), timeout=2)
+        return store.get(first), store.get(second)
+
+    first, second = asyncio.run(scenario())
+    # The interrupted job stays "running" for requeue_stale to pick up; the queued one is untouched
+    assert first["status"] == "running"
+    assert second["status"] == "queued"
+
+
+def test_requeued_job_starts_over_without_duplicate_results(store):
+    job_id = store.create(["GET /a", "GET /b"])
+    store.claim_next()
+    store.add_result(job_id, {"index": 0, "endpoint": "GET /a"})
+    assert store.requeue_stale(stale_seconds=-1) == 1
+
+    async def scenario():
+        manager = JobManager(store, runner(), workers=1, poll_interval=0.01)
+        await manager.start()
+        try:
+            return await wait_for_status(store, job_id, "completed")
+        finally:
+            await manager.stop()
+
+    job = asyncio.run(scenario())
+    assert (job["completed"], job["failed"]) == (2, 0)
+    assert [item["index"] for item in store.results(job_id)] == [0, 1]
@@ -0,0 +1,42 @@
+-- Persistent store for generated test suites (see ai-engine/storage.py)
+
+CREATE TABLE IF NOT EXISTS endpoints (
+    id BIGSERIAL PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,        -- sha1 of the normalized endpoint
+    endpoint TEXT NOT NULL,                  -- normalized "METHOD /path"
+    created_at DOUBLE PRECISION NOT NULL,
+    invalidated_at DOUBLE PRECISION          -- stored runs older than this are no longer served
+);
+
+CREATE TABLE IF NOT EXISTS generation_runs (
+    id BIGSERIAL PRIMARY KEY,
+    endpoint_id BIGINT NOT NULL REFERENCES endpoints (id) ON DELETE CASCADE,
+    request_key TEXT NOT NULL,               -- same key as the ai-engine result cache
+    category TEXT,                           -- NULL when all categories were generated
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    case_count INTEGER NOT NULL,
+    duration_ms INTEGER,
+    created_at DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_runs_request_key ON generation_runs (request_key, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_runs_endpoint ON generation_runs (endpoint_id, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS test_cases (
+    id BIGSERIAL PRIMARY KEY,
+    run_id BIGINT NOT NULL REFERENCES generation_runs (id) ON DELETE CASCADE,
+    endpoint_id BIGINT NOT NULL REFERENCES endpoints (id) ON DELETE CASCADE,
+    category TEXT NOT NULL,                  -- positive_tests, negative_tests, ...
+    model TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    description TEXT,
+    http_method TEXT,
+    request_url TEXT,
+    expected_response_code TEXT,
+    payload TEXT NOT NULL,                   -- full test case as JSON
+    created_at DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_test_cases_lookup ON test_cases (endpoint_id, category, model, id DESC);
+CREATE INDEX IF NOT EXISTS idx_test_cases_run ON test_cases (run_id, position);
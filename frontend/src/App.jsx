@@ -1,5 +1,4 @@
 import React, { useState } from 'react';
-import axios from 'axios';
 import { Spinner } from "./components/ui/spinner";
 import { Button } from "@/components/ui/button";
 import { Textarea } from "@/components/ui/textarea";
@@ -30,36 +29,50 @@ function App() {
       if (endpoints.length === 0) return;
       const endpoint = endpoints[0];
       const prompt = `${endpoint}\n${categoryPrompts[category]}`;
-      const response = await axios.post('http://localhost:8000/analyze-api', {
-        endpoints: [prompt]
+      // Stream NDJSON so each test case shows up as soon as it has been generated
+      const response = await fetch('http://localhost:8000/analyze-api', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson' },
+        body: JSON.stringify({ endpoints: [prompt], stream: true })
       });
-      if (response.data.error) {
-        console.error('Error:', response.data.error);
+      if (!response.ok || !response.body) {
+        console.error('Error:', response.statusText);
         setTestCases(null);
         return;
       }
-      let parsedTestCases;
-      // Always parse the string if needed
-      let tc = response.data.testcases;
-      if (typeof tc === 'string') {
-        try {
-          tc = JSON.parse(tc);
-        } catch (e) {
-          console.error('Failed to parse testcases string:', e);
-          setTestCases([{ raw_response: response.data.testcases }]);
-          setLoading(false);
-          return;
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      const received = [];
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          let event;
+          try {
+            event = JSON.parse(line);
+          } catch (e) {
+            console.error('Failed to parse stream line:', e);
+            continue;
+          }
+          if (event.done) {
+            if (event.error) console.error('Error:', event.error);
+            continue;
+          }
+          if (event.category === category + '_tests' && event.testcase) {
+            received.push(event.testcase);
+            setTestCases([...received]);
+            setLoading(false);
+          }
         }
       }
-      // If tc is an object with category arrays, extract the correct one
-      if (tc && typeof tc === 'object' && !Array.isArray(tc) && Array.isArray(tc[category + '_tests'])) {
-        parsedTestCases = tc[category + '_tests'];
-      } else if (Array.isArray(tc)) {
-        parsedTestCases = tc;
-      } else {
-        parsedTestCases = [];
+      if (received.length === 0) {
+        setTestCases(null);
       }
-      setTestCases(parsedTestCases);
     } catch (error) {
       console.error('Error generating tests:', error);
       setTestCases(null);
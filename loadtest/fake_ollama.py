@@ -0,0 +1,287 @@
+"""
+Configurable stand-in for Ollama's /api/generate, for load tests without a GPU box.
+
+    python loadtest/fake_ollama.py --port 11434 --tokens-per-sec 40 --parallel 1 \
+        --latency-dist lognormal --latency-ms 300 --error-rate 0.02 --malformed-rate 0.05
+
+Point the ai-engine at it with OLLAMA_URL=http://<host>:11434/api/generate.
+Answers both streaming and non-streaming requests with test-case JSON shaped after the
+prompt (one category array, the all-categories object, or a single test case), or after
+the JSON Schema sent as "format"; schema-constrained responses are never malformed.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import re
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CATEGORIES = ["positive", "negative", "edge", "security"]
+METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+ENDPOINT_PATTERNS = [re.compile(r"Endpoint: \*\*(.+?)\*\*"), re.compile(r"API Endpoint: (.+)")]
+CATEGORY_PATTERN = re.compile(r"JSON array of (?:at least \d+ )?(positive|negative|edge|security) test cases")
+CODES = {"positive": [200, 201, 204], "negative": [400, 404, 405, 422], "edge": [200, 400, 413, 414], "security": [401, 403, 400]}
+
+
+class FakeConfig:
+    def __init__(self, args):
+        self.tokens_per_sec = args.tokens_per_sec
+        self.latency_ms = args.latency_ms
+        self.latency_dist = args.latency_dist
+        self.latency_jitter = args.latency_jitter
+        self.error_rate = args.error_rate
+        self.timeout_rate = args.timeout_rate
+        self.timeout_seconds = args.timeout_seconds
+        self.malformed_rate = args.malformed_rate
+        self.truncate_rate = args.truncate_rate
+        self.cases_per_category = args.cases_per_category
+        self.bad_case_rate = args.bad_case_rate
+        self.duplicate_rate = args.duplicate_rate
+        self.cold_start = args.cold_start_ms / 1000
+        self.prompt_eval_tps = args.prompt_eval_tps
+        self.semaphore = asyncio.Semaphore(args.parallel) if args.parallel > 0 else None
+
+    def prompt_eval_delay(self):
+        base = self.latency_ms / 1000
+        if self.latency_dist == "fixed":
+            return base
+        if self.latency_dist == "normal":
+            return max(0.0, random.gauss(base, base * self.latency_jitter))
+        # lognormal keeps a long right tail, closest to real GPU queueing
+        return random.lognormvariate(0, self.latency_jitter) * base
+
+
+def fake_test_case(category: str, endpoint: str, index: int, rng: random.Random):
+    method = rng.choice(METHODS)
+    return {
+        "description": f"{category.capitalize()} case {index + 1} for {endpoint}: variant {rng.randint(1, 10**6)}",
+        "request_url": f"https://api.example.com{endpoint.rstrip('/')}/{rng.randint(1, 999)}",
+        "http_method": method,
+        "headers": {"Accept": "application/json"},
+        "request_body": {} if method in ("GET", "DELETE") else {"name": f"user{rng.randint(1, 999)}", "age": rng.randint(-5, 200)},
+        "expected_response_code": rng.choice(CODES[category]),
+        "expected_response_body": {"id": rng.randint(1, 999)},
+    }
+
+
+def damage_test_case(case: dict, rng: random.Random, constrained: bool):
+    # Defects a schema cannot rule out (placeholder description, bogus URL), plus type-level ones without it
+    defects = ["description", "request_url"] + ([] if constrained else ["http_method", "expected_response_code"])
+    field = rng.choice(defects)
+    case[field] = {"description": "test case", "request_url": "N/A", "http_method": "FETCH",
+                   "expected_response_code": 0}[field]
+    return case
+
+
+def near_duplicate(case: dict, rng: random.Random):
+    # What a low temperature tends to repeat: the same request with a reworded description and another id
+    copy = json.loads(json.dumps(case))
+    copy["description"] = "Verify " + case["description"][0].lower() + case["description"][1:]
+    copy["request_url"] = re.sub(r"/\d+$", f"/{rng.randint(1, 999)}", case["request_url"])
+    return copy
+
+
+def build_response(prompt: str, config: FakeConfig, rng: random.Random, schema=None):
+    endpoint = "/resource"
+    for pattern in ENDPOINT_PATTERNS:
+        match = pattern.search(prompt)
+        if match:
+            # "GET /users/{id}" or "https://host/users" -> "/users/{id}"
+            path = re.sub(r"^\w+://[^/]*", "", match.group(1).strip().split()[-1])
+            endpoint = "/" + path.lstrip("/")
+            break
+    array_request = CATEGORY_PATTERN.search(prompt)
+    # Structured output: the "format" schema, not the prompt, decides the shape
+    keys = list(schema.get("properties", {})) if isinstance(schema, dict) else []
+    count = config.cases_per_category
+    if len(keys) == 1 and keys[0].endswith("_tests"):
+        # A repair call asks for exactly the missing number of cases
+        count = max(1, schema["properties"][keys[0]].get("minItems", count))
+
+    def case(category, index):
+        generated = fake_test_case(category, endpoint, index, rng)
+        return damage_test_case(generated, rng, bool(keys)) if rng.random() < config.bad_case_rate else generated
+
+    def cases(category):
+        generated = [case(category, 0)]
+        for i in range(1, count):
+            repeat = rng.random() < config.duplicate_rate
+            generated.append(near_duplicate(generated[-1], rng) if repeat else case(category, i))
+        return generated
+
+    if "request_url" in keys:
+        category = next((c for c in CATEGORIES if f"one {c}" in prompt), "positive")
+        text = json.dumps(case(category, 0), indent=2)
+    elif len(keys) == 1 and keys[0].endswith("_tests"):
+        category = keys[0][: -len("_tests")]
+        text = json.dumps({keys[0]: cases(category)}, indent=2)
+    elif keys:
+        text = json.dumps({f"{c}_tests": cases(c) for c in CATEGORIES}, indent=2)
+    elif "Generate one" in prompt:
+        category = next((c for c in CATEGORIES if f"one {c}" in prompt), "positive")
+        text = json.dumps(case(category, 0), indent=2)
+    elif array_request:
+        category = array_request.group(1)
+        text = json.dumps(cases(category), indent=2)
+    else:
+        text = json.dumps({f"{c}_tests": cases(c) for c in CATEGORIES}, indent=2)
+    done_reason, remainder = "stop", ""
+    roll = rng.random()
+    if roll < config.malformed_rate:
+        if not keys:
+            # Typical LLM damage: trailing comma plus a prose tail
+            text = text.replace("}\n]", "},\n]", 1) + "\nHope this helps!"
+            text = text.replace('"', "'", 3)
+    elif roll < config.malformed_rate + config.truncate_rate:
+        cut = int(len(text) * rng.uniform(0.3, 0.9))
+        text, remainder = text[:cut], text[cut:]
+        done_reason = "length"
+    return text, done_reason, remainder
+
+
+def create_app(config: FakeConfig):
+    app = FastAPI(title="Fake Ollama")
+    stats = {"requests": 0, "errors": 0, "timeouts": 0, "continuations": 0, "in_flight": 0,
+             "prompt_tokens": 0, "prompt_tokens_cached": 0}
+    model = {"loaded": False, "lock": asyncio.Lock()}
+    # Like Ollama's KV cache: a prompt sharing a prefix with a recent one only evaluates the rest
+    recent_prompts = collections.deque(maxlen=8)
+    # Rest of each truncated response, keyed by the context returned with it, so a
+    # follow-up call that passes that context back gets exactly the missing tail
+    remainders = {}
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    @app.get("/api/tags")
+    def tags():
+        # Health probe target, as on a real Ollama
+        return {"models": [{"name": "fake"}]}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        async with model["lock"]:
+            if not model["loaded"]:
+                await asyncio.sleep(config.cold_start)
+                model["loaded"] = True
+        if not body.get("prompt") and not body.get("context"):
+            return {"model": body.get("model"), "response": "", "done": True, "done_reason": "load"}
+        rng = random.Random(json.dumps(body.get("options", {}), sort_keys=True) + str(random.random()))
+        roll = random.random()
+        if roll < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        if roll < config.error_rate + config.timeout_rate:
+            stats["timeouts"] += 1
+            await asyncio.sleep(config.timeout_seconds)
+        resumed = None
+        if body.get("context") and "cut off" in body.get("prompt", ""):
+            resumed = remainders.pop(tuple(body["context"]), None)
+        if resumed is not None:
+            stats["continuations"] += 1
+            text, done_reason, remainder = resumed, "stop", ""
+        else:
+            text, done_reason, remainder = build_response(body.get("prompt", ""), config, rng, body.get("format"))
+        num_predict = (body.get("options") or {}).get("num_predict")
+        if num_predict and num_predict > 0 and len(text) > num_predict * 4:
+            text, remainder, done_reason = text[:num_predict * 4], text[num_predict * 4:] + remainder, "length"
+        context = [rng.randint(1, 32000) for _ in range(8)]
+        if remainder:
+            remainders[tuple(context)] = remainder
+            if len(remainders) > 1000:
+                remainders.pop(next(iter(remainders)))
+        tokens = max(1, len(text) // 4)
+        prompt = (body.get("system") or "") + body.get("prompt", "")
+        cached = max((len(os.path.commonprefix([prompt, seen])) for seen in recent_prompts), default=0)
+        recent_prompts.append(prompt)
+        prompt_tokens = max(1, (len(prompt) - cached) // 4)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["prompt_tokens_cached"] += cached // 4
+
+        def final_chunk(started, eval_started):
+            now = time.perf_counter()
+            return {
+                "model": body.get("model"), "done": True, "done_reason": done_reason,
+                "context": context,
+                "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int((eval_started - started) * 1e9),
+                "eval_count": tokens, "eval_duration": int((now - eval_started) * 1e9),
+                "total_duration": int((now - started) * 1e9),
+            }
+
+        async def run():
+            started = time.perf_counter()
+            await asyncio.sleep(config.prompt_eval_delay())
+            if config.prompt_eval_tps:
+                await asyncio.sleep(prompt_tokens / config.prompt_eval_tps)
+            return started, time.perf_counter()
+
+        if body.get("stream", True):
+            async def stream():
+                if config.semaphore:
+                    await config.semaphore.acquire()
+                stats["in_flight"] += 1
+                try:
+                    started, eval_started = await run()
+                    step = 4 * 4  # ~4 tokens per chunk
+                    for i in range(0, len(text), step):
+                        await asyncio.sleep(4 / config.tokens_per_sec)
+                        yield json.dumps({"model": body.get("model"), "response": text[i:i + step], "done": False}) + "\n"
+                    yield json.dumps({**final_chunk(started, eval_started), "response": ""}) + "\n"
+                finally:
+                    stats["in_flight"] -= 1
+                    if config.semaphore:
+                        config.semaphore.release()
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+        if config.semaphore:
+            await config.semaphore.acquire()
+        stats["in_flight"] += 1
+        try:
+            started, eval_started = await run()
+            await asyncio.sleep(tokens / config.tokens_per_sec)
+            return {**final_chunk(started, eval_started), "response": text}
+        finally:
+            stats["in_flight"] -= 1
+            if config.semaphore:
+                config.semaphore.release()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama /api/generate server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0, help="generation speed per request")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="median latency before the first token")
+    parser.add_argument("--latency-dist", choices=["fixed", "normal", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-jitter", type=float, default=0.5, help="sigma (relative) of the latency distribution")
+    parser.add_argument("--parallel", type=int, default=1, help="generations served at once (0 = unlimited), like OLLAMA_NUM_PARALLEL")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of requests stalled for --timeout-seconds")
+    parser.add_argument("--timeout-seconds", type=float, default=120.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of responses with broken JSON")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of responses cut off mid-output")
+    parser.add_argument("--cases-per-category", type=int, default=5)
+    parser.add_argument("--bad-case-rate", type=float, default=0.0,
+                        help="fraction of test cases with a defect (placeholder description, bad URL, method or status)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="fraction of cases repeating the previous one with a reworded description")
+    parser.add_argument("--cold-start-ms", type=float, default=0.0, help="one-time model load delay on the first request")
+    parser.add_argument("--prompt-eval-tps", type=float, default=0.0,
+                        help="prompt evaluation speed for tokens not shared with a recent prompt (0 = free)")
+    args = parser.parse_args()
+    uvicorn.run(create_app(FakeConfig(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Closed-loop load driver for the backend -> ai-engine stack.
+
+    python loadtest/load_driver.py --scenario analyze --stages 1:20,5:30,10:30,20:30
+    python loadtest/load_driver.py --scenario generate --target http://localhost:8001 --stream
+
+Each stage runs CONCURRENCY virtual users for SECONDS; every user sends one request,
+waits for the full response (or stream) and sends the next. Prints throughput, latency
+percentiles and error rates per reporting interval and per stage, so the point where
+latency collapses is visible. --unique-ratio controls how many requests use a fresh
+endpoint (a cache miss) instead of one from the shared hot set.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+
+import httpx
+
+HOT_ENDPOINTS = [
+    "GET /users", "GET /users/{id}", "POST /users", "PUT /users/{id}", "DELETE /users/{id}",
+    "GET /orders", "POST /orders", "GET /orders/{id}/items", "POST /auth/login", "GET /products?page=1",
+]
+CATEGORIES = [None, "positive", "negative", "edge", "security"]
+ERROR_FIELD = re.compile(r'"error":\s*"')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def parse_stages(text: str):
+    stages = []
+    for part in text.split(","):
+        concurrency, seconds = part.split(":")
+        stages.append((int(concurrency), float(seconds)))
+    return stages
+
+
+class Recorder:
+    """Collects per-request samples; windows are cut from the same list for interval and stage reports."""
+
+    def __init__(self):
+        self.samples = []  # (finished_at, latency_s, ttfb_s, outcome)
+
+    def add(self, finished_at, latency, ttfb, outcome):
+        self.samples.append((finished_at, latency, ttfb, outcome))
+
+    def summarize(self, start, end):
+        window = [s for s in self.samples if start <= s[0] < end]
+        ok = [s[1] for s in window if s[3] == "ok"]
+        ttfb = [s[2] for s in window if s[3] == "ok" and s[2] is not None]
+        errors = {}
+        for s in window:
+            if s[3] != "ok":
+                errors[s[3]] = errors.get(s[3], 0) + 1
+        duration = max(end - start, 1e-9)
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "requests": len(window),
+            "throughput_rps": round(len(ok) / duration, 2),
+            "p50_ms": ms(percentile(ok, 50)),
+            "p95_ms": ms(percentile(ok, 95)),
+            "p99_ms": ms(percentile(ok, 99)),
+            "ttfb_p50_ms": ms(percentile(ttfb, 50)),
+            "error_rate": round(sum(errors.values()) / len(window), 4) if window else 0.0,
+            "errors": errors,
+        }
+
+
+def build_request(args, rng: random.Random):
+    if rng.random() < args.unique_ratio:
+        endpoint = f"GET /load/{rng.getrandbits(48):x}"
+    else:
+        endpoint = rng.choice(HOT_ENDPOINTS)
+    if args.scenario == "analyze":
+        return "/analyze-api", {"endpoints": [endpoint], "stream": args.stream}
+    category = rng.choice(CATEGORIES) if args.category == "mixed" else (None if args.category == "all" else args.category)
+    prompt = endpoint if category is None else f"{endpoint}\n{category}"
+    return "/generate-testcases", {"prompt": prompt, "stream": args.stream}
+
+
+def classify(status_code: int, body: str):
+    if status_code >= 400:
+        return f"http_{status_code}"
+    # Both services report generation failures as an "error" field in a 200 body or done event
+    if ERROR_FIELD.search(body):
+        return "generation_error"
+    return "ok"
+
+
+async def send(client: httpx.AsyncClient, path: str, payload: dict, stream: bool):
+    started = time.perf_counter()
+    ttfb = None
+    try:
+        if stream:
+            async with client.stream("POST", path, json=payload) as response:
+                chunks = []
+                async for chunk in response.aiter_text():
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - started
+                    chunks.append(chunk)
+                body = "".join(chunks)
+                status = response.status_code
+            outcome = classify(status, body)
+        else:
+            response = await client.post(path, json=payload)
+            ttfb = time.perf_counter() - started
+            outcome = classify(response.status_code, response.text)
+    except httpx.TimeoutException:
+        outcome = "timeout"
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    return time.perf_counter() - started, ttfb, outcome
+
+
+async def user(client, args, recorder, stop_at, seed):
+    rng = random.Random(seed)
+    while time.perf_counter() < stop_at:
+        path, payload = build_request(args, rng)
+        latency, ttfb, outcome = await send(client, path, payload, args.stream)
+        recorder.add(time.perf_counter(), latency, ttfb, outcome)
+        if args.think_time:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+
+def print_row(label, stats, concurrency):
+    def show(value):
+        return "-" if value is None else value
+
+    print(
+        f"{label:>10} users={concurrency:<4} req={stats['requests']:<5} rps={stats['throughput_rps']:<7} "
+        f"p50={show(stats['p50_ms'])}ms p95={show(stats['p95_ms'])}ms p99={show(stats['p99_ms'])}ms "
+        f"err={stats['error_rate']:.1%} {stats['errors'] or ''}",
+        flush=True,
+    )
+
+
+async def run(args):
+    recorder = Recorder()
+    timeout = httpx.Timeout(args.timeout, connect=5.0)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeline, stage_reports = [], []
+    origin = time.perf_counter()
+    async with httpx.AsyncClient(base_url=args.target, timeout=timeout, limits=limits) as client:
+        for index, (concurrency, seconds) in enumerate(parse_stages(args.stages)):
+            stage_start = time.perf_counter()
+            stop_at = stage_start + seconds
+            users = [
+                asyncio.create_task(user(client, args, recorder, stop_at, args.seed * 100003 + index * 1009 + n))
+                for n in range(concurrency)
+            ]
+            window_start = stage_start
+            while time.perf_counter() < stop_at:
+                await asyncio.sleep(min(args.interval, max(0.0, stop_at - time.perf_counter())))
+                now = time.perf_counter()
+                stats = recorder.summarize(window_start, now)
+                timeline.append({"t": round(now - origin, 1), "concurrency": concurrency, **stats})
+                print_row(f"t={now - origin:.0f}s", stats, concurrency)
+                window_start = now
+            # Requests still in flight when the stage ends are waited for and counted in it
+            await asyncio.gather(*users)
+            stats = recorder.summarize(stage_start, time.perf_counter())
+            stage_reports.append({"stage": index + 1, "concurrency": concurrency, "seconds": seconds, **stats})
+            print_row(f"stage {index + 1}", stats, concurrency)
+
+    print("\nSummary")
+    for report in stage_reports:
+        print_row(f"stage {report['stage']}", report, report["concurrency"])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "stages": stage_reports, "timeline": timeline}, f, indent=2)
+        print(f"Report written to {args.output}")
+    return stage_reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="http://localhost:8000", help="backend (analyze) or ai-engine (generate) base URL")
+    parser.add_argument("--scenario", choices=["analyze", "generate"], default="analyze",
+                        help="analyze: POST /analyze-api on the backend; generate: POST /generate-testcases on the ai-engine")
+    parser.add_argument("--stages", default="1:20,5:30,10:30,20:30", help="comma-separated CONCURRENCY:SECONDS steps")
+    parser.add_argument("--category", default="mixed", help="generate scenario: all, mixed, or one category")
+    parser.add_argument("--stream", action="store_true", help="request streamed responses and record time to first byte")
+    parser.add_argument("--unique-ratio", type=float, default=1.0, help="fraction of requests for never-seen endpoints")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a user's requests, seconds")
+    parser.add_argument("--interval", type=float, default=5.0, help="reporting window, seconds")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the stage and timeline report as JSON")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())